@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import sys
+import tempfile
 import os
 from pathlib import Path
 
@@ -109,6 +110,31 @@ else:
         }
     }
 
+# Optional read replica used by the read-only crawler/stats views
+# (links/utils/db_routing.py); writes always go to default. Tests use
+# default only.
+if 'test' not in sys.argv:
+    if os.getenv('POSTGRES_REPLICA_HOST') and os.getenv('POSTGRES_HOST'):
+        DATABASES['replica'] = dict(
+            DATABASES['default'],
+            HOST=os.getenv('POSTGRES_REPLICA_HOST'),
+            PORT=os.getenv('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+        )
+    elif os.getenv('SQLITE_REPLICA_NAME'):
+        # Local testing: a second SQLite file (or the same one) as the replica
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_REPLICA_NAME'),
+        }
+
+# Keep connections open across requests, checking them before reuse. Not
+# under ASGI (ASGI=1), where each request's sync code runs in a new thread.
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '0' if os.getenv('ASGI') == '1' else '60'))
+    database['CONN_HEALTH_CHECKS'] = True
+
+DATABASE_ROUTERS = ['links.utils.db_routing.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -150,3 +176,90 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Crawler
+# FUBON_BASE_URL can point at a local stub server (see bench_crawler).
+# CRAWLER_MAX_WORKERS is the number of brokers crawled in parallel.
+
+FUBON_BASE_URL = os.getenv('FUBON_BASE_URL', 'https://fubon-ebrokerdj.fbs.com.tw')
+CRAWLER_MAX_WORKERS = int(os.getenv('CRAWLER_MAX_WORKERS', '8'))
+
+# Shared HTTP client used by every Fubon fetcher (links/utils/http_client.py).
+# Retries cover connection errors, read timeouts and 5xx responses, with a
+# jittered exponential backoff between attempts.
+CRAWLER_HTTP_TIMEOUT = float(os.getenv('CRAWLER_HTTP_TIMEOUT', '10'))
+CRAWLER_HTTP_RETRIES = int(os.getenv('CRAWLER_HTTP_RETRIES', '3'))
+CRAWLER_HTTP_BACKOFF = float(os.getenv('CRAWLER_HTTP_BACKOFF', '0.5'))
+# Connection pool size of the async client used by the /crawler/async/ views
+CRAWLER_ASYNC_MAX_CONNECTIONS = int(os.getenv('CRAWLER_ASYNC_MAX_CONNECTIONS', '50'))
+
+# Cross-process page cache in front of the Fubon fetchers
+# (links/utils/page_cache.py). Each gunicorn worker shares the same SQLite file.
+# TTLs are in seconds per page type; a page past its TTL but inside the stale
+# window is served immediately while one background refresh runs.
+CRAWLER_CACHE_ENABLED = os.getenv('CRAWLER_CACHE_ENABLED', '1') == '1' and 'test' not in sys.argv
+CRAWLER_CACHE_PATH = os.getenv('CRAWLER_CACHE_PATH', str(BASE_DIR / 'crawler_cache.sqlite3'))
+CRAWLER_CACHE_MAX_ENTRIES = int(os.getenv('CRAWLER_CACHE_MAX_ENTRIES', '5000'))
+CRAWLER_CACHE_STALE_SECONDS = int(os.getenv('CRAWLER_CACHE_STALE_SECONDS', '3600'))
+CRAWLER_CACHE_TTLS = {
+    'zgb0': 30 * 60,               # broker daily / N-day rankings
+    'zgb0_history': 7 * 24 * 3600, # broker ranking pinned to a past date
+    'zco0': 5 * 60,                # broker x stock history, includes today's intraday row
+    'zco': 5 * 60,                 # stock main force ranking for today
+    'zco_history': 7 * 24 * 3600,  # stock main force ranking for a past date
+    'default': 5 * 60,
+}
+
+# Identical concurrent fetches are coalesced (links/utils/singleflight.py).
+# Threads share one result in-process; other processes wait on a lock file
+# here and then read the page the leader just put in the page cache.
+CRAWLER_LOCK_DIR = os.getenv('CRAWLER_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'brokerstock-crawler-locks'))
+
+# Raw HTML archive (links/utils/archive.py). Every page fetched from Fubon is
+# stored gzip-compressed and content-addressed, indexed by URL, broker, stock
+# and data date. CRAWLER_REPLAY=1 makes the crawler read from the archive
+# instead of the network.
+CRAWLER_ARCHIVE_ENABLED = os.getenv('CRAWLER_ARCHIVE_ENABLED', '1') == '1' and 'test' not in sys.argv
+CRAWLER_ARCHIVE_DIR = os.getenv('CRAWLER_ARCHIVE_DIR', str(BASE_DIR / 'crawler_archive'))
+CRAWLER_REPLAY = os.getenv('CRAWLER_REPLAY', '0') == '1'
+
+# Per-host rate limiting for upstream requests (links/utils/rate_limit.py):
+# a token bucket caps requests per second, and an AIMD limit on in-flight
+# requests grows while responses are fast and halves on 429/5xx, errors or
+# responses slower than CRAWLER_LATENCY_TARGET seconds.
+CRAWLER_RATE_LIMIT = float(os.getenv('CRAWLER_RATE_LIMIT', '10'))
+CRAWLER_RATE_BURST = int(os.getenv('CRAWLER_RATE_BURST', '20'))
+CRAWLER_CONCURRENCY_INITIAL = int(os.getenv('CRAWLER_CONCURRENCY_INITIAL', '4'))
+CRAWLER_CONCURRENCY_MIN = int(os.getenv('CRAWLER_CONCURRENCY_MIN', '1'))
+CRAWLER_CONCURRENCY_MAX = int(os.getenv('CRAWLER_CONCURRENCY_MAX', '16'))
+CRAWLER_LATENCY_TARGET = float(os.getenv('CRAWLER_LATENCY_TARGET', '3'))
+
+# Trading-day data is treated as final once it is fetched after this hour
+# (market time). The scheduler runs fetch_broker_data at 18:00 and 23:00.
+MARKET_TIMEZONE = os.getenv('MARKET_TIMEZONE', 'Asia/Taipei')
+MARKET_DATA_FINAL_HOUR = int(os.getenv('MARKET_DATA_FINAL_HOUR', '18'))
+
+# Ingestion (links/utils/ingest.py): each broker's rows are bulk upserted in
+# one transaction; on Postgres they are COPYed into a staging table first.
+INGEST_USE_COPY = os.getenv('INGEST_USE_COPY', '1') == '1'
+
+# Stocks whose zco main-force rankings fetch_main_force_data stores each day
+# (comma separated). Empty means every stock in the latest StockRecord day.
+MAIN_FORCE_STOCKS = [code.strip() for code in os.getenv('MAIN_FORCE_STOCKS', '').split(',') if code.strip()]
+
+# On Postgres StockRecord is partitioned by month; partitions are created on
+# demand by ingestion, this many months ahead of today.
+STOCKRECORD_PARTITION_MONTHS_AHEAD = int(os.getenv('STOCKRECORD_PARTITION_MONTHS_AHEAD', '2'))
+
+# Memory-mapped broker x stock x date volume cube (links/utils/volume_cube.py),
+# appended after each fetch_broker_data run and read by /api/analytics/.
+VOLUME_CUBE_ENABLED = os.getenv('VOLUME_CUBE_ENABLED', '1') == '1' and 'test' not in sys.argv
+VOLUME_CUBE_DIR = os.getenv('VOLUME_CUBE_DIR', str(BASE_DIR / 'volume_cube'))
+
+# Rows per side of the N-day broker rankings HistoryCrawlerView computes
+# from stored StockRecords (the zgb0 d=N pages list this many)
+HISTORY_RANKING_SIZE = int(os.getenv('HISTORY_RANKING_SIZE', '50'))
+
+# Rows per transaction for POST /api/records/bulk/
+BULK_INGEST_CHUNK_SIZE = int(os.getenv('BULK_INGEST_CHUNK_SIZE', '1000'))
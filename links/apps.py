@@ -7,6 +7,8 @@ class LinksConfig(AppConfig):
 
     def ready(self):
         import os
+        # 註冊資料庫連線計數與資料版本的 signal
+        from .utils import data_version, db_routing  # noqa: F401
         # 確保只在主進程中啟動，防止 runserver 的 reload 執行兩次
         if os.environ.get('RUN_MAIN') == 'true' or os.environ.get('ZEABUR'):
             from . import scheduler
@@ -0,0 +1,203 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from links.models import Broker
+from links.utils import page_cache
+from links.utils.crawler import fetch_html, generate_fubon_detail_link, parse_record_date
+from links.utils.ingest import ingest_broker_records
+from links.utils.parsers import parse_top_buyers
+
+_DONE = object()
+
+
+class Command(BaseCommand):
+    help = 'Backfill StockRecord history for a date range from date-pinned Fubon zgb0 pages (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', required=True, help='First trading day (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last trading day (YYYY-MM-DD), defaults to start date')
+        parser.add_argument('--brokers', nargs='*', help='Broker names to backfill (default: all)')
+        parser.add_argument('--workers', type=int, default=settings.CRAWLER_MAX_WORKERS,
+                            help='Concurrent page fetches')
+        parser.add_argument('--queue-size', type=int, default=32,
+                            help='Bound on pages waiting between pipeline stages')
+        parser.add_argument('--checkpoint', default=str(settings.BASE_DIR / 'backfill_checkpoint.jsonl'),
+                            help='File recording finished broker-dates, so a rerun skips them')
+        parser.add_argument('--reset', action='store_true', help='Ignore and clear the checkpoint file')
+
+    def _trading_days(self, start, end):
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                yield day
+            day += timedelta(days=1)
+
+    def _load_checkpoint(self, path):
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted run
+                done.add((entry['broker_id'], entry['date']))
+        return done
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+            end = datetime.strptime(options['end_date'] or options['start_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Invalid date format. Use YYYY-MM-DD")
+
+        brokers = Broker.objects.all()
+        if options['brokers']:
+            brokers = brokers.filter(name__in=options['brokers'])
+        brokers = list(brokers)
+        if not brokers:
+            self.stdout.write(self.style.WARNING('No brokers found in database.'))
+            return
+
+        checkpoint_path = options['checkpoint']
+        if options['reset'] and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        done = self._load_checkpoint(checkpoint_path)
+
+        days = list(self._trading_days(start, end))
+        tasks = [
+            (broker, day)
+            for day in days
+            for broker in brokers
+            if (broker.id, day.isoformat()) not in done
+        ]
+        skipped = len(brokers) * len(days) - len(tasks)
+        self.stdout.write(
+            f"Backfilling {len(tasks)} broker-dates ({skipped} already done) "
+            f"with {options['workers']} workers")
+        if not tasks:
+            return
+
+        # Pages are ingested as they come from Fubon, never from the page cache
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, page_cache.bypass():
+            stats = self._run_pipeline(tasks, options['workers'], options['queue_size'], checkpoint)
+
+        elapsed = stats['elapsed']
+        self.stdout.write(self.style.SUCCESS(
+            f"Finished {stats['done']}/{len(tasks)} broker-dates in {elapsed:.1f}s: "
+            f"created {stats['created']}, updated {stats['updated']} records "
+            f"({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s), "
+            f"{stats['no_data']} without data, {stats['failed']} failed"))
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(
+                "Failed broker-dates were not checkpointed; rerun the same command to retry them."))
+
+    def _run_pipeline(self, tasks, workers, queue_size, checkpoint):
+        # fetch workers -> parse worker -> writer (this thread, owns the DB connection)
+        task_queue = queue.Queue()
+        parse_queue = queue.Queue(maxsize=queue_size)
+        write_queue = queue.Queue(maxsize=queue_size)
+        for task in tasks:
+            task_queue.put(task)
+        workers = max(1, min(workers, len(tasks)))
+        for _ in range(workers):
+            task_queue.put(_DONE)
+
+        def fetch_worker():
+            while True:
+                task = task_queue.get()
+                if task is _DONE:
+                    parse_queue.put(_DONE)
+                    return
+                broker, day = task
+                link = generate_fubon_detail_link(
+                    broker.fbs_a, broker.fbs_b, days=1, date=day.isoformat())
+                try:
+                    html = fetch_html(link)
+                except Exception as e:
+                    parse_queue.put((broker, day, link, None, e))
+                else:
+                    parse_queue.put((broker, day, link, html, None))
+
+        def parse_worker():
+            finished_fetchers = 0
+            while finished_fetchers < workers:
+                item = parse_queue.get()
+                if item is _DONE:
+                    finished_fetchers += 1
+                    continue
+                broker, day, link, html, error = item
+                parsed = None
+                if error is None:
+                    try:
+                        parsed = parse_top_buyers(html, record_type=1, link=link)
+                    except Exception as e:
+                        error = e
+                write_queue.put((broker, day, parsed, error))
+            write_queue.put(_DONE)
+
+        threads = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(workers)]
+        threads.append(threading.Thread(target=parse_worker, daemon=True))
+        for thread in threads:
+            thread.start()
+
+        stats = {'done': 0, 'failed': 0, 'no_data': 0, 'created': 0, 'updated': 0, 'rows': 0}
+        started = time.monotonic()
+        last_report = started
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                break
+            broker, day, parsed, error = item
+            if error is not None:
+                stats['failed'] += 1
+                self.stdout.write(self.style.ERROR(f"Error backfilling {broker.name} {day}: {error}"))
+                continue
+
+            rows = 0
+            buy_data, date_str, sell_data = parsed
+            try:
+                page_date = parse_record_date(date_str)
+            except ValueError:
+                page_date = None
+            # Holidays come back empty or as another day's ranking; don't relabel those
+            if page_date == day:
+                try:
+                    created, updated = ingest_broker_records(broker, buy_data, day, sell_data)
+                except Exception as e:
+                    # Like a failed fetch: not checkpointed, so a rerun retries it
+                    stats['failed'] += 1
+                    self.stdout.write(self.style.ERROR(f"Error storing {broker.name} {day}: {e}"))
+                    continue
+                stats['created'] += created
+                stats['updated'] += updated
+                rows = created + updated
+            else:
+                stats['no_data'] += 1
+
+            checkpoint.write(json.dumps({'broker_id': broker.id, 'date': day.isoformat(), 'rows': rows}) + '\n')
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            stats['done'] += 1
+            stats['rows'] += rows
+
+            now = time.monotonic()
+            finished = stats['done'] + stats['failed']
+            if now - last_report >= 5 or finished == len(tasks):
+                last_report = now
+                rate = finished / (now - started)
+                eta = (len(tasks) - finished) / rate if rate else 0
+                self.stdout.write(
+                    f"{finished}/{len(tasks)} broker-dates, "
+                    f"{stats['rows'] / (now - started):.0f} rows/s, ETA {eta:.0f}s")
+
+        for thread in threads:
+            thread.join()
+        stats['elapsed'] = time.monotonic() - started
+        return stats
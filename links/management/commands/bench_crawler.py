@@ -0,0 +1,157 @@
+import statistics
+import threading
+import time
+from io import StringIO
+from urllib.parse import urlsplit
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from links.models import Broker
+from links.utils import http_client, rate_limit
+from links.utils.crawler import (
+    fetch_top_buyers, fetch_fubon_zco0_data, fetch_stock_main_force_data,
+    generate_fubon_detail_link, generate_fubon_link
+)
+from links.utils.stub_fubon import StubFubonServer
+
+_network = threading.local()
+
+
+def _record_network_time(url, elapsed, status_code, error):
+    _network.seconds = getattr(_network, 'seconds', 0.0) + elapsed
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the crawler fetchers, fetch_broker_data and crawler views against a local stub Fubon server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30,
+                            help='Calls per fetcher / view scenario')
+        parser.add_argument('--brokers', type=int, default=20,
+                            help='Brokers created for fetch_broker_data and the live view')
+        parser.add_argument('--latency-ms', type=float, default=20,
+                            help='Latency the stub server adds to every response')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of stub responses that are 503s')
+        parser.add_argument('--rate-limit', type=float, default=1000,
+                            help='Per-host requests per second allowed towards the stub')
+        parser.add_argument('--max-p99-ms', type=float,
+                            help='Fail if any scenario p99 exceeds this many milliseconds')
+
+    def _run(self, label, func, iterations):
+        latencies = []
+        network = []
+        failures = 0
+        start = time.perf_counter()
+        for i in range(iterations):
+            _network.seconds = 0.0
+            call_start = time.perf_counter()
+            try:
+                func(i)
+            except Exception as e:
+                failures += 1
+                if failures == 1:
+                    self.stdout.write(self.style.WARNING(f"{label}: {e}"))
+            latencies.append(time.perf_counter() - call_start)
+            network.append(_network.seconds)
+        wall = time.perf_counter() - start
+
+        result = {
+            'label': label,
+            'throughput': iterations / wall,
+            'p50': _percentile(latencies, 50) * 1000,
+            'p99': _percentile(latencies, 99) * 1000,
+            # Network time is measured in the calling thread only; fetches made
+            # by crawler worker threads (live view) show up under cpu time.
+            'network': statistics.mean(network) * 1000,
+            'cpu': statistics.mean(l - n for l, n in zip(latencies, network)) * 1000,
+            'failures': failures,
+        }
+        self.stdout.write(
+            f"{label:<28}{result['throughput']:>9.1f}{result['p50']:>10.1f}{result['p99']:>10.1f}"
+            f"{result['network']:>10.1f}{result['cpu']:>10.1f}{failures:>6}")
+        return result
+
+    def _scenarios(self):
+        client = Client()
+        # Unique query strings keep single-flight from merging calls
+        return [
+            ('fetch_top_buyers', lambda i: fetch_top_buyers(
+                generate_fubon_detail_link('1440', f'1440{i}'))),
+            ('fetch_fubon_zco0_data', lambda i: fetch_fubon_zco0_data(
+                generate_fubon_link('2330', '1440', f'1440{i}'), '2025-12-01')),
+            ('fetch_stock_main_force_data', lambda i: fetch_stock_main_force_data(
+                f'2330{i}', '2025-12-30')),
+            ('fetch_broker_data', lambda i: call_command(
+                'fetch_broker_data', stdout=StringIO())),
+            ('view: live', lambda i: self._get(client, '/api/crawler/live/', {'number': '2330'})),
+            ('view: history', lambda i: self._get(
+                client, '/api/crawler/history/', {'a': '1440', 'b': f'1440{i}', 'days': 5})),
+            ('view: stock-main-force', lambda i: self._get(
+                client, '/api/crawler/stock-main-force/', {'number': f'2330{i}', 'date': '2025-12-30'})),
+        ]
+
+    def _get(self, client, path, params):
+        response = client.get(path, params)
+        if response.status_code != 200:
+            raise CommandError(f"{path} returned {response.status_code}")
+        return response
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        # Benchmark data lives in a throwaway test database
+        old_name = connection.creation.create_test_db(verbosity=0, keepdb=False)
+        stub = StubFubonServer(
+            latency=options['latency_ms'] / 1000, error_rate=options['error_rate'], seed=0)
+        results = []
+        try:
+            for i in range(options['brokers']):
+                Broker.objects.create(
+                    name=f"bench-{i}", fbs_a=f"9{i:03d}", fbs_b=f"9{i:03d}", stock_bno=f"9{i:03d}")
+
+            with stub, override_settings(
+                    FUBON_BASE_URL=stub.base_url,
+                    CRAWLER_CACHE_ENABLED=False,
+                    CRAWLER_ARCHIVE_ENABLED=False,
+                    CRAWLER_REPLAY=False,
+                    # fetch_broker_data must not write bench data into the real cube
+                    VOLUME_CUBE_ENABLED=False,
+                    CRAWLER_RATE_LIMIT=options['rate_limit'],
+                    CRAWLER_RATE_BURST=max(1, int(options['rate_limit'])),
+                    ALLOWED_HOSTS=['*']):
+                http_client.reset_session()
+                rate_limit.reset_limiters()
+                http_client.add_timing_hook(_record_network_time)
+                self.stdout.write(
+                    f"Stub server {stub.base_url}: latency {options['latency_ms']}ms, "
+                    f"error rate {options['error_rate']}")
+                self.stdout.write(
+                    f"{'scenario':<28}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}"
+                    f"{'net ms':>10}{'cpu ms':>10}{'fail':>6}")
+                self.stdout.write("cpu ms = latency minus network time: parsing, ORM and serialization")
+                try:
+                    for label, func in self._scenarios():
+                        runs = min(iterations, 3) if label == 'fetch_broker_data' else iterations
+                        results.append(self._run(label, func, runs))
+                finally:
+                    http_client.remove_timing_hook(_record_network_time)
+                    http_client.reset_session()
+                    self.stdout.write(f"Limiter: {rate_limit.limiter_states().get(urlsplit(stub.base_url).netloc)}")
+                    rate_limit.reset_limiters()
+            self.stdout.write(
+                f"Stub served {stub.request_count} requests ({stub.error_count} injected errors)")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        max_p99 = options['max_p99_ms']
+        if max_p99 is not None:
+            slow = [r['label'] for r in results if r['p99'] > max_p99]
+            if slow:
+                raise CommandError(f"p99 above {max_p99}ms: {', '.join(slow)}")
@@ -0,0 +1,117 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from links.models import Broker, StockRecord
+from links.utils.ingest import ingest_broker_records
+
+
+def ingest_row_by_row(broker, buy_data, record_date, sell_data):
+    """The previous ingest path: one update_or_create (SELECT + INSERT/UPDATE) per row."""
+    created_count = 0
+    updated_count = 0
+    for item in buy_data + sell_data:
+        obj, created = StockRecord.objects.update_or_create(
+            broker=broker,
+            stock_code=item['code'],
+            date=record_date,
+            record_type=1,
+            defaults={
+                'stock_name': item['name'],
+                'buy_volume': item['buy'],
+                'sell_volume': item['sell'],
+                'net_volume': item['dif'],
+            }
+        )
+        if created:
+            created_count += 1
+        else:
+            updated_count += 1
+    return created_count, updated_count
+
+
+class Command(BaseCommand):
+    help = 'Benchmark row-by-row update_or_create against the bulk upsert ingest path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brokers', type=int, default=20)
+        parser.add_argument('--rows', type=int, default=100, help='Rows per broker page (buy + sell)')
+        parser.add_argument('--days', type=int, default=3)
+
+    def _pages(self, brokers, rows, days):
+        rng = random.Random(0)
+        start = date(2025, 12, 1)
+        for d in range(days):
+            record_date = start + timedelta(days=d)
+            for broker in brokers:
+                items = [{
+                    'code': f"{1000 + i}",
+                    'name': f"{1000 + i}測試",
+                    'buy': rng.randint(0, 5000),
+                    'sell': rng.randint(0, 5000),
+                    'dif': rng.randint(-5000, 5000),
+                } for i in range(rows)]
+                half = rows // 2
+                yield broker, items[:half], record_date, items[half:]
+
+    def _run(self, label, ingest, brokers, options):
+        StockRecord.objects.all().delete()
+        totals = [0, 0]
+        started = time.perf_counter()
+        # First pass inserts, second pass updates every row
+        for _ in range(2):
+            for page in self._pages(brokers, options['rows'], options['days']):
+                created, updated = ingest(*page)
+                totals[0] += created
+                totals[1] += updated
+        elapsed = time.perf_counter() - started
+        rows = totals[0] + totals[1]
+        self.stdout.write(
+            f"{label:<14}{elapsed:>10.2f}{rows / elapsed:>12.0f}{totals[0]:>10}{totals[1]:>10}")
+        return elapsed
+
+    def _run_endpoint(self, brokers, options):
+        """Same rows through POST /api/records/bulk/ as one NDJSON upload per pass."""
+        StockRecord.objects.all().delete()
+        body = ''.join(
+            json.dumps({
+                'broker': broker.id, 'stock_code': item['code'], 'stock_name': item['name'],
+                'date': record_date.isoformat(), 'buy_volume': item['buy'], 'sell_volume': item['sell'],
+                'net_volume': item['dif'],
+            }, ensure_ascii=False) + '\n'
+            for broker, buy_data, record_date, sell_data in self._pages(brokers, options['rows'], options['days'])
+            for item in buy_data + sell_data
+        )
+        client = Client()
+        totals = [0, 0]
+        started = time.perf_counter()
+        for _ in range(2):
+            result = client.post('/api/records/bulk/', body, content_type='application/x-ndjson',
+                                 SERVER_NAME='localhost').json()
+            totals[0] += result['created']
+            totals[1] += result['updated']
+        elapsed = time.perf_counter() - started
+        rows = totals[0] + totals[1]
+        self.stdout.write(
+            f"{'bulk endpoint':<14}{elapsed:>10.2f}{rows / elapsed:>12.0f}{totals[0]:>10}{totals[1]:>10}")
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, keepdb=False)
+        try:
+            brokers = [
+                Broker.objects.create(name=f"bench-{i}", fbs_a=str(i), fbs_b=str(i), stock_bno=str(i))
+                for i in range(options['brokers'])
+            ]
+            self.stdout.write(
+                f"{connection.vendor}: {options['brokers']} brokers x {options['rows']} rows x "
+                f"{options['days']} days, inserted then updated")
+            self.stdout.write(f"{'path':<14}{'seconds':>10}{'rows/s':>12}{'created':>10}{'updated':>10}")
+            row_by_row = self._run('row-by-row', ingest_row_by_row, brokers, options)
+            bulk = self._run('bulk upsert', ingest_broker_records, brokers, options)
+            self._run_endpoint(brokers, options)
+            self.stdout.write(self.style.SUCCESS(f"Bulk upsert is {row_by_row / bulk:.1f}x faster"))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
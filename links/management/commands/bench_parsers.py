@@ -0,0 +1,41 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from links.utils.parsers import parse_top_buyers, parse_zco0, parse_stock_main_force
+
+TESTDATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'testdata')
+
+CASES = [
+    ('zgb0 daily ranking', 'zgb0_daily.html', lambda html, fast: parse_top_buyers(html, fast=fast)),
+    ('zco0 broker history', 'zco0_history.html', lambda html, fast: parse_zco0(html, '2025-12-01', fast=fast)),
+    ('zco main force (flat)', 'zco_flat.html', lambda html, fast: parse_stock_main_force(html, '2025-12-30', fast=fast)),
+    ('zco main force (nested)', 'zco_nested.html', lambda html, fast: parse_stock_main_force(html, '2025-12-30', fast=fast)),
+]
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark the fast oMainTable parsers against full-page BeautifulSoup parsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def _time(self, func, html, fast, iterations):
+        func(html, fast)  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(html, fast)
+        return (time.perf_counter() - start) / iterations * 1000
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        self.stdout.write(f"{'page':<26}{'full (ms)':>12}{'fast (ms)':>12}{'speedup':>10}")
+        for label, filename, func in CASES:
+            with open(os.path.join(TESTDATA_DIR, filename), encoding='utf-8') as f:
+                html = f.read()
+            if func(html, True) != func(html, False):
+                self.stdout.write(self.style.ERROR(f"{label}: fast parser output differs"))
+                continue
+            full_ms = self._time(func, html, False, iterations)
+            fast_ms = self._time(func, html, True, iterations)
+            self.stdout.write(
+                f"{label:<26}{full_ms:>12.2f}{fast_ms:>12.2f}{full_ms / fast_ms:>9.1f}x")
@@ -0,0 +1,107 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from links.models import Broker, StockRecord
+from links.utils.partitions import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot StockRecord queries on a synthetic multi-year dataset, without and with the query indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--brokers', type=int, default=10)
+        parser.add_argument('--stocks', type=int, default=40, help='Records per broker per trading day')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--plans', action='store_true', help='Print the query plans')
+
+    def _populate(self, options):
+        rng = random.Random(0)
+        days = []
+        day = date.today() - timedelta(days=365 * options['years'])
+        while day <= date.today():
+            if day.weekday() < 5:
+                days.append(day)
+            day += timedelta(days=1)
+        ensure_partitions(days[0])
+
+        brokers = [
+            Broker.objects.create(name=f"bench-{i}", fbs_a=str(i), fbs_b=str(i), stock_bno=str(i))
+            for i in range(options['brokers'])
+        ]
+        universe = [str(1101 + i) for i in range(900)]
+        batch = []
+        total = 0
+        for day in days:
+            for broker in brokers:
+                for code in rng.sample(universe, options['stocks']):
+                    buy, sell = rng.randint(0, 3000), rng.randint(0, 3000)
+                    batch.append(StockRecord(
+                        broker=broker, stock_code=code, stock_name=f"{code}名稱", date=day,
+                        buy_volume=buy, sell_volume=sell, net_volume=buy - sell))
+                if len(batch) >= 20000:
+                    StockRecord.objects.bulk_create(batch, batch_size=5000)
+                    total += len(batch)
+                    batch = []
+        StockRecord.objects.bulk_create(batch, batch_size=5000)
+        total += len(batch)
+        return brokers, days, total
+
+    def _queries(self, broker, day):
+        return [
+            ('live: day by net', StockRecord.objects.filter(date=day).order_by('-net_volume')),
+            ('broker day by net', StockRecord.objects.filter(
+                broker=broker, date=day, net_volume__gte=60).order_by('-net_volume')),
+            # StockRecordStatsView reads the raw rows only with a brokers filter
+            ('stats: broker totals', StockRecord.objects.filter(broker=broker).values('stock_code', 'stock_name').annotate(
+                total_buy=Sum('buy_volume'), total_sell=Sum('sell_volume'), total_net=Sum('net_volume')
+            ).order_by('-total_net')),
+        ]
+
+    def _measure(self, phase, brokers, days, options):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        rng = random.Random(1)
+        results = {}
+        for label, _ in self._queries(brokers[0], days[-1]):
+            timings = []
+            for _ in range(options['repeat']):
+                queryset = dict(self._queries(rng.choice(brokers), rng.choice(days)))[label]
+                start = time.perf_counter()
+                list(queryset)
+                timings.append(time.perf_counter() - start)
+            results[label] = statistics.median(timings) * 1000
+            if options['plans']:
+                plan = dict(self._queries(brokers[0], days[-1]))[label].explain()
+                self.stdout.write(f"[{phase}] {label}\n{plan}\n")
+        return results
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, keepdb=False)
+        try:
+            brokers, days, total = self._populate(options)
+            self.stdout.write(
+                f"{connection.vendor}{' (partitioned)' if is_partitioned() else ''}: {total} records, "
+                f"{len(brokers)} brokers, {len(days)} trading days")
+
+            indexes = StockRecord._meta.indexes
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(StockRecord, index)
+            before = self._measure('before', brokers, days, options)
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(StockRecord, index)
+            after = self._measure('after', brokers, days, options)
+
+            self.stdout.write(f"{'query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+            for label in before:
+                self.stdout.write(
+                    f"{label:<28}{before[label]:>12.2f}{after[label]:>12.2f}"
+                    f"{before[label] / after[label] if after[label] else 0:>9.1f}x")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
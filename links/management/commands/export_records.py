@@ -0,0 +1,46 @@
+import sys
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from links.utils.export import export_stream
+
+
+class Command(BaseCommand):
+    help = 'Stream StockRecord history (with broker names) to a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='File to write, or - for stdout')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--gzip', action='store_true', help='gzip-compress the output')
+        parser.add_argument('--start-date', help='First date (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last date (YYYY-MM-DD)')
+        parser.add_argument('--brokers', nargs='*', type=int, help='Broker ids')
+        parser.add_argument('--stock', help='Stock code')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start_date'], '%Y-%m-%d').date() if options['start_date'] else None
+            end = datetime.strptime(options['end_date'], '%Y-%m-%d').date() if options['end_date'] else None
+        except ValueError:
+            raise CommandError("Invalid date format. Use YYYY-MM-DD")
+
+        chunks = export_stream(
+            options['format'], options['gzip'],
+            start_date=start, end_date=end, broker_ids=options['brokers'], stock_code=options['stock'])
+
+        if options['output'] == '-':
+            if options['gzip']:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+            else:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending='')
+            return
+
+        if options['gzip']:
+            f = open(options['output'], 'wb')
+        else:
+            f = open(options['output'], 'w', encoding='utf-8', newline='')
+        with f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported to {options['output']}"))
@@ -1,14 +1,43 @@
 import os
 import requests
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from links.models import Broker, StockRecord
-from links.utils.crawler import generate_fubon_detail_link, fetch_top_buyers
+from links.models import Broker
+from links.utils import archive, page_cache
+from links.utils.crawler import generate_fubon_detail_link, fetch_top_buyers, parse_record_date
+from links.utils.ingest import ingest_broker_records, is_unchanged, table_hash
+from links.utils.parsers import parse_top_buyers
+from links.utils.volume_cube import update_cube
 from datetime import datetime
 
 
 class Command(BaseCommand):
     help = 'Fetch broker stock records from Fubon and store in DB'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replay', action='store_true',
+            help='Re-ingest archived zgb0 pages instead of fetching from Fubon')
+        parser.add_argument(
+            '--start-date', help='With --replay: first data date to re-ingest (YYYY-MM-DD)')
+        parser.add_argument(
+            '--end-date', help='With --replay: last data date to re-ingest (YYYY-MM-DD)')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Write pages even when they match the last ingested table (implied by --replay)')
+
+    def get_pages(self, link, options):
+        """(buy_data, date_str, sell_data) for every page to ingest for one broker."""
+        if not options['replay']:
+            # Never ingest a cached page: it may predate today's data
+            with page_cache.bypass():
+                return [fetch_top_buyers(link, record_type=1)]
+        return [
+            parse_top_buyers(archive.load_blob(sha256), record_type=1, link=link)
+            for data_date, sha256 in archive.list_pages(
+                link, options['start_date'], options['end_date'])
+        ]
+
     def handle(self, *args, **options):
         brokers = Broker.objects.all()
         if not brokers.exists():
@@ -20,6 +49,8 @@ class Command(BaseCommand):
 
         total_created = 0
         total_updated = 0
+        skipped = []
+        force = options['force'] or options['replay']
 
         for broker in brokers:
             self.stdout.write(f"Fetching data for broker: {broker.name}")
@@ -29,46 +60,33 @@ class Command(BaseCommand):
                 broker.fbs_a, broker.fbs_b, days=1)
 
             try:
-                buy_data, date_str, sell_data = fetch_top_buyers(
-                    link, record_type=1)
-
-                # date_str can be YYYY-MM-DD, YYYY/MM/DD or YYYYMMDD
-                try:
-                    clean_date_str = date_str.replace('/', '-').strip()
-                    if '-' in clean_date_str:
-                        record_date = datetime.strptime(
-                            clean_date_str, '%Y-%m-%d').date()
-                    else:
-                        # Handle YYYYMMDD format
-                        record_date = datetime.strptime(
-                            clean_date_str, '%Y%m%d').date()
-                except ValueError:
-                    self.stdout.write(self.style.ERROR(
-                        f"Could not parse date: {date_str} for {broker.name}"))
-                    continue
-
-                all_records = buy_data + sell_data
-
-                for item in all_records:
-                    obj, created = StockRecord.objects.update_or_create(
-                        broker=broker,
-                        stock_code=item['code'],
-                        date=record_date,
-                        record_type=1,
-                        defaults={
-                            'stock_name': item['name'],
-                            'buy_volume': item['buy'],
-                            'sell_volume': item['sell'],
-                            'net_volume': item['dif'],
-                        }
-                    )
-                    if created:
-                        total_created += 1
-                    else:
-                        total_updated += 1
-
-                self.stdout.write(self.style.SUCCESS(
-                    f"Successfully processed {broker.name} for date {record_date}"))
+                pages = self.get_pages(link, options)
+                if not pages:
+                    self.stdout.write(self.style.WARNING(
+                        f"No archived pages for {broker.name}"))
+
+                for buy_data, date_str, sell_data in pages:
+                    try:
+                        record_date = parse_record_date(date_str)
+                    except ValueError:
+                        self.stdout.write(self.style.ERROR(
+                            f"Could not parse date: {date_str} for {broker.name}"))
+                        continue
+
+                    digest = table_hash(buy_data, sell_data)
+                    if not force and is_unchanged(broker, record_date, digest):
+                        skipped.append(broker.name)
+                        self.stdout.write(
+                            f"Skipped {broker.name} for date {record_date}: unchanged since last run")
+                        continue
+
+                    created, updated = ingest_broker_records(
+                        broker, buy_data, record_date, sell_data, digest=digest)
+                    total_created += created
+                    total_updated += updated
+
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Successfully processed {broker.name} for date {record_date}"))
 
             except Exception as e:
                 self.stdout.write(self.style.ERROR(
@@ -77,3 +95,14 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(
             f"Finished. Created {total_created} records, updated {total_updated} records."
         ))
+        if skipped:
+            self.stdout.write(
+                f"Skipped {len(skipped)} unchanged brokers: {', '.join(skipped)}")
+
+        if settings.VOLUME_CUBE_ENABLED:
+            try:
+                # Replayed pages may rewrite old days, which an append would miss
+                days = update_cube(rebuild=options['replay'])
+                self.stdout.write(f"Volume cube updated ({days} days written)")
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Error updating volume cube: {str(e)}"))
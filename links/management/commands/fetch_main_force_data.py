@@ -0,0 +1,61 @@
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from links.models import StockRecord
+from links.utils import page_cache
+from links.utils.concurrency import run_concurrently
+from links.utils.crawler import fetch_stock_main_force_dated, parse_record_date, store_stock_main_force
+
+
+class Command(BaseCommand):
+    help = 'Fetch zco main-force broker rankings for the configured stocks and store them in DB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stocks', nargs='*',
+                            help='Stock codes (default: MAIN_FORCE_STOCKS, else the latest StockRecord day)')
+        parser.add_argument('--date', help='Trading day (YYYY-MM-DD), defaults to today')
+
+    def get_stocks(self, options):
+        if options['stocks']:
+            return options['stocks']
+        if settings.MAIN_FORCE_STOCKS:
+            return settings.MAIN_FORCE_STOCKS
+        latest = StockRecord.objects.order_by('-date').values_list('date', flat=True).first()
+        if latest is None:
+            return []
+        return list(StockRecord.objects.filter(date=latest).order_by('stock_code')
+                    .values_list('stock_code', flat=True).distinct())
+
+    def handle(self, *args, **options):
+        date_str = options['date'] or datetime.now().strftime("%Y-%m-%d")
+        try:
+            parse_record_date(date_str)
+        except ValueError:
+            raise CommandError("Invalid date format. Use YYYY-MM-DD")
+
+        stocks = self.get_stocks(options)
+        if not stocks:
+            self.stdout.write(self.style.WARNING('No stocks to fetch.'))
+            return
+
+        self.stdout.write(f"Fetching main force rankings for {len(stocks)} stocks on {date_str}")
+        # Rankings are stored from fresh pages, never from the page cache
+        with page_cache.bypass():
+            results = run_concurrently(lambda code: fetch_stock_main_force_dated(code, date_str), stocks)
+
+        stored = 0
+        for code, fetched in zip(stocks, results):
+            if not fetched:
+                self.stdout.write(self.style.ERROR(f"Error fetching main force data for {code}"))
+                continue
+            data, fetched_at = fetched
+            if not data["buy_list"] and not data["sell_list"]:
+                self.stdout.write(self.style.WARNING(f"No main force data for {code}"))
+                continue
+            day = store_stock_main_force(code, data, fetched_at)
+            if day is None:
+                self.stdout.write(self.style.ERROR(f"Could not parse date: {data['date']} for {code}"))
+                continue
+            stored += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Finished. Stored rankings for {stored}/{len(stocks)} stocks."))
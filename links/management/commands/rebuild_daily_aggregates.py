@@ -0,0 +1,24 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from links.utils.aggregates import rebuild_daily_aggregates
+from links.utils.data_version import bump_data_version
+
+
+class Command(BaseCommand):
+    help = 'Rebuild StockDailyAggregate from StockRecord (all dates, or a date range)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start_date'], '%Y-%m-%d').date() if options['start_date'] else None
+            end = datetime.strptime(options['end_date'], '%Y-%m-%d').date() if options['end_date'] else None
+        except ValueError:
+            raise CommandError("Invalid date format. Use YYYY-MM-DD")
+
+        days, rows = rebuild_daily_aggregates(start, end)
+        # Stats responses cached by clients may be out of date now
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} aggregates over {days} days."))
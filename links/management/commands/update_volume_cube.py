@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from links.utils.volume_cube import VolumeCube, update_cube
+
+
+class Command(BaseCommand):
+    help = 'Append new StockRecord days to the memory-mapped volume cube'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Rebuild the cube from scratch')
+
+    def handle(self, *args, **options):
+        days = update_cube(rebuild=options['rebuild'])
+        dates, brokers, stocks = VolumeCube.load().shape
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {days} days. Cube holds {dates} dates x {brokers} brokers x {stocks} stocks."))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.27 on 2026-10-17 19:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrokerStockDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_code', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('buy_volume', models.IntegerField(default=0)),
+                ('sell_volume', models.IntegerField(default=0)),
+                ('net_volume', models.IntegerField(default=0)),
+                ('is_final', models.BooleanField(default=False)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+                ('broker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_dailies', to='links.broker')),
+            ],
+            options={
+                'unique_together': {('broker', 'stock_code', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-17 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0002_broker_stock_daily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broker',
+            name='last_ingested_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='broker',
+            name='last_ingested_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-17 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0003_broker_ingest_stamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMainForce',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_code', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('side', models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell')], max_length=4)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('broker_name', models.CharField(max_length=100)),
+                ('buy_volume', models.IntegerField(default=0)),
+                ('sell_volume', models.IntegerField(default=0)),
+                ('net_volume', models.IntegerField(default=0)),
+                ('percent', models.CharField(blank=True, max_length=20)),
+                ('is_final', models.BooleanField(default=False)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('stock_code', 'date', 'side', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 4.2.27 on 2026-10-17 19:12
+
+from datetime import date
+from django.conf import settings
+from django.db import migrations, models
+from links.utils.partitions import (
+    TABLE, DEFAULT_PARTITION, create_month_partition, months_between, next_month
+)
+
+LEGACY = f'{TABLE}_legacy'
+SEQUENCE = f'{TABLE}_part_id_seq'
+COLUMNS = 'id, stock_code, stock_name, date, buy_volume, sell_volume, net_volume, record_type, broker_id'
+FIELDS_DDL = """
+    stock_code varchar(20) NOT NULL,
+    stock_name varchar(100) NOT NULL,
+    date date NOT NULL,
+    buy_volume integer NOT NULL,
+    sell_volume integer NOT NULL,
+    net_volume integer NOT NULL,
+    record_type integer NOT NULL,
+    broker_id bigint NOT NULL REFERENCES links_broker (id) DEFERRABLE INITIALLY DEFERRED
+"""
+
+
+def partition_stockrecord(apps, schema_editor):
+    """Postgres only: rebuild StockRecord as a table range partitioned by month.
+
+    Partitioned tables need the partition key in every unique constraint, so
+    the primary key becomes (id, date); (broker, stock_code, date,
+    record_type) already contains it. Identity columns are not allowed on
+    partitioned tables before Postgres 17, hence the explicit sequence.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} ("
+            f"id bigint NOT NULL DEFAULT nextval('{SEQUENCE}'),"
+            f"{FIELDS_DDL},"
+            "CONSTRAINT stockrecord_part_pkey PRIMARY KEY (id, date),"
+            "CONSTRAINT stockrecord_part_uniq UNIQUE (broker_id, stock_code, date, record_type)"
+            ") PARTITION BY RANGE (date)")
+        cursor.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"SELECT MIN(date) FROM {LEGACY}")
+        first = cursor.fetchone()[0] or date.today()
+        last = date.today()
+        for _ in range(settings.STOCKRECORD_PARTITION_MONTHS_AHEAD):
+            last = next_month(last)
+        for month in months_between(first, last):
+            create_month_partition(cursor, month)
+
+        cursor.execute(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {LEGACY}")
+        # Run the deferred broker FK checks of the copied rows now: Postgres
+        # refuses CREATE INDEX on a table with pending trigger events
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)")
+        cursor.execute(f"DROP TABLE {LEGACY}")
+
+
+# INCLUDE columns of stockrecord_date_broker_net, Postgres only (SQLite
+# has no covering indexes)
+COVERING_COLUMNS = ('stock_code', 'stock_name', 'buy_volume', 'sell_volume')
+
+
+def date_broker_net_index(connection):
+    include = COVERING_COLUMNS if connection.vendor == 'postgresql' else ()
+    return models.Index(
+        fields=['date', 'broker', 'net_volume'], include=include, name='stockrecord_date_broker_net')
+
+
+def add_date_broker_net_index(apps, schema_editor):
+    schema_editor.add_index(
+        apps.get_model('links', 'StockRecord'), date_broker_net_index(schema_editor.connection))
+
+
+def remove_date_broker_net_index(apps, schema_editor):
+    schema_editor.remove_index(
+        apps.get_model('links', 'StockRecord'), date_broker_net_index(schema_editor.connection))
+
+
+def unpartition_stockrecord(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} ("
+            "id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,"
+            f"{FIELDS_DDL},"
+            "UNIQUE (broker_id, stock_code, date, record_type))")
+        cursor.execute(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {LEGACY}")
+        # Run the deferred broker FK checks of the copied rows now: Postgres
+        # refuses CREATE INDEX on a table with pending trigger events
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)")
+        cursor.execute(f"DROP TABLE {LEGACY} CASCADE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0004_stock_main_force'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_stockrecord, unpartition_stockrecord),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='stockrecord',
+                    index=models.Index(fields=['date', 'broker', 'net_volume'], name='stockrecord_date_broker_net'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_date_broker_net_index, remove_date_broker_net_index),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.27 on 2026-10-17 19:14
+
+from django.db import migrations, models
+
+
+def build_aggregates(apps, schema_editor):
+    from links.utils.aggregates import rebuild_daily_aggregates
+    rebuild_daily_aggregates(
+        record_model=apps.get_model('links', 'StockRecord'),
+        aggregate_model=apps.get_model('links', 'StockDailyAggregate'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0005_stockrecord_partitions_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockDailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_code', models.CharField(max_length=20)),
+                ('stock_name', models.CharField(blank=True, max_length=100)),
+                ('date', models.DateField()),
+                ('record_type', models.IntegerField(default=1)),
+                ('total_buy', models.BigIntegerField(default=0)),
+                ('total_sell', models.BigIntegerField(default=0)),
+                ('total_net', models.BigIntegerField(default=0)),
+                ('broker_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'record_type'], name='stockdailyagg_date_type')],
+                'unique_together': {('stock_code', 'date', 'record_type')},
+            },
+        ),
+        migrations.RunPython(build_aggregates, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
 from links.models.broker import Broker
 from links.models.stock_record import StockRecord
+from links.models.broker_stock_daily import BrokerStockDaily
+from links.models.stock_main_force import StockMainForce
+from links.models.stock_daily_aggregate import StockDailyAggregate
+from links.models.data_version import DataVersion
 
-__all__ = ['Broker', 'StockRecord']
-
+__all__ = ['Broker', 'StockRecord', 'BrokerStockDaily', 'StockMainForce', 'StockDailyAggregate', 'DataVersion']
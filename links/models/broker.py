@@ -5,7 +5,9 @@ class Broker(models.Model):
     fbs_a = models.CharField(max_length=50)
     fbs_b = models.CharField(max_length=100)
     stock_bno = models.CharField(max_length=50)
+    # Latest zgb0 table written by fetch_broker_data, so repeat runs can skip it
+    last_ingested_date = models.DateField(null=True, blank=True)
+    last_ingested_hash = models.CharField(max_length=64, blank=True, default='')
 
     def __str__(self):
         return self.name
-
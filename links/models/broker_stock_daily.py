@@ -0,0 +1,19 @@
+from django.db import models
+from links.models.broker import Broker
+
+class BrokerStockDaily(models.Model):
+    """One broker's daily volume in one stock, harvested from the zco0 history page."""
+    broker = models.ForeignKey(Broker, on_delete=models.CASCADE, related_name='stock_dailies')
+    stock_code = models.CharField(max_length=20)
+    date = models.DateField()
+    buy_volume = models.IntegerField(default=0)
+    sell_volume = models.IntegerField(default=0)
+    net_volume = models.IntegerField(default=0)
+    is_final = models.BooleanField(default=False) # False while the trading day may still change
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('broker', 'stock_code', 'date')
+
+    def __str__(self):
+        return f"{self.date} - {self.broker.name} - {self.stock_code}"
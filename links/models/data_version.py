@@ -0,0 +1,13 @@
+from django.db import models
+
+class DataVersion(models.Model):
+    """Single row advanced on every write to the data behind the polled views.
+
+    Its version and time are the ETag / Last-Modified validators of those
+    views (see links/utils/data_version.py).
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"v{self.version} at {self.updated_at}"
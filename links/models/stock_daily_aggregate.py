@@ -0,0 +1,21 @@
+from django.db import models
+
+class StockDailyAggregate(models.Model):
+    """StockRecord totals per stock and day across all brokers, kept in step by ingestion."""
+    stock_code = models.CharField(max_length=20)
+    stock_name = models.CharField(max_length=100, blank=True)
+    date = models.DateField()
+    record_type = models.IntegerField(default=1)
+    total_buy = models.BigIntegerField(default=0)
+    total_sell = models.BigIntegerField(default=0)
+    total_net = models.BigIntegerField(default=0)
+    broker_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('stock_code', 'date', 'record_type')
+        indexes = [
+            models.Index(fields=['date', 'record_type'], name='stockdailyagg_date_type'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.stock_code}"
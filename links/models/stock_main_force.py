@@ -0,0 +1,25 @@
+from django.db import models
+
+class StockMainForce(models.Model):
+    """One row of a stock's zco main-force ranking (top buying or selling brokers) for a day."""
+    SIDE_BUY = 'buy'
+    SIDE_SELL = 'sell'
+    SIDE_CHOICES = [(SIDE_BUY, 'Buy'), (SIDE_SELL, 'Sell')]
+
+    stock_code = models.CharField(max_length=20)
+    date = models.DateField()
+    side = models.CharField(max_length=4, choices=SIDE_CHOICES)
+    rank = models.PositiveSmallIntegerField() # Position in the page's list, from 1
+    broker_name = models.CharField(max_length=100)
+    buy_volume = models.IntegerField(default=0)
+    sell_volume = models.IntegerField(default=0)
+    net_volume = models.IntegerField(default=0)
+    percent = models.CharField(max_length=20, blank=True)
+    is_final = models.BooleanField(default=False) # False while the trading day may still change
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('stock_code', 'date', 'side', 'rank')
+
+    def __str__(self):
+        return f"{self.date} - {self.stock_code} - {self.side} #{self.rank} {self.broker_name}"
@@ -13,6 +13,15 @@ class StockRecord(models.Model):
 
     class Meta:
         unique_together = ('broker', 'stock_code', 'date', 'record_type')
+        indexes = [
+            # DatabaseLiveCrawlerView: every broker's rows for one day by net_volume;
+            # also serves per-broker day lookups. On Postgres migration 0005
+            # builds it as a covering index (COVERING_COLUMNS in INCLUDE).
+            models.Index(
+                fields=['date', 'broker', 'net_volume'],
+                name='stockrecord_date_broker_net',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.broker.name} - {self.stock_code}"
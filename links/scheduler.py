@@ -12,6 +12,7 @@ def start():
         try:
             logger.info("Auto-executing fetch_broker_data task...")
             call_command('fetch_broker_data')
+            call_command('fetch_main_force_data')
             logger.info("Task completed successfully.")
         except Exception as e:
             logger.error(f"Error in scheduled task: {str(e)}")
@@ -4,7 +4,8 @@ from links.models import Broker, StockRecord
 class BrokerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Broker
-        fields = '__all__'
+        # The ingest stamp is fetch_broker_data bookkeeping, not API data
+        exclude = ['last_ingested_date', 'last_ingested_hash']
 
 class StockRecordSerializer(serializers.ModelSerializer):
     broker_name = serializers.ReadOnlyField(source='broker.name')
@@ -1,8 +1,42 @@
+from asgiref.sync import async_to_sync
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
+from django.core.management import call_command
+from django.conf import settings
+from django.test import override_settings
+from django.db import DatabaseError, connection
+from io import StringIO
 from datetime import datetime
+import csv
+import gzip
+import json
+import requests
+import os
+import tempfile
+import threading
+import time
+from zoneinfo import ZoneInfo
+from links.models import Broker, BrokerStockDaily, StockDailyAggregate, StockMainForce, StockRecord
+from links.utils import archive, http_client, page_cache, parsers, rate_limit
+from links.utils.parsers import parse_top_buyers, parse_zco0, parse_stock_main_force
+from links.utils.crawler import (
+    fetch_top_buyers, fetch_stock_main_force_data, generate_fubon_detail_link,
+    get_main_force_merged_data
+)
+from links.utils.concurrency import run_concurrently
+from links.utils.db_routing import ReplicaRouter, replica_reads, reset_connection_stats
+from links.utils.ingest import ingest_broker_records
+from links.utils.data_version import current_data_version
+from links.utils.partitions import ensure_partitions, months_between, partition_name
+from links.utils.volume_cube import VolumeCube, update_cube
+from links.utils.rate_limit import AdaptiveConcurrency, TokenBucket
+from links.utils.singleflight import single_flight
+from links.utils.stub_fubon import StubFubonServer
+from links.utils.http_client import (
+    fetch_page, add_timing_hook, remove_timing_hook, CrawlerFetchError
+)
 
 class StockMainForceCrawlerTests(APITestCase):
     def test_stock_main_force_crawler_no_number(self):
@@ -12,11 +46,11 @@ class StockMainForceCrawlerTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['error'], "Stock number is required")
 
-    @patch('links.views.broker.fetch_stock_main_force_data')
+    @patch('links.utils.crawler.fetch_stock_main_force_dated')
     def test_stock_main_force_crawler_success(self, mock_fetch):
         """測試成功抓取資料時的 API 回傳格式"""
         # 模擬爬蟲回傳的資料
-        mock_fetch.return_value = {
+        mock_fetch.return_value = ({
             "date": "2025-12-30",
             "buy_list": [
                 {"name": "測試券商A", "buy": 100, "sell": 10, "net": 90, "percent": "0.5%"}
@@ -24,7 +58,7 @@ class StockMainForceCrawlerTests(APITestCase):
             "sell_list": [
                 {"name": "測試券商B", "buy": 10, "sell": 100, "net": -90, "percent": "0.5%"}
             ]
-        }
+        }, None)
         
         url = reverse('stock-main-force-crawler')
         response = self.client.get(url, {'number': '2330'})
@@ -35,6 +69,76 @@ class StockMainForceCrawlerTests(APITestCase):
         self.assertTrue(len(response.data['buy_list']) > 0)
         self.assertEqual(response.data['buy_list'][0]['name'], "測試券商A")
 
+    @patch('links.utils.crawler.market_now')
+    @patch('links.utils.crawler.fetch_stock_main_force_dated')
+    def test_past_dates_are_served_from_db(self, mock_fetch, mock_now):
+        """測試已收盤日期的主力排行由資料庫回應，當日資料仍即時抓取"""
+        mock_now.return_value = datetime(2025, 12, 30, 10, 0, tzinfo=ZoneInfo('Asia/Taipei'))
+        data = {
+            "date": "2025-12-29",
+            "buy_list": [{"name": "測試券商A", "buy": 100, "sell": 10, "net": 90, "percent": "0.5%"}],
+            "sell_list": [{"name": "測試券商B", "buy": 10, "sell": 100, "net": -90, "percent": "0.5%"}],
+        }
+        mock_fetch.return_value = (data, None)
+        url = reverse('stock-main-force-crawler')
+
+        first = self.client.get(url, {'number': '2330', 'date': '2025-12-29'})
+        second = self.client.get(url, {'number': '2330', 'date': '2025-12-29'})
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.data['buy_list'], data['buy_list'])
+        self.assertEqual(StockMainForce.objects.filter(stock_code='2330', is_final=True).count(), 2)
+
+        # 盤中的當日排行尚未定案，每次都重新抓取
+        mock_fetch.return_value = (dict(data, date="2025-12-30"), None)
+        self.client.get(url, {'number': '2330', 'date': '2025-12-30'})
+        self.client.get(url, {'number': '2330', 'date': '2025-12-30'})
+        self.assertEqual(mock_fetch.call_count, 3)
+
+    @patch('links.utils.crawler.market_now')
+    @patch('links.utils.crawler.fetch_stock_main_force_dated')
+    def test_finality_follows_page_fetch_time(self, mock_fetch, mock_now):
+        """測試主力排行是否定案依頁面的抓取時間判斷，快取中的盤中頁面在收盤後不會被標為定案"""
+        taipei = ZoneInfo('Asia/Taipei')
+        mock_now.return_value = datetime(2025, 12, 30, 20, 0, tzinfo=taipei)
+        data = {
+            "date": "2025-12-30",
+            "buy_list": [{"name": "測試券商A", "buy": 100, "sell": 10, "net": 90, "percent": "0.5%"}],
+            "sell_list": [],
+        }
+        mock_fetch.return_value = (data, datetime(2025, 12, 30, 10, 0, tzinfo=taipei).timestamp())
+        url = reverse('stock-main-force-crawler')
+        self.client.get(url, {'number': '2330', 'date': '2025-12-30'})
+        self.assertFalse(StockMainForce.objects.filter(stock_code='2330', is_final=True).exists())
+        with patch('links.utils.async_crawler.fetch_stock_main_force_dated',
+                   AsyncMock(return_value=mock_fetch.return_value)):
+            response = self.client.get(reverse('async-stock-main-force-crawler'), {'number': '2330', 'date': '2025-12-30'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(StockMainForce.objects.filter(stock_code='2330', is_final=True).exists())
+
+        # 收盤後重新抓取的頁面才標為定案，之後由資料庫回應
+        mock_fetch.return_value = (data, None)
+        self.client.get(url, {'number': '2330', 'date': '2025-12-30'})
+        self.assertTrue(StockMainForce.objects.filter(stock_code='2330', is_final=True).exists())
+        self.client.get(url, {'number': '2330', 'date': '2025-12-30'})
+        self.assertEqual(mock_fetch.call_count, 2)
+
+    @patch('links.management.commands.fetch_main_force_data.fetch_stock_main_force_dated')
+    def test_fetch_main_force_data_command(self, mock_fetch):
+        """測試 fetch_main_force_data 依設定的股票清單寫入排行"""
+        mock_fetch.side_effect = lambda code, date_str: ({
+            "date": date_str,
+            "buy_list": [{"name": f"{code}買方", "buy": 5, "sell": 1, "net": 4, "percent": "1%"}],
+            "sell_list": [],
+        }, None) if code != '9999' else None
+        out = StringIO()
+        with override_settings(MAIN_FORCE_STOCKS=['2330', '2317', '9999']):
+            call_command('fetch_main_force_data', '--date', '2025-12-29', stdout=out)
+        self.assertIn("Stored rankings for 2/3 stocks", out.getvalue())
+        self.assertEqual(
+            set(StockMainForce.objects.values_list('stock_code', 'broker_name')),
+            {('2330', '2330買方'), ('2317', '2317買方')})
+
     def test_real_crawler_call(self):
         """
         如果要進行真實的網路爬蟲測試（不使用 Mock），可以取消註解這段。
@@ -45,3 +149,1178 @@ class StockMainForceCrawlerTests(APITestCase):
         # print(f"\nReal Crawler Result for 2330: {response.data}")
         # self.assertEqual(response.status_code, status.HTTP_200_OK)
         pass
+
+
+class LiveCrawlerTests(APITestCase):
+    def setUp(self):
+        for i in range(5):
+            Broker.objects.create(
+                name=f"券商{i}", fbs_a=f"A{i}", fbs_b=f"B{i}", stock_bno=f"N{i}")
+
+    @patch('links.views.broker.get_main_force_merged_data')
+    @patch('links.views.broker.get_merged_data')
+    def test_live_crawler_keeps_order_and_totals(self, mock_merged, mock_main_force):
+        """測試並行抓取時回傳順序與總計與逐一抓取相同"""
+        def fake_merged(a, b, name):
+            # 讓前面的券商比較慢，確認結果仍依券商順序排列
+            time.sleep(0.01 * (5 - int(a[1:])))
+            return [{"code": a}], f"2025-12-{30 - int(a[1:])}", []
+
+        def fake_main_force(number, a, b, date, broker=None):
+            i = int(a[1:])
+            return {"buy": 10 * i, "sell": i, "net": 9 * i, "date": date}
+
+        mock_merged.side_effect = fake_merged
+        mock_main_force.side_effect = fake_main_force
+
+        url = reverse('live-crawler')
+        response = self.client.get(url, {'number': '2330'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [b['broker_name'] for b in response.data['brokers_data']]
+        self.assertEqual(names, [f"券商{i}" for i in range(5)])
+        dates = [b['date'] for b in response.data['brokers_data']]
+        self.assertEqual(dates, [f"2025-12-{30 - i}" for i in range(5)])
+        # zco0 必須使用該券商 zgb0 回傳的日期
+        for call in mock_main_force.call_args_list:
+            number, a, b, date = call.args
+            self.assertEqual(date, f"2025-12-{30 - int(a[1:])}")
+        self.assertEqual(response.data['total_stats'], {
+            "buy": 100, "sell": 10, "net": "+90"})
+
+    @patch('links.views.broker.get_main_force_merged_data')
+    @patch('links.views.broker.get_merged_data')
+    def test_stream_sends_each_broker_as_it_finishes(self, mock_merged, mock_main_force):
+        """測試串流模式在各券商完成時立即送出結果，錯誤隨該券商回報，最後送出總計"""
+        def fake_merged(a, b, name):
+            i = int(a[1:])
+            if i == 2:
+                raise CrawlerFetchError("upstream down")
+            time.sleep(0.5 if i == 0 else 0.01)
+            return [{"code": a}], "2025-12-30", []
+
+        mock_merged.side_effect = fake_merged
+        mock_main_force.side_effect = lambda number, a, b, date, broker=None: {
+            "buy": 10, "sell": 1, "net": 9, "date": date}
+
+        started = time.perf_counter()
+        response = self.client.get(reverse('live-crawler'), {'number': '2330', 'stream': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        events = []
+        first_broker_at = None
+        for chunk in response.streaming_content:
+            event = json.loads(chunk)
+            if event['event'] == 'broker' and first_broker_at is None:
+                first_broker_at = time.perf_counter() - started
+            events.append(event)
+
+        self.assertLess(first_broker_at, 0.4)
+        # 券商依 id 排序列出，與完成順序無關
+        self.assertEqual(events[0]['brokers'], list(Broker.objects.order_by('id').values_list('name', flat=True)))
+        brokers = [e for e in events if e['event'] == 'broker']
+        self.assertEqual(sorted(e['index'] for e in brokers), list(range(5)))
+        # 最慢的券商最後送出
+        self.assertEqual(brokers[-1]['index'], 0)
+        failed = next(e for e in brokers if e['index'] == 2)
+        self.assertEqual(failed['result']['date'], 'Error')
+        self.assertIn('upstream down', failed['errors'][0])
+        self.assertEqual(events[-1], {
+            "event": "total_stats", "stock_number": "2330",
+            "total_stats": {"buy": 40, "sell": 4, "net": "+36"}})
+
+    @patch('links.views.broker.get_merged_data', return_value=([], "2025-12-30", []))
+    def test_stream_as_server_sent_events(self, mock_merged):
+        """測試 stream=sse 以 Server-Sent Events 格式輸出"""
+        response = self.client.get(reverse('live-crawler'), {'stream': 'sse'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        body = b''.join(response.streaming_content).decode('utf-8')
+        messages = body.strip().split('\n\n')
+        self.assertEqual(len(messages), 7)
+        self.assertTrue(messages[1].startswith('event: broker\ndata: {'))
+        self.assertEqual(messages[-1], 'event: total_stats\ndata: {"stock_number": "", "total_stats": null}')
+
+        # ASGI 下改以非同步迭代器逐筆送出
+        async def read_asgi():
+            response = await self.async_client.get(reverse('live-crawler'), {'stream': 'sse'})
+            return response.is_async, b''.join([chunk async for chunk in response.streaming_content])
+        is_async, asgi_body = async_to_sync(read_asgi)()
+        self.assertTrue(is_async)
+        self.assertEqual(asgi_body.decode('utf-8').strip().split('\n\n')[-1], messages[-1])
+
+        response = self.client.get(reverse('live-crawler'), {'stream': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def fake_response(status_code=200, body="資料日期：2025/12/30"):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp._content = body.encode('big5')
+    resp.headers['Content-Type'] = 'text/html'
+    resp.encoding = 'ISO-8859-1'
+    resp.url = 'https://example.test/'
+    return resp
+
+
+class HttpClientTests(APITestCase):
+
+    @patch('links.utils.http_client.get_session')
+    def test_fetch_page_decodes_big5_and_reports_timing(self, mock_session):
+        """測試共用 HTTP client 會以 Big5 解碼並呼叫計時 hook"""
+        mock_session.return_value.get.return_value = fake_response()
+        calls = []
+
+        def hook(url, elapsed, status_code, error):
+            calls.append((url, status_code, error))
+
+        add_timing_hook(hook)
+        try:
+            html = fetch_page('https://example.test/')
+        finally:
+            remove_timing_hook(hook)
+
+        self.assertEqual(html, "資料日期：2025/12/30")
+        self.assertEqual(calls, [('https://example.test/', 200, None)])
+
+    @patch('links.utils.http_client.get_session')
+    def test_fetch_top_buyers_raises_on_upstream_error(self, mock_session):
+        """測試上游錯誤時不再回傳空清單，而是拋出 CrawlerFetchError"""
+        mock_session.return_value.get.return_value = fake_response(503)
+        with self.assertRaises(CrawlerFetchError):
+            fetch_top_buyers('https://example.test/zgb0')
+
+
+class PageCacheTests(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            CRAWLER_CACHE_ENABLED=True,
+            CRAWLER_CACHE_PATH=os.path.join(self.tmpdir.name, 'cache.sqlite3'),
+            CRAWLER_CACHE_MAX_ENTRIES=2,
+            CRAWLER_CACHE_STALE_SECONDS=60,
+        )
+        self.settings_override.enable()
+        self.fetched = []
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        return f"<html>{len(self.fetched)}</html>"
+
+    def test_hit_after_miss_with_normalized_url(self):
+        """測試相同網址（參數順序不同）第二次會命中快取"""
+        first = page_cache.get_page('https://HOST/z/zgb0.djhtm?a=1&b=2', self.fetch)
+        second = page_cache.get_page('https://host/z/zgb0.djhtm?b=2&a=1', self.fetch)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.fetched), 1)
+        stats = page_cache.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        # 非同步版本的 SQLite 查詢在工作執行緒執行，不佔用事件迴圈
+        async def fetch(url):
+            return self.fetch(url)
+
+        async def get_async():
+            loop_thread = threading.get_ident()
+            with patch('links.utils.page_cache._lookup', side_effect=lambda *args: (
+                    lookup_threads.append(threading.get_ident()) or lookup(*args))):
+                body = await page_cache.get_page_async('https://host/z/zgb0.djhtm?a=1&b=2', fetch)
+            return body, loop_thread
+        lookup, lookup_threads = page_cache._lookup, []
+        body, loop_thread = async_to_sync(get_async)()
+        self.assertEqual(body, first)
+        self.assertEqual(len(self.fetched), 1)
+        self.assertNotIn(loop_thread, lookup_threads)
+
+        # 命中時一併回傳頁面原本的抓取時間
+        before = time.time()
+        body, fetched_at = page_cache.get_page_dated('https://host/z/zgb0.djhtm?a=1&b=2', self.fetch)
+        self.assertEqual(body, first)
+        self.assertLessEqual(fetched_at, before)
+        self.assertEqual(page_cache.get_page_dated('https://host/other', self.fetch)[1], None)
+
+    def test_bypass_fetches_fresh_and_updates_the_cache(self):
+        """測試匯入指令略過快取，一律重新抓取，並更新快取供之後讀取"""
+        url = 'https://host/z/zgb0.djhtm?a=1&b=2'
+        page_cache.get_page(url, self.fetch)
+        with page_cache.bypass():
+            self.assertEqual(page_cache.get_page(url, self.fetch), "<html>2</html>")
+        self.assertEqual(page_cache.get_page(url, self.fetch), "<html>2</html>")
+        self.assertEqual(len(self.fetched), 2)
+
+    @patch('links.utils.page_cache._spawn_refresh')
+    def test_stale_page_served_while_one_refresh_runs(self, mock_spawn):
+        """測試過期但仍在 stale 區間的頁面會立即回傳，並只觸發一次背景更新"""
+        url = 'https://host/z/zco0.djhtm?a=2330'
+        page_cache.get_page(url, self.fetch)
+        with patch('links.utils.page_cache.time.time', return_value=time.time() + 5 * 60 + 1):
+            self.assertEqual(page_cache.get_page(url, self.fetch), "<html>1</html>")
+            self.assertEqual(page_cache.get_page(url, self.fetch), "<html>1</html>")
+        self.assertEqual(mock_spawn.call_count, 1)
+        self.assertEqual(page_cache.cache_stats()['stale_hits'], 2)
+
+    def test_lru_eviction(self):
+        """測試超過上限時淘汰最久未使用的頁面"""
+        with patch('links.utils.page_cache.time.time', side_effect=[1, 1, 2, 2, 3, 3, 4]):
+            page_cache.get_page('https://host/a', self.fetch)
+            page_cache.get_page('https://host/b', self.fetch)
+            page_cache.get_page('https://host/c', self.fetch)
+        stats = page_cache.cache_stats()
+        self.assertEqual((stats['entries'], stats['evictions']), (2, 1))
+
+
+class SingleFlightTests(APITestCase):
+    def test_concurrent_identical_calls_share_one_fetch(self):
+        """測試同時間相同網址的請求只會實際抓取一次"""
+        calls = []
+        release = threading.Event()
+
+        @single_flight
+        def fake_fetch(link, record_type=1):
+            calls.append(link)
+            release.wait(5)
+            return [{"code": "2330"}], "2025-12-30", []
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                fake_fetch('https://host/zgb0?a=1&b=2')))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        # 每個呼叫者拿到的是獨立副本
+        results[0][0][0]['code'] = 'changed'
+        self.assertEqual(results[1][0][0]['code'], '2330')
+
+    def test_errors_are_shared_and_not_cached(self):
+        """測試失敗的請求會拋出錯誤，之後的請求會重新抓取"""
+        calls = []
+
+        @single_flight
+        def failing_fetch(link):
+            calls.append(link)
+            raise CrawlerFetchError("boom")
+
+        with self.assertRaises(CrawlerFetchError):
+            failing_fetch('https://host/zco0')
+        with self.assertRaises(CrawlerFetchError):
+            failing_fetch('https://host/zco0')
+        self.assertEqual(len(calls), 2)
+
+
+TESTDATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+
+def load_testdata_page(name):
+    with open(os.path.join(TESTDATA_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class ParserParityTests(APITestCase):
+    """The synthetic Fubon-shaped pages in testdata/ must parse to exactly what the full-tree parser returned (expected.json)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(os.path.join(TESTDATA_DIR, 'expected.json'), encoding='utf-8') as f:
+            cls.expected = json.load(f)
+
+    def _parse(self, func, name, arg, fast):
+        html = load_testdata_page(name)
+        if func == 'fetch_top_buyers':
+            return list(parse_top_buyers(html, record_type=int(arg), fast=fast))
+        if func == 'fetch_fubon_zco0_data':
+            return parse_zco0(html, arg, fast=fast)
+        return parse_stock_main_force(html, arg, fast=fast)
+
+    def test_fast_and_full_parsers_match_expected_output(self):
+        """測試快速解析器與完整解析器在合成的測試頁面上結果完全一致"""
+        for key, expected in self.expected.items():
+            func, name, arg = key.split(':')
+            for fast in (True, False):
+                with self.subTest(key=key, fast=fast):
+                    self.assertEqual(self._parse(func, name, arg, fast), expected)
+
+    @patch('links.utils.crawler.fetch_html')
+    def test_crawler_fetchers_use_fast_parser(self, mock_fetch_html):
+        """測試爬蟲函式透過快速解析器回傳相同資料"""
+        mock_fetch_html.return_value = load_testdata_page('zgb0_daily.html')
+        buy_data, date, sell_data = fetch_top_buyers('https://host/zgb0?testdata=1')
+        self.assertEqual(
+            [buy_data, date, sell_data], self.expected['fetch_top_buyers:zgb0_daily.html:1'])
+
+    def test_slice_handles_nested_and_unclosed_tables(self):
+        """測試擷取 oMainTable 時能處理巢狀與未關閉的 table"""
+        html = '<table><tr><td>x</td></tr></table><TABLE id="oMainTable"><tr><td><table><tr><td>1</td></tr></table></td></tr></TABLE><table></table>'
+        table = parsers._main_table(html, fast=True)
+        self.assertEqual(len(table.find_all('table')), 1)
+        unclosed = '<p>head</p><table id=oMainTable><tr><td>1</td></tr>'
+        self.assertEqual(parsers._main_table(unclosed, fast=True).get_text(), '1')
+
+
+class ArchiveReplayTests(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            CRAWLER_ARCHIVE_ENABLED=True, CRAWLER_ARCHIVE_DIR=self.tmpdir.name)
+        self.settings_override.enable()
+        self.broker = Broker.objects.create(
+            name="美林", fbs_a="1440", fbs_b="1440", stock_bno="1440")
+        self.link = generate_fubon_detail_link("1440", "1440", days=1)
+        self.page = load_testdata_page('zgb0_daily.html')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    @patch('links.utils.crawler.fetch_page')
+    def test_fetched_pages_are_archived_and_replayed(self, mock_fetch_page):
+        """測試抓取的頁面會存入封存，重播模式不再連線"""
+        mock_fetch_page.return_value = self.page
+        live = fetch_top_buyers(self.link)
+
+        self.assertEqual(archive.list_pages(self.link)[0][0], '2025-12-30')
+        mock_fetch_page.side_effect = AssertionError("network used in replay")
+        with archive.replay():
+            self.assertEqual(fetch_top_buyers(self.link), live)
+            with self.assertRaises(CrawlerFetchError):
+                fetch_top_buyers(generate_fubon_detail_link("9999", "9999"))
+
+    def test_fetch_broker_data_replays_archived_dates(self):
+        """測試 fetch_broker_data --replay 依日期重新匯入封存頁面"""
+        archive.store_page(self.link, self.page)
+        archive.store_page(self.link, self.page.replace('資料日期：20251230', '資料日期：20251229'))
+
+        call_command('fetch_broker_data', '--replay', stdout=StringIO())
+        dates = set(StockRecord.objects.values_list('date', flat=True))
+        self.assertEqual({str(d) for d in dates}, {'2025-12-29', '2025-12-30'})
+
+        StockRecord.objects.all().delete()
+        call_command('fetch_broker_data', '--replay', '--start-date', '2025-12-30', stdout=StringIO())
+        dates = set(StockRecord.objects.values_list('date', flat=True))
+        self.assertEqual({str(d) for d in dates}, {'2025-12-30'})
+
+
+class StubFubonServerTests(APITestCase):
+    def test_fetchers_against_stub_server(self):
+        """測試爬蟲函式可透過本機 stub 伺服器抓取 Big5 頁面"""
+        with open(os.path.join(TESTDATA_DIR, 'expected.json'), encoding='utf-8') as f:
+            expected = json.load(f)
+
+        with StubFubonServer() as stub, override_settings(FUBON_BASE_URL=stub.base_url):
+            link = generate_fubon_detail_link('1440', 'stub-test')
+            self.assertEqual(
+                list(fetch_top_buyers(link)), expected['fetch_top_buyers:zgb0_daily.html:1'])
+            self.assertEqual(
+                fetch_stock_main_force_data('2330', '2025-12-30'),
+                expected['fetch_stock_main_force_data:zco_flat.html:2025-12-30'])
+        self.assertEqual(stub.request_count, 2)
+
+    def test_injected_errors_are_retried(self):
+        """測試 stub 注入的 503 錯誤會由 HTTP client 重試"""
+        with StubFubonServer(error_rate=0.5, seed=1) as stub, \
+                override_settings(FUBON_BASE_URL=stub.base_url, CRAWLER_HTTP_BACKOFF=0.01, CRAWLER_HTTP_RETRIES=10):
+            http_client.reset_session()
+            try:
+                for i in range(5):
+                    fetch_top_buyers(generate_fubon_detail_link('1440', f'retry-{i}'))
+            finally:
+                http_client.reset_session()
+        self.assertGreater(stub.error_count, 0)
+        self.assertEqual(stub.request_count - stub.error_count, 5)
+
+
+class RateLimiterTests(APITestCase):
+    def test_aimd_grows_on_success_and_halves_on_congestion(self):
+        """測試 AIMD：正常回應時緩慢增加，429/5xx 時減半且不低於下限"""
+        limiter = AdaptiveConcurrency(initial=4, minimum=1, maximum=5, latency_target=1.0)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(0.05, congested=False)
+        self.assertAlmostEqual(limiter.limit, 5.0, places=0)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(0.05, congested=False)
+        self.assertEqual(limiter.limit, 5)
+
+        limiter.acquire()
+        limiter.release(0.05, congested=True)
+        self.assertEqual(limiter.limit, 2.5)
+        # 同一個延遲區間內的連續失敗只算一次
+        limiter.acquire()
+        limiter.release(0.05, congested=True)
+        self.assertEqual(limiter.limit, 2.5)
+        limiter.last_decrease = 0
+        limiter.acquire()
+        limiter.release(5.0, congested=False)  # 超過 latency_target 也視為壅塞
+        self.assertEqual(limiter.limit, 1.25)
+
+    def test_token_bucket_throttles_after_burst(self):
+        """測試 token bucket 用完 burst 後會等待"""
+        bucket = TokenBucket(rate=50, burst=2)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertGreater(bucket.acquire(), 0.0)
+
+    @patch('links.utils.http_client.get_session')
+    def test_upstream_errors_back_off_host_limit(self, mock_session):
+        """測試上游 503 會讓該主機的並行上限減半，並可由狀態端點查看"""
+        mock_session.return_value.get.return_value = fake_response(503)
+        rate_limit.reset_limiters()
+        with override_settings(CRAWLER_CONCURRENCY_INITIAL=8):
+            with self.assertRaises(CrawlerFetchError):
+                fetch_page('https://limited.example/zgb0')
+        state = self.client.get(reverse('crawler-status')).data['rate_limiters']['limited.example']
+        self.assertEqual(state['concurrency_limit'], 4)
+        self.assertEqual(state['backoffs'], 1)
+        rate_limit.reset_limiters()
+
+
+class ZcoHistoryHarvestTests(APITestCase):
+    def setUp(self):
+        self.broker = Broker.objects.create(
+            name="美林", fbs_a="1440", fbs_b="1440", stock_bno="1440")
+        with open(os.path.join(TESTDATA_DIR, 'expected.json'), encoding='utf-8') as f:
+            self.expected = json.load(f)
+
+    @patch('links.utils.crawler.market_now')
+    @patch('links.utils.crawler.fetch_html_dated')
+    def test_one_fetch_serves_every_date(self, mock_fetch_html, mock_now):
+        """測試一次 zco0 抓取會寫入所有日期，之後查詢其他日期不再連線"""
+        mock_fetch_html.return_value = (load_testdata_page('zco0_history.html'), None)
+        mock_now.return_value = datetime(2025, 12, 30, 10, 0, tzinfo=ZoneInfo('Asia/Taipei'))
+
+        first = get_main_force_merged_data('2330', '1440', '1440', '2025-12-30', broker=self.broker)
+        self.assertEqual(first, self.expected['fetch_fubon_zco0_data:zco0_history.html:2025-12-30'])
+        self.assertEqual(BrokerStockDaily.objects.filter(broker=self.broker, stock_code='2330').count(), 60)
+
+        # 過去日期已定案，直接由資料表回答（YYYYMMDD 格式也可）
+        second = get_main_force_merged_data('2330', '1440', '1440', '20251201', broker=self.broker)
+        expected = dict(self.expected['fetch_fubon_zco0_data:zco0_history.html:2025-12-01'], date='20251201')
+        self.assertEqual(second, expected)
+        self.assertEqual(mock_fetch_html.call_count, 1)
+
+        # 盤中的當日資料尚未定案，會重新抓取
+        get_main_force_merged_data('2330', '1440', '1440', '2025-12-30', broker=self.broker)
+        self.assertEqual(mock_fetch_html.call_count, 2)
+
+        # 頁面上沒有的日期回傳 0
+        missing = get_main_force_merged_data('2330', '1440', '1440', '2025-06-02', broker=self.broker)
+        self.assertEqual(missing, {"buy": 0, "sell": 0, "net": 0, "date": "2025-06-02"})
+
+    @patch('links.utils.crawler.market_now')
+    @patch('links.utils.crawler.fetch_html_dated')
+    def test_finality_follows_page_fetch_time(self, mock_fetch_html, mock_now):
+        """測試是否定案依頁面的抓取時間判斷，快取中的盤中頁面不會在收盤後被標為定案"""
+        taipei = ZoneInfo('Asia/Taipei')
+        mock_now.return_value = datetime(2025, 12, 30, 20, 0, tzinfo=taipei)
+        fetched_at = datetime(2025, 12, 30, 10, 0, tzinfo=taipei).timestamp()
+        mock_fetch_html.return_value = (load_testdata_page('zco0_history.html'), fetched_at)
+
+        get_main_force_merged_data('2330', '1440', '1440', '2025-12-30', broker=self.broker)
+        rows = BrokerStockDaily.objects.filter(broker=self.broker, stock_code='2330')
+        self.assertFalse(rows.get(date=datetime(2025, 12, 30).date()).is_final)
+        self.assertTrue(rows.get(date=datetime(2025, 12, 29).date()).is_final)
+
+        # 收盤後重新抓取的頁面才將當日標為定案
+        mock_fetch_html.return_value = (load_testdata_page('zco0_history.html'), None)
+        get_main_force_merged_data('2330', '1440', '1440', '2025-12-30', broker=self.broker)
+        self.assertTrue(rows.get(date=datetime(2025, 12, 30).date()).is_final)
+
+    @patch('links.utils.crawler.market_now')
+    @patch('links.utils.crawler.fetch_html_dated')
+    def test_final_days_without_trades_are_stored(self, mock_fetch_html, mock_now):
+        """測試頁面涵蓋範圍內無交易的已定案日期記為 0，查詢時不再重新抓取"""
+        mock_fetch_html.return_value = (load_testdata_page('zco0_history.html'), None)
+        mock_now.return_value = datetime(2026, 1, 2, 20, 0, tzinfo=ZoneInfo('Asia/Taipei'))
+
+        get_main_force_merged_data('2330', '1440', '1440', '2026-01-02', broker=self.broker)
+        quiet = BrokerStockDaily.objects.filter(broker=self.broker, stock_code='2330', net_volume=0, is_final=True)
+        # 2025-12-31 至 2026-01-02 三個平日在頁面上沒有交易紀錄
+        self.assertEqual([str(d) for d in quiet.values_list('date', flat=True).order_by('date')],
+                         ['2025-12-31', '2026-01-01', '2026-01-02'])
+
+        data = get_main_force_merged_data('2330', '1440', '1440', '2025-12-31', broker=self.broker)
+        self.assertEqual(data, {"buy": 0, "sell": 0, "net": 0, "date": "2025-12-31"})
+        self.assertEqual(mock_fetch_html.call_count, 1)
+
+
+class BackfillCommandTests(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmpdir.name, 'checkpoint.jsonl')
+        for code in ('1440', '1470'):
+            Broker.objects.create(name=f"券商{code}", fbs_a=code, fbs_b=code, stock_bno=code)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def backfill(self, *args):
+        out = StringIO()
+        call_command(
+            'backfill_broker_data', '--start-date', '2025-12-29', '--end-date', '2025-12-30',
+            '--workers', '2', '--checkpoint', self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_backfill_writes_matching_dates_and_resumes(self):
+        """測試回補指令只寫入日期相符的頁面，並可從 checkpoint 接續"""
+        with StubFubonServer() as stub, override_settings(FUBON_BASE_URL=stub.base_url):
+            output = self.backfill()
+            # stub 永遠回傳 2025-12-30 的頁面，12-29 視為無資料
+            self.assertIn("Backfilling 4 broker-dates (0 already done)", output)
+            self.assertEqual(
+                {str(d) for d in StockRecord.objects.values_list('date', flat=True)}, {'2025-12-30'})
+            self.assertEqual(StockRecord.objects.values('broker').distinct().count(), 2)
+            self.assertIn("2 without data, 0 failed", output)
+            requests_after_first_run = stub.request_count
+
+            output = self.backfill()
+            self.assertIn("Backfilling 0 broker-dates (4 already done)", output)
+            self.assertEqual(stub.request_count, requests_after_first_run)
+
+    @patch('links.management.commands.backfill_broker_data.fetch_html')
+    def test_failed_fetches_are_not_checkpointed(self, mock_fetch_html):
+        """測試抓取失敗的 broker-date 不會寫入 checkpoint，重跑時會再試"""
+        mock_fetch_html.side_effect = CrawlerFetchError("timeout")
+        output = self.backfill()
+        self.assertIn("4 failed", output)
+
+        mock_fetch_html.side_effect = None
+        mock_fetch_html.return_value = load_testdata_page('zgb0_daily.html')
+        output = self.backfill()
+        self.assertIn("Backfilling 4 broker-dates (0 already done)", output)
+
+    def test_failed_writes_are_not_checkpointed(self):
+        """測試單一 broker-date 寫入失敗時繼續回補其他日期，且失敗者不寫入 checkpoint"""
+        def flaky(broker, *args):
+            if broker.name == '券商1440':
+                raise DatabaseError("deadlock detected")
+            return ingest_broker_records(broker, *args)
+
+        with StubFubonServer() as stub, override_settings(FUBON_BASE_URL=stub.base_url):
+            with patch('links.management.commands.backfill_broker_data.ingest_broker_records', side_effect=flaky):
+                output = self.backfill()
+            self.assertIn("Error storing 券商1440 2025-12-30: deadlock detected", output)
+            self.assertIn("2 without data, 1 failed", output)
+            self.assertEqual(StockRecord.objects.values('broker').distinct().count(), 1)
+
+            output = self.backfill()
+            self.assertIn("Backfilling 1 broker-dates (3 already done)", output)
+            self.assertEqual(StockRecord.objects.values('broker').distinct().count(), 2)
+
+
+class IngestTests(APITestCase):
+    def setUp(self):
+        self.broker = Broker.objects.create(name="測試券商", fbs_a="1440", fbs_b="1440", stock_bno="1440")
+        self.day = datetime(2025, 12, 30).date()
+
+    def row(self, code, buy, sell):
+        return {'code': code, 'name': f"{code}名稱", 'buy': buy, 'sell': sell, 'dif': buy - sell}
+
+    def test_counts_match_update_or_create(self):
+        """測試批次寫入回傳的新增/更新筆數與逐筆 update_or_create 相同"""
+        buy = [self.row('2330', 100, 10), self.row('2317', 50, 5)]
+        sell = [self.row('2603', 1, 80)]
+        self.assertEqual(ingest_broker_records(self.broker, buy, self.day, sell), (3, 0))
+        self.assertEqual(ingest_broker_records(self.broker, buy, self.day, sell), (0, 3))
+
+        # 部分新增、部分更新，數值以最新頁面為準
+        buy = [self.row('2330', 200, 20), self.row('2454', 30, 3)]
+        self.assertEqual(ingest_broker_records(self.broker, buy, self.day, []), (1, 1))
+        record = StockRecord.objects.get(broker=self.broker, stock_code='2330', date=self.day)
+        self.assertEqual((record.buy_volume, record.sell_volume, record.net_volume), (200, 20, 180))
+        self.assertEqual(StockRecord.objects.count(), 4)
+        self.assertEqual(ingest_broker_records(self.broker, [], self.day, []), (0, 0))
+
+    def test_duplicate_codes_keep_last_row(self):
+        """測試同一頁重複出現的股票以最後一筆為準，且計數與舊流程一致"""
+        buy = [self.row('2330', 100, 10)]
+        sell = [self.row('2330', 5, 90)]
+        self.assertEqual(ingest_broker_records(self.broker, buy, self.day, sell), (1, 1))
+        record = StockRecord.objects.get(broker=self.broker, stock_code='2330', date=self.day)
+        self.assertEqual(record.net_volume, -85)
+
+    @patch('links.management.commands.fetch_broker_data.fetch_top_buyers')
+    def test_unchanged_pages_are_skipped(self, mock_fetch_top_buyers):
+        """測試第二次執行時內容未變的券商不再寫入，內容更正時仍會寫入"""
+        buy = [self.row('2330', 100, 10)]
+        mock_fetch_top_buyers.return_value = (buy, '2025/12/30', [])
+        call_command('fetch_broker_data', stdout=StringIO())
+        self.broker.refresh_from_db()
+        self.assertEqual(self.broker.last_ingested_date, self.day)
+
+        with patch('links.management.commands.fetch_broker_data.ingest_broker_records') as mock_ingest:
+            out = StringIO()
+            call_command('fetch_broker_data', stdout=out)
+            mock_ingest.assert_not_called()
+            self.assertIn("Skipped 1 unchanged brokers: 測試券商", out.getvalue())
+
+            call_command('fetch_broker_data', '--force', stdout=StringIO())
+            self.assertEqual(mock_ingest.call_count, 1)
+
+        # 晚間更正的資料會寫入
+        mock_fetch_top_buyers.return_value = ([self.row('2330', 120, 10)], '2025/12/30', [])
+        call_command('fetch_broker_data', stdout=StringIO())
+        record = StockRecord.objects.get(broker=self.broker, stock_code='2330', date=self.day)
+        self.assertEqual(record.buy_volume, 120)
+
+        # 回補較舊日期不會讓紀錄倒退
+        ingest_broker_records(self.broker, buy, datetime(2025, 12, 1).date(), [])
+        self.broker.refresh_from_db()
+        self.assertEqual(self.broker.last_ingested_date, self.day)
+
+        # 寫入紀錄只供內部使用，不出現在券商 API
+        data = self.client.get(reverse('broker-detail', args=[self.broker.id])).data
+        self.assertEqual(data['name'], self.broker.name)
+        self.assertFalse({'last_ingested_date', 'last_ingested_hash'} & set(data))
+
+
+class PartitionTests(APITestCase):
+    def test_month_ranges_and_ensure_partitions(self):
+        """測試月分區的日期區間計算；Postgres 下補建缺少的月分區，SQLite 下不建立分區"""
+        months = list(months_between(datetime(2024, 11, 15).date(), datetime(2025, 2, 1).date()))
+        self.assertEqual([str(m) for m in months], ['2024-11-01', '2024-12-01', '2025-01-01', '2025-02-01'])
+        self.assertEqual(partition_name(months[1]), 'links_stockrecord_202412')
+
+        created = ensure_partitions(datetime(2020, 1, 1).date())
+        if connection.vendor == 'postgresql':
+            self.assertIn('links_stockrecord_202001', created)
+            # 已建立的月份不會重複建立
+            self.assertEqual(ensure_partitions(datetime(2020, 1, 1).date()), [])
+        else:
+            self.assertEqual(created, [])
+
+
+class DailyAggregateTests(APITestCase):
+    def setUp(self):
+        self.brokers = [
+            Broker.objects.create(name=f"券商{code}", fbs_a=code, fbs_b=code, stock_bno=code)
+            for code in ('1440', '1470')
+        ]
+        self.day = datetime(2025, 12, 30).date()
+
+    def row(self, code, buy, sell):
+        return {'code': code, 'name': f"{code}名稱", 'buy': buy, 'sell': sell, 'dif': buy - sell}
+
+    def test_ingest_keeps_aggregates_in_step(self):
+        """測試寫入券商資料時同步更新每日彙總，統計 API 由彙總表回應"""
+        ingest_broker_records(self.brokers[0], [self.row('2330', 100, 10)], self.day, [self.row('2603', 0, 50)])
+        ingest_broker_records(self.brokers[1], [self.row('2330', 30, 5)], self.day, [])
+        aggregate = StockDailyAggregate.objects.get(stock_code='2330', date=self.day)
+        self.assertEqual(
+            (aggregate.total_buy, aggregate.total_sell, aggregate.total_net, aggregate.broker_count),
+            (130, 15, 115, 2))
+
+        # 更正後的資料重新計算，而非累加
+        ingest_broker_records(self.brokers[1], [self.row('2330', 40, 5)], self.day, [])
+        self.assertEqual(StockDailyAggregate.objects.get(stock_code='2330', date=self.day).total_net, 125)
+
+        response = self.client.post(reverse('record-stats'), {
+            'broker': self.brokers[0].id, 'stock_code': '2330', 'stock_name': '2330名稱',
+            'date': '2025-12-31', 'buy_volume': 5, 'sell_volume': 0, 'net_volume': 5})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(reverse('record-stats'))
+        self.assertEqual(
+            [(row['stock_code'], row['total_net']) for row in response.data],
+            [('2330', 130), ('2603', -50)])
+
+    def test_stats_filters_top_and_cursor_pages(self):
+        """測試統計 API 的篩選、top-N 與 cursor 分頁"""
+        codes = [str(2300 + i) for i in range(7)]
+        ingest_broker_records(self.brokers[0], [self.row(c, 10 * i, 0) for i, c in enumerate(codes)], self.day, [])
+        ingest_broker_records(self.brokers[1], [self.row('2300', 500, 0)], datetime(2025, 12, 29).date(), [])
+        url = reverse('record-stats')
+
+        response = self.client.get(url, {'top': 2})
+        self.assertEqual([row['stock_code'] for row in response.data], ['2300', '2306'])
+
+        # 依日期與券商篩選，最小淨額以絕對值計算
+        response = self.client.get(url, {'start_date': '2025-12-30', 'min_net': 40, 'top': 10})
+        self.assertEqual([row['stock_code'] for row in response.data], ['2306', '2305', '2304'])
+        response = self.client.get(url, {'brokers': str(self.brokers[1].id), 'top': 10})
+        self.assertEqual([(row['stock_code'], row['total_net']) for row in response.data], [('2300', 500)])
+
+        seen = []
+        response = self.client.get(url, {'page_size': 3})
+        while True:
+            seen.extend(row['stock_code'] for row in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, ['2300', '2306', '2305', '2304', '2303', '2302', '2301'])
+        # 未指定 page_size 或 cursor 時維持原本的完整列表格式
+        self.assertEqual([row['stock_code'] for row in self.client.get(url).data], seen)
+
+        for params in ({'cursor': 'bogus'}, {'top': 0}, {'start_date': '2025/12/30'}, {'brokers': 'x'}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command_repairs_aggregates(self):
+        """測試 rebuild_daily_aggregates 可修復與原始資料不一致的彙總"""
+        ingest_broker_records(self.brokers[0], [self.row('2330', 100, 10)], self.day, [])
+        StockDailyAggregate.objects.update(total_net=0)
+        StockDailyAggregate.objects.create(stock_code='9999', date=self.day, total_net=1)
+
+        out = StringIO()
+        call_command('rebuild_daily_aggregates', '--start-date', '2025-12-30', stdout=out)
+        self.assertIn("Rebuilt 1 aggregates over 1 days", out.getvalue())
+        self.assertEqual(
+            list(StockDailyAggregate.objects.values_list('stock_code', 'total_net')), [('2330', 90)])
+
+
+class DatabaseLiveCrawlerTests(APITestCase):
+    def setUp(self):
+        self.day = datetime(2025, 12, 30).date()
+
+    def add_broker(self, name, rows):
+        broker = Broker.objects.create(name=name, fbs_a=name, fbs_b=name, stock_bno=name)
+        StockRecord.objects.bulk_create([
+            StockRecord(broker=broker, stock_code=code, stock_name=f"{code}名稱", date=self.day,
+                        buy_volume=max(net, 0), sell_volume=max(-net, 0), net_volume=net)
+            for code, net in rows
+        ])
+        return broker
+
+    def test_thresholds_sorting_and_specific_stats(self):
+        """測試資料庫版即時 API 的門檻、排序與個股統計"""
+        self.add_broker("港商麥格理", [('2330', 500), ('2317', 100), ('2603', -400), ('2454', -350)])
+        self.add_broker("凱基台北", [('2330', -70), ('2317', 100), ('2603', 65)])
+        Broker.objects.create(name="無資料", fbs_a="1", fbs_b="1", stock_bno="1")
+
+        response = self.client.get(reverse('db-live-crawler'), {'number': '2330', 'date': '2025-12-30'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        macquarie, kgi, empty = response.data['brokers_data']
+        # 麥格理門檻為 ±300，其餘為 ±60
+        self.assertEqual([d['code'] for d in macquarie['buy_data']], ['2330'])
+        self.assertEqual([d['code'] for d in macquarie['sell_data']], ['2603', '2454'])
+        self.assertEqual([d['code'] for d in kgi['buy_data']], ['2317', '2603'])
+        self.assertEqual([d['code'] for d in kgi['sell_data']], ['2330'])
+        self.assertEqual(kgi['specific_stats'], {"buy": 0, "sell": 70, "net": "-70"})
+        self.assertEqual((empty['buy_data'], empty['specific_stats']), ([], None))
+        self.assertEqual(response.data['total_stats'], {"buy": 500, "sell": 70, "net": "+430"})
+
+    def test_query_count_does_not_grow_with_brokers(self):
+        """測試查詢次數固定，不隨券商數量增加"""
+        url = reverse('db-live-crawler')
+        params = {'number': '2330', 'date': '2025-12-30'}
+        for i in range(2):
+            self.add_broker(f"券商{i}", [('2330', 100), ('2317', -100)])
+        # 資料版本、券商、當日紀錄各一次
+        with self.assertNumQueries(3):
+            self.client.get(url, params)
+        for i in range(2, 12):
+            self.add_broker(f"券商{i}", [('2330', 100), ('2317', -100)])
+        with self.assertNumQueries(3):
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.data['brokers_data']), 12)
+
+
+class VolumeCubeTests(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(VOLUME_CUBE_DIR=self.tmpdir.name)
+        self.settings_override.enable()
+        self.brokers = [
+            Broker.objects.create(name=f"券商{code}", fbs_a=code, fbs_b=code, stock_bno=code)
+            for code in ('1440', '1470')
+        ]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def add_day(self, day, rows):
+        for broker, code, net in rows:
+            StockRecord.objects.update_or_create(
+                broker=broker, stock_code=code, date=datetime.strptime(day, '%Y-%m-%d').date(),
+                defaults={'buy_volume': max(net, 0), 'sell_volume': max(-net, 0), 'net_volume': net})
+
+    def test_cube_appends_resyncs_and_rebuilds(self):
+        """測試量能立方體可增量附加、重算最後一日，並在回補舊日期時重建"""
+        a, b = self.brokers
+        self.add_day('2025-12-29', [(a, '2330', 10), (b, '2330', -10)])
+        self.assertEqual(update_cube(), 1)
+        # 首次配置依實際資料大小，而非固定的大容量
+        self.assertEqual(VolumeCube.load().capacity, (1, 2, 1))
+        self.add_day('2025-12-29', [(a, '2330', 15)])
+        self.add_day('2025-12-30', [(a, '2317', 7)])
+        # 最後一日重算，新日期附加
+        self.assertEqual(update_cube(), 2)
+        cube = VolumeCube.load()
+        self.assertEqual(cube.shape, (2, 2, 2))
+        self.assertEqual(cube.values('net')[0, cube.broker_pos[a.id], cube.stock_pos['2330']], 15)
+
+        # 寫入新的一代檔案，已載入舊版的讀取者不受影響，前一代檔案保留
+        reader = VolumeCube.load()
+        self.add_day('2025-12-30', [(a, '2317', 8)])
+        update_cube()
+        self.assertEqual(int(reader.values('net')[1, reader.broker_pos[a.id], reader.stock_pos['2317']]), 7)
+        self.assertEqual(VolumeCube.load().generation, reader.generation + 1)
+        files = os.listdir(self.tmpdir.name)
+        self.assertIn(f"net.{reader.generation}.npy", files)
+        self.assertNotIn(f"net.{reader.generation - 1}.npy", files)
+
+        self.add_day('2025-12-26', [(b, '2603', 3)])
+        self.assertEqual(update_cube(), 3)
+        cube = VolumeCube.load()
+        self.assertEqual([str(d) for d in cube.dates], ['2025-12-26', '2025-12-29', '2025-12-30'])
+        self.assertEqual(int(cube.values('net').sum()), 15 - 10 + 8 + 3)
+
+    def test_analytics_endpoints(self):
+        """測試滾動加總、券商相關係數與個股籌碼流向 API"""
+        a, b = self.brokers
+        for day, net in (('2025-12-26', 10), ('2025-12-29', 20), ('2025-12-30', 30)):
+            self.add_day(day, [(a, '2330', net), (b, '2330', -net), (b, '2317', 1)])
+        call_command('update_volume_cube', stdout=StringIO())
+
+        response = self.client.get(reverse('analytics-rolling'), {'stock': '2330', 'window': 2})
+        self.assertEqual(response.data['dates'], ['2025-12-26', '2025-12-29', '2025-12-30'])
+        self.assertEqual(response.data['series'][0], {"broker_name": "券商1440", "values": [10, 30, 50]})
+        # 日期區間內的滾動加總仍包含區間前的日期，不含區間外的空白日期
+        response = self.client.get(reverse('analytics-rolling'), {
+            'stock': '2330', 'window': 2, 'start_date': '2025-12-29', 'end_date': '2025-12-29'})
+        self.assertEqual(response.data['series'][0]['values'], [30])
+        response = self.client.get(reverse('analytics-rolling'), {
+            'start_date': '2025-12-30', 'end_date': '2025-12-29'})
+        self.assertEqual((response.data['dates'], response.data['series'][0]['values']), ([], []))
+
+        response = self.client.get(reverse('analytics-correlation'), {'stock': '2330'})
+        self.assertEqual(response.data['matrix'], [[1.0, -1.0], [-1.0, 1.0]])
+
+        response = self.client.get(reverse('analytics-stock-flow'), {
+            'stock': '2330', 'start_date': '2025-12-29'})
+        self.assertEqual(response.data['dates'], ['2025-12-29', '2025-12-30'])
+        self.assertEqual(response.data['series'][1], {
+            "broker_name": "券商1470", "daily": [-20, -30], "cumulative": [-20, -50]})
+        self.assertEqual(response.data['total']['daily'], [0, 0])
+
+        self.assertEqual(self.client.get(reverse('analytics-stock-flow'), {'stock': '9999'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('analytics-rolling'), {'metric': 'x'}).status_code, 400)
+
+
+class StoredHistoryTests(APITestCase):
+    def setUp(self):
+        self.broker = Broker.objects.create(name="美林", fbs_a="1440", fbs_b="1440", stock_bno="1440")
+        other = Broker.objects.create(name="凱基", fbs_a="9200", fbs_b="9200", stock_bno="9200")
+        # 2025-12-25 ~ 12-31 中的交易日（12-27、12-28 為週末）
+        for day, net in (('2025-12-25', 1), ('2025-12-26', 2), ('2025-12-29', 3), ('2025-12-30', 4), ('2025-12-31', 5)):
+            day = datetime.strptime(day, '%Y-%m-%d').date()
+            StockRecord.objects.create(broker=self.broker, stock_code='2330', stock_name='2330台積電',
+                                       date=day, buy_volume=10 * net, sell_volume=0, net_volume=10 * net)
+            StockRecord.objects.create(broker=self.broker, stock_code='2603', stock_name='2603長榮',
+                                       date=day, buy_volume=0, sell_volume=net, net_volume=-net)
+            StockRecord.objects.create(broker=other, stock_code='2330', stock_name='2330台積電',
+                                       date=day, buy_volume=1, sell_volume=0, net_volume=1)
+        self.url = reverse('history-crawler')
+        self.now = patch('links.utils.crawler.market_now', return_value=datetime(
+            2025, 12, 31, 20, 0, tzinfo=ZoneInfo('Asia/Taipei')))
+        self.now.start()
+
+    def tearDown(self):
+        self.now.stop()
+
+    @patch('links.views.broker.fetch_top_buyers')
+    def test_window_served_from_stored_records(self, mock_fetch):
+        """測試 N 日排行由已存的每日資料計算，使用實際交易日區間"""
+        response = self.client.get(self.url, {'a': '1440', 'b': '1440', 'days': 3, 'source': 'auto'})
+        mock_fetch.assert_not_called()
+        self.assertTrue(response.data['is_from_db'])
+        self.assertEqual(response.data['date_range'], '20251229~20251231')
+        self.assertEqual(
+            [(d['code'], d['buy'], d['dif']) for d in response.data['buy_data']], [('2330', 120, 120)])
+        self.assertEqual([(d['code'], d['dif']) for d in response.data['sell_data']], [('2603', -12)])
+        self.assertIn('histock_link', response.data['buy_data'][0])
+        self.assertIn('top-ranked rows', response.data['note'])
+
+    @patch('links.views.broker.fetch_top_buyers')
+    def test_uncovered_window_falls_back_to_live_crawl(self, mock_fetch):
+        """測試本地資料不足時改為即時抓取"""
+        mock_fetch.return_value = ([], '20251231', [])
+        # 只有 5 個交易日，10 日視窗不足
+        response = self.client.get(self.url, {'a': '1440', 'b': '1440', 'days': 10, 'source': 'auto'})
+        self.assertFalse(response.data['is_from_db'])
+        self.assertIsNone(response.data['note'])
+        self.assertEqual(mock_fetch.call_count, 1)
+
+        response = self.client.get(self.url, {'a': '1440', 'b': '1440', 'days': 10, 'source': 'db'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('links.views.broker.fetch_top_buyers')
+    def test_window_ends_at_latest_stored_final_day(self, mock_fetch):
+        """測試視窗結束於最新已存的定案交易日，假日不需改為即時抓取"""
+        # 1/1 休市，1/2 收盤資料尚未寫入
+        with patch('links.utils.crawler.market_now', return_value=datetime(
+                2026, 1, 2, 20, 0, tzinfo=ZoneInfo('Asia/Taipei'))):
+            response = self.client.get(self.url, {'a': '1440', 'b': '1440', 'days': 3, 'source': 'auto'})
+        mock_fetch.assert_not_called()
+        self.assertEqual(response.data['date_range'], '20251229~20251231')
+
+        # 盤中已寫入的當日資料尚未定案，不列入視窗
+        with patch('links.utils.crawler.market_now', return_value=datetime(
+                2025, 12, 31, 10, 0, tzinfo=ZoneInfo('Asia/Taipei'))):
+            response = self.client.get(self.url, {'a': '1440', 'b': '1440', 'days': 3, 'source': 'auto'})
+        mock_fetch.assert_not_called()
+        self.assertEqual(response.data['date_range'], '20251226~20251230')
+
+    @patch('links.views.broker.fetch_top_buyers')
+    def test_stored_by_default_and_bad_params_rejected(self, mock_fetch):
+        """測試預設使用已存資料，即時抓取需指定；days 小於 1 或未知的 source 回傳 400"""
+        mock_fetch.return_value = ([], '20251231', [])
+        response = self.client.get(self.url, {'a': '1440', 'b': '1440', 'days': 3})
+        self.assertTrue(response.data['is_from_db'])
+        mock_fetch.assert_not_called()
+
+        response = self.client.get(self.url, {'a': '1440', 'b': '1440', 'days': 3, 'source': 'live'})
+        self.assertFalse(response.data['is_from_db'])
+        self.assertEqual(mock_fetch.call_count, 1)
+
+        for url in (self.url, reverse('async-history-crawler')):
+            for params in ({'days': 0}, {'days': -1}, {'source': 'cache'}):
+                response = self.client.get(url, dict(params, a='1440', b='1440'))
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.brokers = [
+            Broker.objects.create(name=f"券商{code}", fbs_a=code, fbs_b=code, stock_bno=code)
+            for code in ('1440', '1470')
+        ]
+        for day in ('2025-12-29', '2025-12-30'):
+            for broker in self.brokers:
+                StockRecord.objects.create(broker=broker, stock_code='2330', stock_name='2330台積電',
+                                           date=datetime.strptime(day, '%Y-%m-%d').date(),
+                                           buy_volume=10, sell_volume=4, net_volume=6)
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_export_endpoint_streams_csv_ndjson_and_gzip(self):
+        """測試匯出 API 以串流回傳 CSV、NDJSON 與 gzip，並支援篩選"""
+        url = reverse('record-export')
+        response = self.client.get(url, {'start_date': '2025-12-30'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(self.read(response).decode('utf-8'))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual((rows[0]['date'], rows[0]['broker_name'], rows[0]['net_volume']), ('2025-12-30', '券商1440', '6'))
+
+        response = self.client.get(url, {'output': 'ndjson', 'brokers': str(self.brokers[1].id), 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(self.read(response)).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['date'] for line in lines], ['2025-12-29', '2025-12-30'])
+        self.assertEqual({json.loads(line)['broker_name'] for line in lines}, {'券商1470'})
+
+        self.assertEqual(self.client.get(url, {'output': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_streams_under_asgi(self):
+        """測試 ASGI 下匯出 API 改用非同步迭代器，內容與 WSGI 相同而不會整批緩衝"""
+        url = reverse('record-export')
+        expected = self.read(self.client.get(url))
+
+        async def export():
+            response = await self.async_client.get(url)
+            return response.is_async, b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(async_to_sync(export)(), (True, expected))
+
+    def test_export_command_writes_file(self):
+        """測試 export_records 指令輸出檔案"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'records.csv')
+            call_command('export_records', '--output', path, '--stock', '2330', '--end-date', '2025-12-29',
+                         stdout=StringIO())
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'date,broker_id,broker_name,stock_code,stock_name,buy_volume,sell_volume,net_volume,record_type')
+        self.assertEqual(len(lines), 3)
+
+
+class BulkIngestTests(APITestCase):
+    def setUp(self):
+        self.broker = Broker.objects.create(name="美林", fbs_a="1440", fbs_b="1440", stock_bno="1440")
+        self.url = reverse('record-bulk')
+
+    def test_json_array_upserts_and_reports_row_errors(self):
+        """測試批次寫入 API 以 JSON 陣列寫入、重複資料改為更新，並回報錯誤列位置"""
+        rows = [
+            {'broker': self.broker.id, 'stock_code': '2330', 'date': '2025-12-30', 'buy_volume': 10, 'sell_volume': 4},
+            {'broker_name': '美林', 'stock_code': '2317', 'date': '2025-12-30', 'net_volume': -3},
+            {'broker_name': '不存在', 'stock_code': '2330', 'date': '2025-12-30'},
+            {'broker': self.broker.id, 'stock_code': '2330', 'date': '2025/12/30'},
+            {'broker': self.broker.id, 'stock_code': '', 'date': '2025-12-30', 'buy_volume': 'x'},
+            {'broker': self.broker.id, 'stock_code': '2603', 'date': '2025-12-30', 'buy_volume': 2 ** 31},
+        ]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['received'], response.data['created'], response.data['updated']), (6, 2, 0))
+        self.assertEqual([e['index'] for e in response.data['errors']], [2, 3, 4, 5])
+        self.assertEqual(response.data['errors'][0]['errors'], {'broker': 'Unknown broker'})
+        self.assertEqual(set(response.data['errors'][2]['errors']), {'stock_code', 'buy_volume'})
+        # 超出 32 位元整數範圍的數量以錯誤列回報，而非讓整批寫入失敗
+        self.assertEqual(set(response.data['errors'][3]['errors']), {'buy_volume', 'net_volume'})
+        self.assertEqual(StockRecord.objects.get(stock_code='2330').net_volume, 6)
+
+        rows[0]['buy_volume'] = 20
+        response = self.client.post(self.url, rows[:1], format='json')
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 1))
+        self.assertEqual(StockRecord.objects.get(stock_code='2330').net_volume, 16)
+        self.assertEqual(StockDailyAggregate.objects.get(stock_code='2330').total_buy, 20)
+
+    def test_ndjson_stream_in_chunks(self):
+        """測試 NDJSON 串流分批寫入，無效的 JSON 列只影響該列"""
+        lines = [json.dumps({'broker': self.broker.id, 'stock_code': str(1000 + i), 'date': '2025-12-30',
+                             'buy_volume': i}) for i in range(25)]
+        lines.insert(3, '{not json')
+        body = '\n'.join(lines) + '\n'
+        with override_settings(BULK_INGEST_CHUNK_SIZE=10):
+            response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual((response.data['received'], response.data['created']), (26, 25))
+        self.assertEqual([e['index'] for e in response.data['errors']], [3])
+        self.assertEqual(StockRecord.objects.count(), 25)
+
+        for body in ({'stock_code': '2330'}, 5, None, '2330'):
+            response = self.client.post(self.url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DatabaseRoutingTests(APITestCase):
+    def test_reads_use_replica_only_when_opted_in(self):
+        """測試只有在 replica_reads 內且設定了 replica 時讀取才走 replica，寫入一律走 default"""
+        router = ReplicaRouter()
+        with replica_reads():
+            self.assertEqual(router.db_for_read(StockRecord), 'default')
+
+        with patch.dict(settings.DATABASES, {'replica': dict(settings.DATABASES['default'])}):
+            self.assertEqual(router.db_for_read(StockRecord), 'default')
+            with replica_reads():
+                self.assertEqual(router.db_for_read(StockRecord), 'replica')
+                self.assertEqual(router.db_for_write(StockRecord), 'default')
+                # 執行緒池中的工作也沿用同一個路由設定
+                self.assertEqual(
+                    run_concurrently(lambda _: router.db_for_read(StockRecord), range(3), max_workers=3),
+                    ['replica'] * 3)
+            self.assertEqual(router.db_for_read(StockRecord), 'default')
+            self.assertFalse(router.allow_migrate('replica', 'links'))
+            self.assertTrue(router.allow_migrate('default', 'links'))
+
+    def test_status_reports_connection_usage(self):
+        """測試狀態 API 回報請求數與各資料庫別名開啟的連線數"""
+        reset_connection_stats()
+        self.client.get(reverse('crawler-status'))
+        response = self.client.get(reverse('crawler-status'))
+        database = response.data['database']
+        self.assertEqual(database['requests'], 2)
+        self.assertIn('connections_opened', database)
+        self.assertIn('default', database['conn_max_age'])
+
+
+class AsyncCrawlerViewTests(APITestCase):
+    def setUp(self):
+        for i in range(4):
+            Broker.objects.create(name=f"券商{i}", fbs_a="1440", fbs_b=f"async-{i}", stock_bno=f"N{i}")
+        rate_limit.reset_limiters()
+
+    def tearDown(self):
+        rate_limit.reset_limiters()
+
+    def test_async_views_match_sync_views(self):
+        """測試非同步爬蟲 API 回傳內容與同步版本相同"""
+        # 同步版本逐一抓取，避免執行緒同時寫入測試用的 SQLite
+        with StubFubonServer() as stub, override_settings(FUBON_BASE_URL=stub.base_url, CRAWLER_MAX_WORKERS=1):
+            for sync_name, async_name, params in [
+                ('live-crawler', 'async-live-crawler', {'number': '2330'}),
+                ('history-crawler', 'async-history-crawler', {'a': '1440', 'b': 'async-0', 'days': 5, 'mark': 'x'}),
+                ('stock-main-force-crawler', 'async-stock-main-force-crawler', {'number': '2330', 'date': '2025-12-30'}),
+            ]:
+                expected = self.client.get(reverse(sync_name), params)
+                actual = self.client.get(reverse(async_name), params)
+                self.assertEqual(actual.status_code, status.HTTP_200_OK)
+                self.assertEqual(actual.json(), json.loads(expected.content))
+
+        response = self.client.get(reverse('async-stock-main-force-crawler'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_live_stream(self):
+        """測試非同步版本的串流結果與一次回傳的內容相同"""
+        with StubFubonServer() as stub, override_settings(FUBON_BASE_URL=stub.base_url):
+            expected = self.client.get(reverse('async-live-crawler'), {'number': '2330'}).json()
+            response = self.client.get(reverse('async-live-crawler'), {'number': '2330', 'stream': 'ndjson'})
+
+            async def read_stream():
+                return [json.loads(chunk) async for chunk in response.streaming_content]
+            events = async_to_sync(read_stream)()
+
+        brokers = sorted((e for e in events if e['event'] == 'broker'), key=lambda e: e['index'])
+        self.assertEqual([e['result'] for e in brokers], expected['brokers_data'])
+        self.assertEqual([e['errors'] for e in brokers], [[]] * 4)
+        self.assertEqual(events[-1]['total_stats'], expected['total_stats'])
+
+    def test_live_brokers_are_crawled_concurrently(self):
+        """測試非同步版本在單一執行緒內同時等待所有券商的回應"""
+        with StubFubonServer(latency=0.3) as stub, override_settings(FUBON_BASE_URL=stub.base_url):
+            started = time.perf_counter()
+            response = self.client.get(reverse('async-live-crawler'))
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['brokers_data']), 4)
+        self.assertEqual(stub.request_count, 4)
+        self.assertLess(elapsed, 0.3 * 4 * 0.75)
+
+
+class ConditionalResponseTests(APITestCase):
+    def setUp(self):
+        self.broker = Broker.objects.create(name="美林", fbs_a="1440", fbs_b="1440", stock_bno="1440")
+        self.item = {'code': '2330', 'name': '台積電', 'buy': 100, 'sell': 10, 'dif': 90}
+        ingest_broker_records(self.broker, [self.item], datetime(2025, 12, 30).date(), [])
+
+    def test_unchanged_data_answers_304_without_running_the_view(self):
+        """測試資料版本未變時以 304 回應，且只查詢資料版本"""
+        for url, params in [
+            (reverse('db-live-crawler'), {'number': '2330', 'date': '2025-12-30'}),
+            (reverse('record-stats'), {'top': 5}),
+            (reverse('broker-list'), {}),
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag, last_modified = response['ETag'], response['Last-Modified']
+
+            with self.assertNumQueries(1):
+                response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+            response = self.client.get(url, params, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            # 不同的查詢參數有不同的 ETag
+            other = self.client.get(url, dict(params, format='json'), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(other.status_code, status.HTTP_200_OK)
+
+    def test_ingest_and_broker_changes_advance_the_version(self):
+        """測試寫入紀錄與券商異動都會推進資料版本，舊的 ETag 不再符合"""
+        url = reverse('record-stats')
+        etag = self.client.get(url)['ETag']
+        version = current_data_version()[0]
+
+        ingest_broker_records(self.broker, [dict(self.item, buy=200, dif=190)], datetime(2025, 12, 30).date(), [])
+        self.assertEqual(current_data_version()[0], version + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['total_net'], 190)
+
+        etag = self.client.get(reverse('broker-list'))['ETag']
+        Broker.objects.create(name="摩根大通", fbs_a="8440", fbs_b="8440", stock_bno="8440")
+        response = self.client.get(reverse('broker-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.data), 2)
+
+        self.client.post(url, {'broker': self.broker.id, 'stock_code': '2317', 'date': '2025-12-30'}, format='json')
+        self.assertEqual(current_data_version()[0], version + 3)
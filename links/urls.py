@@ -1,6 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from links.views import BrokerViewSet, LiveCrawlerView, HistoryCrawlerView, StockRecordStatsView, StockMainForceCrawlerView, DatabaseLiveCrawlerView
+from links.views import (
+    BrokerViewSet, LiveCrawlerView, HistoryCrawlerView, StockRecordStatsView,
+    StockMainForceCrawlerView, DatabaseLiveCrawlerView, CrawlerStatusView,
+    RollingFlowView, BrokerCorrelationView, StockFlowView, StockRecordExportView,
+    StockRecordBulkView, AsyncLiveCrawlerView, AsyncStockMainForceCrawlerView,
+    AsyncHistoryCrawlerView
+)
 
 router = DefaultRouter()
 router.register(r'brokers', BrokerViewSet)
@@ -13,5 +19,15 @@ urlpatterns = [
     path('crawler/stock-main-force/', StockMainForceCrawlerView.as_view(),
          name='stock-main-force-crawler'),
     path('crawler/history/', HistoryCrawlerView.as_view(), name='history-crawler'),
+    path('crawler/async/live/', AsyncLiveCrawlerView.as_view(), name='async-live-crawler'),
+    path('crawler/async/stock-main-force/', AsyncStockMainForceCrawlerView.as_view(),
+         name='async-stock-main-force-crawler'),
+    path('crawler/async/history/', AsyncHistoryCrawlerView.as_view(), name='async-history-crawler'),
+    path('crawler/status/', CrawlerStatusView.as_view(), name='crawler-status'),
     path('records/stats/', StockRecordStatsView.as_view(), name='record-stats'),
+    path('records/export/', StockRecordExportView.as_view(), name='record-export'),
+    path('records/bulk/', StockRecordBulkView.as_view(), name='record-bulk'),
+    path('analytics/rolling/', RollingFlowView.as_view(), name='analytics-rolling'),
+    path('analytics/correlation/', BrokerCorrelationView.as_view(), name='analytics-correlation'),
+    path('analytics/stock-flow/', StockFlowView.as_view(), name='analytics-stock-flow'),
 ]
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from links.models import StockDailyAggregate, StockRecord
+
+AGGREGATE_FIELDS = ['stock_name', 'total_buy', 'total_sell', 'total_net', 'broker_count']
+
+
+def _daily_totals(record_model, **filters):
+    return record_model.objects.filter(**filters).values('stock_code', 'date', 'record_type').annotate(
+        name=Max('stock_name'),
+        buy=Sum('buy_volume'),
+        sell=Sum('sell_volume'),
+        net=Sum('net_volume'),
+        brokers=Count('broker_id'),
+    ).order_by()
+
+
+def _aggregate_rows(aggregate_model, totals):
+    return [
+        aggregate_model(
+            stock_code=row['stock_code'],
+            stock_name=row['name'],
+            date=row['date'],
+            record_type=row['record_type'],
+            total_buy=row['buy'],
+            total_sell=row['sell'],
+            total_net=row['net'],
+            broker_count=row['brokers'],
+        )
+        for row in totals
+    ]
+
+
+def refresh_daily_aggregates(record_date, stock_codes, record_type=1):
+    """Recompute the aggregates of stock_codes on record_date from StockRecord.
+
+    Call inside the transaction that wrote the records, so readers never see
+    the two tables disagree.
+    """
+    stock_codes = list(stock_codes)
+    rows = _aggregate_rows(StockDailyAggregate, _daily_totals(
+        StockRecord, date=record_date, record_type=record_type, stock_code__in=stock_codes))
+    StockDailyAggregate.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['stock_code', 'date', 'record_type'],
+        update_fields=AGGREGATE_FIELDS,
+        batch_size=500,
+    )
+    # Codes whose records are all gone
+    gone = set(stock_codes) - {row.stock_code for row in rows}
+    if gone:
+        StockDailyAggregate.objects.filter(
+            date=record_date, record_type=record_type, stock_code__in=gone).delete()
+
+
+def rebuild_daily_aggregates(start_date=None, end_date=None,
+                             record_model=StockRecord, aggregate_model=StockDailyAggregate):
+    """Recompute every aggregate in the date range (all dates by default), one day per transaction.
+
+    Returns (days, rows) written. The model arguments let migrations pass
+    their historical models.
+    """
+    filters = {}
+    if start_date:
+        filters['date__gte'] = start_date
+    if end_date:
+        filters['date__lte'] = end_date
+
+    dates = set(record_model.objects.filter(**filters).values_list('date', flat=True).distinct())
+    dates.update(aggregate_model.objects.filter(**filters).values_list('date', flat=True).distinct())
+    written = 0
+    for day in sorted(dates):
+        with transaction.atomic():
+            aggregate_model.objects.filter(date=day).delete()
+            rows = _aggregate_rows(aggregate_model, _daily_totals(record_model, date=day))
+            aggregate_model.objects.bulk_create(rows, batch_size=1000)
+            written += len(rows)
+    return len(dates), written
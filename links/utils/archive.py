@@ -0,0 +1,174 @@
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qsl
+from django.conf import settings
+from links.utils.http_client import CrawlerFetchError
+from links.utils.page_cache import normalize_url, page_type
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    page_type TEXT NOT NULL,
+    fbs_a TEXT NOT NULL DEFAULT '',
+    fbs_b TEXT NOT NULL DEFAULT '',
+    stock_code TEXT NOT NULL DEFAULT '',
+    data_date TEXT NOT NULL DEFAULT '',
+    fetched_at REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    UNIQUE (url, sha256)
+);
+CREATE INDEX IF NOT EXISTS pages_url_date ON pages (url, data_date);
+CREATE INDEX IF NOT EXISTS pages_broker_date ON pages (fbs_a, fbs_b, data_date);
+CREATE INDEX IF NOT EXISTS pages_stock_date ON pages (stock_code, data_date);
+"""
+
+DATA_DATE_RE = re.compile(r"資料日期：\s*(\d{4}[/-]?\d{1,2}[/-]?\d{1,2})")
+ROW_DATE_RE = re.compile(r">\s*(\d{4}/\d{1,2}/\d{1,2})\s*<")
+
+_replay = {'enabled': False, 'date': None}
+
+
+def _normalize_date(text):
+    text = text.replace('/', '-')
+    if '-' not in text and len(text) == 8:
+        return f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    year, month, day = text.split('-')
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+def describe_url(url):
+    """Broker codes, stock code and page type a Fubon URL refers to."""
+    params = dict(parse_qsl(urlsplit(url).query))
+    kind = page_type(url)
+    if kind.startswith('zgb0'):
+        return {'page_type': kind, 'fbs_a': params.get('a', ''), 'fbs_b': params.get('b', ''), 'stock_code': ''}
+    if kind.startswith('zco0'):
+        return {'page_type': kind, 'fbs_a': params.get('BHID', ''), 'fbs_b': params.get('b', ''), 'stock_code': params.get('a', '')}
+    return {'page_type': kind, 'fbs_a': '', 'fbs_b': '', 'stock_code': params.get('a', '')}
+
+
+def extract_data_date(url, html):
+    """Best-effort trading date of a page, without building a parse tree."""
+    match = DATA_DATE_RE.search(html)
+    if match:
+        return _normalize_date(match.group(1))
+    end_date = dict(parse_qsl(urlsplit(url).query)).get('f')
+    if end_date:
+        return _normalize_date(end_date)
+    # zco0 history pages list the most recent trading day first
+    match = ROW_DATE_RE.search(html)
+    if match:
+        return _normalize_date(match.group(1))
+    return ''
+
+
+def _connection():
+    root = str(settings.CRAWLER_ARCHIVE_DIR)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(root)
+    if conn is None:
+        os.makedirs(root, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        connections[root] = conn
+    return conn
+
+
+def _blob_path(sha256):
+    return os.path.join(str(settings.CRAWLER_ARCHIVE_DIR), 'blobs', sha256[:2], f"{sha256}.html.gz")
+
+
+def store_page(url, html, data_date=None):
+    """Archive one fetched page; identical content is only written once."""
+    body = html.encode('utf-8')
+    sha256 = hashlib.sha256(body).hexdigest()
+    path = _blob_path(sha256)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    info = describe_url(url)
+    _connection().execute(
+        "INSERT OR IGNORE INTO pages (url, page_type, fbs_a, fbs_b, stock_code, data_date, fetched_at, sha256) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (normalize_url(url), info['page_type'], info['fbs_a'], info['fbs_b'], info['stock_code'],
+         data_date or extract_data_date(url, html), time.time(), sha256))
+    return sha256
+
+
+def load_blob(sha256):
+    with gzip.open(_blob_path(sha256), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def list_pages(url, start_date=None, end_date=None):
+    """Archived versions of url as (data_date, sha256), oldest trading day first.
+
+    When a day was fetched more than once, only the latest fetch is returned.
+    """
+    query = "SELECT data_date, sha256, MAX(fetched_at) FROM pages WHERE url = ?"
+    params = [normalize_url(url)]
+    if start_date:
+        query += " AND data_date >= ?"
+        params.append(start_date)
+    if end_date:
+        query += " AND data_date <= ?"
+        params.append(end_date)
+    query += " GROUP BY data_date ORDER BY data_date"
+    return [(row[0], row[1]) for row in _connection().execute(query, params)]
+
+
+def load_page(url, data_date=None):
+    """Latest archived HTML for url, optionally as of a given data date."""
+    return load_page_dated(url, data_date)[0]
+
+
+def load_page_dated(url, data_date=None):
+    """load_page() as (html, fetched_at), the epoch time the page was archived."""
+    query = "SELECT sha256, fetched_at FROM pages WHERE url = ?"
+    params = [normalize_url(url)]
+    if data_date:
+        query += " AND data_date <= ?"
+        params.append(data_date)
+    row = _connection().execute(
+        query + " ORDER BY data_date DESC, fetched_at DESC LIMIT 1", params).fetchone()
+    if not row:
+        raise CrawlerFetchError(f"Page not in archive: {url}")
+    return load_blob(row[0]), row[1]
+
+
+def is_replaying():
+    return _replay['enabled'] or settings.CRAWLER_REPLAY
+
+
+def replay_date():
+    return _replay['date']
+
+
+@contextmanager
+def replay(data_date=None):
+    """Serve every crawler fetch from the archive, as of data_date if given.
+
+    The switch is process-wide so it also covers crawler worker threads.
+    """
+    previous = dict(_replay)
+    _replay.update(enabled=True, date=data_date)
+    try:
+        yield
+    finally:
+        _replay.update(previous)
@@ -0,0 +1,146 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from links.models import BrokerStockDaily
+from links.utils import archive
+from links.utils.crawler import (
+    broker_thresholds, generate_fubon_detail_link, generate_fubon_link,
+    generate_fubon_main_force_link, load_stock_main_force, parse_record_date,
+    store_stock_main_force, store_zco0_history
+)
+from links.utils.http_client import CrawlerFetchError, fetch_page_async
+from links.utils.page_cache import get_page_dated_async
+from links.utils.parsers import parse_top_buyers, parse_zco0, parse_zco0_history, parse_stock_main_force
+from links.utils.singleflight import single_flight
+from datetime import datetime
+
+# Coroutine versions of the crawler.py fetchers for the async views. Pages
+# go through the same page cache, archive, rate limiter and single-flight
+# keys; only the network wait and the DB access happen without blocking.
+
+
+async def _fetch_and_archive(link):
+    html = await fetch_page_async(link)
+    if settings.CRAWLER_ARCHIVE_ENABLED:
+        try:
+            await sync_to_async(archive.store_page, thread_sensitive=False)(link, html)
+        except Exception as e:
+            print(f"Error archiving {link}: {e}")
+    return html
+
+
+async def fetch_html(link):
+    return (await fetch_html_dated(link))[0]
+
+
+async def fetch_html_dated(link):
+    if archive.is_replaying():
+        return await sync_to_async(archive.load_page_dated, thread_sensitive=False)(link, archive.replay_date())
+    return await get_page_dated_async(link, _fetch_and_archive)
+
+
+@single_flight
+async def fetch_top_buyers(link, record_type=1):
+    html = await fetch_html(link)
+    return parse_top_buyers(html, record_type=record_type, link=link)
+
+
+async def get_merged_data(a, b, broker_name):
+    link = generate_fubon_detail_link(a, b, days=1)
+    buy_data, date, sell_data = await fetch_top_buyers(link, record_type=1)
+
+    buy_threshold, sell_threshold = broker_thresholds(broker_name)
+
+    filtered_buy = [d for d in buy_data if d['dif'] >= buy_threshold]
+    filtered_sell = [d for d in sell_data if d['dif'] <= sell_threshold]
+
+    return filtered_buy, date, filtered_sell
+
+
+@single_flight
+async def fetch_fubon_zco0_data(link, target_date_str=None):
+    if not target_date_str:
+        target_date_str = datetime.now().strftime("%Y-%m-%d")
+
+    try:
+        html = await fetch_html(link)
+    except CrawlerFetchError as e:
+        print(e)
+        return None
+    return parse_zco0(html, target_date_str)
+
+
+@single_flight
+async def fetch_fubon_zco0_history(link):
+    try:
+        html, fetched_at = await fetch_html_dated(link)
+    except CrawlerFetchError as e:
+        print(e)
+        return None
+    return parse_zco0_history(html), fetched_at
+
+
+async def get_main_force_merged_data(number, a, b, date_str=None, broker=None):
+    link = generate_fubon_link(number, a, b)
+    if broker is None:
+        return await fetch_fubon_zco0_data(link, date_str)
+
+    if not date_str:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+    try:
+        target_date = parse_record_date(date_str)
+    except ValueError:
+        return await fetch_fubon_zco0_data(link, date_str)
+
+    stored = await BrokerStockDaily.objects.filter(
+        broker=broker, stock_code=number, date=target_date, is_final=True).afirst()
+    if stored:
+        return {"buy": stored.buy_volume, "sell": stored.sell_volume, "net": stored.net_volume, "date": date_str}
+
+    fetched = await fetch_fubon_zco0_history(link)
+    if fetched is None:
+        return None
+    history, fetched_at = fetched
+    await sync_to_async(store_zco0_history)(broker, number, history, fetched_at)
+
+    for row in history:
+        if row['date'] == target_date:
+            return {"buy": row['buy'], "sell": row['sell'], "net": row['net'], "date": date_str}
+    return {"buy": 0, "sell": 0, "net": 0, "date": date_str}
+
+
+async def fetch_stock_main_force_data(stock_number, date_str=None):
+    fetched = await fetch_stock_main_force_dated(stock_number, date_str)
+    return fetched and fetched[0]
+
+
+async def fetch_stock_main_force_dated(stock_number, date_str=None):
+    if not date_str:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+
+    link = generate_fubon_main_force_link(stock_number, date_str)
+    try:
+        html, fetched_at = await fetch_html_dated(link)
+    except CrawlerFetchError as e:
+        print(f"Error fetching stock main force: {e}")
+        return None
+    return parse_stock_main_force(html, date_str), fetched_at
+
+
+async def get_stock_main_force_data(stock_number, date_str=None):
+    """Async get_stock_main_force_data(): stored final ranking, else crawled and stored."""
+    if not date_str:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+    try:
+        stored = await sync_to_async(load_stock_main_force)(stock_number, parse_record_date(date_str))
+    except ValueError:
+        stored = None
+    if stored:
+        return stored
+
+    fetched = await fetch_stock_main_force_dated(stock_number, date_str)
+    if fetched is None:
+        return None
+    data, fetched_at = fetched
+    if data["buy_list"] or data["sell_list"]:
+        await sync_to_async(store_stock_main_force)(stock_number, data, fetched_at)
+    return data
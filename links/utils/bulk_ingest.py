@@ -0,0 +1,137 @@
+import json
+from datetime import date
+from django.conf import settings
+from django.db.models import Q
+from links.models import Broker, StockRecord
+from links.utils.ingest import upsert_records
+
+INT_FIELDS = ('buy_volume', 'sell_volume', 'net_volume', 'record_type')
+# StockRecord's IntegerFields are 32-bit on Postgres
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _clean(row):
+    """(values, errors) for one submitted row; broker is resolved per chunk later."""
+    if not isinstance(row, dict):
+        return None, {"non_field_errors": "Expected a JSON object"}
+    errors = {}
+    values = {}
+
+    code = str(row.get('stock_code') or '').strip()
+    if not code or len(code) > 20:
+        errors['stock_code'] = "Required, at most 20 characters"
+    values['stock_code'] = code
+    name = str(row.get('stock_name') or '')
+    if len(name) > 100:
+        errors['stock_name'] = "At most 100 characters"
+    values['stock_name'] = name
+
+    try:
+        values['date'] = date.fromisoformat(str(row.get('date')))
+    except ValueError:
+        errors['date'] = "Required, YYYY-MM-DD"
+
+    for field in INT_FIELDS:
+        value = row.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            errors[field] = "Must be an integer"
+            continue
+        try:
+            values[field] = int(value)
+        except ValueError:
+            errors[field] = "Must be an integer"
+    values.setdefault('buy_volume', 0)
+    values.setdefault('sell_volume', 0)
+    values.setdefault('net_volume', values['buy_volume'] - values['sell_volume'])
+    values.setdefault('record_type', 1)
+    for field in INT_FIELDS:
+        if field not in errors and not INT_MIN <= values[field] <= INT_MAX:
+            errors[field] = f"Must be between {INT_MIN} and {INT_MAX}"
+
+    if 'broker' in row:
+        broker = row['broker']
+        if isinstance(broker, bool) or not isinstance(broker, int):
+            errors['broker'] = "Must be a broker id"
+        values['broker'] = broker
+    elif 'broker_name' in row:
+        values['broker_name'] = str(row['broker_name'])
+    else:
+        errors['broker'] = "broker (id) or broker_name is required"
+    return values, errors
+
+
+def ingest_rows(rows, chunk_size=None):
+    """Validate and upsert an iterable of record dicts, one transaction per chunk.
+
+    Each chunk resolves its brokers with a single query. Invalid rows are
+    skipped and reported by their position in the input. Returns a summary
+    dict with received, created, updated and errors.
+    """
+    chunk_size = chunk_size or settings.BULK_INGEST_CHUNK_SIZE
+    summary = {"received": 0, "created": 0, "updated": 0, "errors": []}
+    index = 0
+    for chunk in _chunks(rows, chunk_size):
+        cleaned = []
+        for row in chunk:
+            values, errors = _clean(row)
+            if errors:
+                summary["errors"].append({"index": index, "errors": errors})
+            else:
+                cleaned.append((index, values))
+            index += 1
+
+        ids = {v['broker'] for _, v in cleaned if 'broker' in v}
+        names = {v['broker_name'] for _, v in cleaned if 'broker_name' in v}
+        by_id = {}
+        by_name = {}
+        for broker_id, broker_name in Broker.objects.filter(
+                Q(id__in=ids) | Q(name__in=names)).values_list('id', 'name'):
+            by_id[broker_id] = broker_id
+            by_name[broker_name] = broker_id
+
+        records = []
+        for row_index, values in cleaned:
+            if 'broker' in values:
+                broker_id = by_id.get(values.pop('broker'))
+            else:
+                broker_id = by_name.get(values.pop('broker_name'))
+            if broker_id is None:
+                summary["errors"].append({"index": row_index, "errors": {"broker": "Unknown broker"}})
+                continue
+            records.append(StockRecord(broker_id=broker_id, **values))
+
+        created, updated = upsert_records(records)
+        summary["created"] += created
+        summary["updated"] += updated
+    summary["received"] = index
+    summary["errors"].sort(key=lambda e: e["index"])
+    return summary
+
+
+def iter_ndjson(stream):
+    """Objects from an NDJSON byte stream, read line by line.
+
+    Lines that are not valid JSON come through as their raw text, so they
+    are reported as row errors rather than failing the whole request.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line.decode('utf-8', 'replace')
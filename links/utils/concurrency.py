@@ -0,0 +1,96 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+
+
+def _worker(func):
+    """func wrapped for a pool thread: in the caller's context, closing its DB connections after."""
+    # Carry the caller's context (e.g. replica routing) into the workers
+    context = contextvars.copy_context()
+
+    def run(item):
+        try:
+            return context.copy().run(func, item)
+        finally:
+            # Worker threads get their own DB connections; don't leak them
+            connections.close_all()
+    return run
+
+
+def run_concurrently(func, items, max_workers=None):
+    """Run func over items in a thread pool and return the results in input order."""
+    items = list(items)
+    if not items:
+        return []
+
+    workers = max_workers or settings.CRAWLER_MAX_WORKERS
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        return [func(item) for item in items]
+
+    run = _worker(func)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, items))
+
+
+def iter_concurrently(func, items, max_workers=None):
+    """Like run_concurrently, but yield (index, result, error) as each item finishes.
+
+    An item that raises yields its exception as error (result None) without
+    stopping the others. Closing the generator early cancels the items that
+    haven't started.
+    """
+    items = list(items)
+    workers = max(1, min(max_workers or settings.CRAWLER_MAX_WORKERS, len(items)))
+    if workers == 1:
+        for index, item in enumerate(items):
+            try:
+                yield index, func(item), None
+            except Exception as e:
+                yield index, None, e
+        return
+
+    run = _worker(func)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(run, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], None if error else future.result(), error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_sync(iterator):
+    """Async iterator over a sync one, each next() in the request's sync thread.
+
+    That thread is the one the sync view ran in, so a DB cursor the
+    iterator holds stays on its own connection.
+    """
+    iterator = iter(iterator)
+    done = object()
+    try:
+        while True:
+            item = await sync_to_async(next)(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            await sync_to_async(close)()
+
+
+def streaming_content(request, iterator):
+    """What a sync view hands StreamingHttpResponse for a sync iterator.
+
+    Under ASGI Django reads a sync iterator to the end before sending
+    anything, so there it is wrapped in an async one; under WSGI it is
+    returned as is.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return aiter_sync(iterator)
+    return iterator
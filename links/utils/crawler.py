@@ -1,118 +1,92 @@
-import requests
-from bs4 import BeautifulSoup
-import re
 from datetime import datetime, timedelta
-from collections import defaultdict
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from links.models import BrokerStockDaily, StockMainForce, StockRecord
+from links.utils import archive
+from links.utils.http_client import fetch_page, CrawlerFetchError
+from links.utils.page_cache import get_page_dated
+from links.utils.singleflight import single_flight
+from links.utils.parsers import (
+    parse_top_buyers, parse_zco0, parse_zco0_history, parse_stock_main_force
+)
 
 
 def generate_fubon_link(number, a, b):
-    return f"https://fubon-ebrokerdj.fbs.com.tw/z/zc/zco/zco0/zco0.djhtm?a={number}&b={b}&BHID={a}"
+    return f"{settings.FUBON_BASE_URL}/z/zc/zco/zco0/zco0.djhtm?a={number}&b={b}&BHID={a}"
 
 
-def generate_fubon_detail_link(a, b, days=1):
+def generate_fubon_detail_link(a, b, days=1, date=None):
     # d=1 is daily, d=5, 10, 20 for historical
-    return f"https://fubon-ebrokerdj.fbs.com.tw/z/zg/zgb/zgb0.djhtm?a={a}&b={b}&c=E&d={days}"
+    link = f"{settings.FUBON_BASE_URL}/z/zg/zgb/zgb0.djhtm?a={a}&b={b}&c=E&d={days}"
+    if date:
+        # e/f pin the ranking to one past trading day (YYYY-MM-DD)
+        link += f"&e={date}&f={date}"
+    return link
+
+
+def generate_fubon_main_force_link(stock_number, start_date, end_date=None):
+    # e/f are the first and last trading day (YYYY-MM-DD) of the ranking
+    return f"{settings.FUBON_BASE_URL}/z/zc/zco/zco.djhtm?a={stock_number}&e={start_date}&f={end_date or start_date}"
 
 
 def generate_histock_link(number, bno):
     return f"https://histock.tw/stock/brokertrace.aspx?bno={bno}&no={number}"
 
 
+def _fetch_and_archive(link):
+    html = fetch_page(link)
+    if settings.CRAWLER_ARCHIVE_ENABLED:
+        try:
+            archive.store_page(link, html)
+        except Exception as e:
+            print(f"Error archiving {link}: {e}")
+    return html
+
+
+def fetch_html(link):
+    return fetch_html_dated(link)[0]
+
+
+def fetch_html_dated(link):
+    """(html, fetched_at): fetched_at is the epoch time a cached or archived
+    page was fetched at, None when it was fetched just now."""
+    # In replay mode pages come from the raw HTML archive only
+    if archive.is_replaying():
+        return archive.load_page_dated(link, archive.replay_date())
+    # Every fetcher reads pages through the shared cache; misses go upstream.
+    return get_page_dated(link, _fetch_and_archive)
+
+
+@single_flight
 def fetch_top_buyers(link, record_type=1):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    try:
-        response = requests.get(link, headers=headers, timeout=10)
-        response.raise_for_status()
-    except Exception as e:
-        print(f"Error fetching {link}: {e}")
-        return [], "", []
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-    table = soup.find('table', {'id': 'oMainTable'})
-    if not table:
-        return [], "", []
-
-    rows = table.find_all('tr')
-    try:
-        date_text = rows[0].find('div', class_='t11').get_text()
-        if '資料日期：' in date_text:
-            date = date_text.split('資料日期：')[1].strip()
-        else:
-            date = datetime.now().strftime("%Y-%m-%d")
-            print(
-                f"Warning: '資料日期：' not found in text: {date_text}. Using current date: {date}")
-    except (IndexError, AttributeError, ValueError) as e:
-        date = datetime.now().strftime("%Y-%m-%d")
-        print(
-            f"Error parsing date from table at {link}: {e}. Using current date: {date}")
-
-    def parse_table_side(side_table):
-        data_list = []
-        rows = side_table.find_all('tr')
-        for index, row in enumerate(rows):
-            if index < 2:
-                continue
-
-            script_tag = row.find('td').script
-            if script_tag:
-                script_content = script_tag.string.strip()
-                # GenLink2stk('AS2330','台積電');
-                match = re.search(
-                    r"GenLink2stk\('([^']+)','([^']+)'\)", script_content)
-                if match:
-                    codes_raw = match.group(1)
-                    name_raw = match.group(2)
-                    code = codes_raw[2:6] if codes_raw.startswith(
-                        'AS') else codes_raw
-                    name = f"{code}{name_raw}"
-                else:
-                    continue
-            else:
-                continue
-
-            tds = row.find_all('td')
-            if len(tds) < 4:
-                continue
-
-            buy = int(tds[1].text.strip().replace(",", ""))
-            sell = int(tds[2].text.strip().replace(",", ""))
-            dif = int(tds[3].text.strip().replace(",", ""))
-
-            data_list.append({
-                'name': name,
-                'code': code,
-                'buy': buy,
-                'sell': sell,
-                'dif': dif,
-                'date': date,
-                'type': record_type
-            })
-        return data_list
-
-    buy_side = rows[2].find_all('table')[0]
-    sell_side = rows[2].find_all('table')[1]
-
-    buy_data = parse_table_side(buy_side)
-    sell_data = parse_table_side(sell_side)
-
-    return buy_data, date, sell_data
+    # A failed fetch raises CrawlerFetchError instead of looking like an
+    # empty ranking, so callers can tell "no data" from "upstream down".
+    html = fetch_html(link)
+    return parse_top_buyers(html, record_type=record_type, link=link)
 
 
-def get_merged_data(a, b, broker_name):
-    BROKER_CONDITIONS = {
-        "港商麥格理": {"buy_threshold": 300, "sell_threshold": -300},
-        "default": {"buy_threshold": 60, "sell_threshold": -60},
-    }
+# Minimum net volume for a stock to show in a broker's buy / sell list, shared
+# by the live crawler and the DB-backed views
+BROKER_CONDITIONS = {
+    "港商麥格理": {"buy_threshold": 300, "sell_threshold": -300},
+    "default": {"buy_threshold": 60, "sell_threshold": -60},
+}
 
-    link = generate_fubon_detail_link(a, b, days=1)
-    buy_data, date, sell_data = fetch_top_buyers(link, record_type=1)
 
+def broker_thresholds(broker_name):
+    """(buy_threshold, sell_threshold) for a broker."""
     thresholds = BROKER_CONDITIONS.get(
         broker_name, BROKER_CONDITIONS["default"])
-    buy_threshold = thresholds["buy_threshold"]
-    sell_threshold = thresholds["sell_threshold"]
+    return thresholds["buy_threshold"], thresholds["sell_threshold"]
+
+
+def get_merged_data(a, b, broker_name):
+    link = generate_fubon_detail_link(a, b, days=1)
+    buy_data, date, sell_data = fetch_top_buyers(link, record_type=1)
+
+    buy_threshold, sell_threshold = broker_thresholds(broker_name)
 
     filtered_buy = [d for d in buy_data if d['dif'] >= buy_threshold]
     filtered_sell = [d for d in sell_data if d['dif'] <= sell_threshold]
@@ -120,219 +94,256 @@ def get_merged_data(a, b, broker_name):
     return filtered_buy, date, filtered_sell
 
 
+@single_flight
 def fetch_fubon_zco0_data(link, target_date_str=None):
     if not target_date_str:
         # Default to today in YYYY-MM-DD
         target_date_str = datetime.now().strftime("%Y-%m-%d")
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
     try:
-        response = requests.get(link, headers=headers, timeout=10)
-        response.raise_for_status()
-        if response.encoding == 'ISO-8859-1':
-            response.encoding = 'big5'
-    except Exception as e:
-        print(f"Error fetching {link}: {e}")
+        html = fetch_html(link)
+    except CrawlerFetchError as e:
+        print(e)
         return None
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    # The structure of zco0.djhtm is a table where rows are dates or summary
+    return parse_zco0(html, target_date_str)
 
-    # The structure of zco0.djhtm is often a table where rows are dates or summary
-    # We look for a table with id 'oMainTable'
-    table = soup.find('table', {'id': 'oMainTable'})
-    if not table:
-        return {"buy": 0, "sell": 0, "net": 0, "date": target_date_str}
 
-    rows = table.find_all('tr')
+@single_flight
+def fetch_fubon_zco0_history(link):
+    # (every date row of the page, fetched_at), or None if the fetch failed
+    try:
+        html, fetched_at = fetch_html_dated(link)
+    except CrawlerFetchError as e:
+        print(e)
+        return None
+    return parse_zco0_history(html), fetched_at
+
+
+def market_now():
+    return datetime.now(ZoneInfo(settings.MARKET_TIMEZONE))
+
+
+def fetched_time(fetched_at=None):
+    """Market time of a page fetched at epoch fetched_at; now when None."""
+    if fetched_at is None:
+        return market_now()
+    return datetime.fromtimestamp(fetched_at, ZoneInfo(settings.MARKET_TIMEZONE))
+
+
+def store_zco0_history(broker, stock_code, history, fetched_at=None):
+    """Upsert every harvested zco0 row into BrokerStockDaily in one statement.
+
+    A row is final if the day had closed when the page was fetched, so a
+    page served from the cache doesn't make an intraday row final. The page
+    lists every day the broker traded the stock from its oldest row up to
+    the fetch, so final weekdays in that range without a row are stored as
+    zero rows; lookups for them then don't go back to Fubon.
+    """
+    as_of = fetched_time(fetched_at)
+    rows = [
+        BrokerStockDaily(
+            broker=broker,
+            stock_code=stock_code,
+            date=row['date'],
+            buy_volume=row['buy'],
+            sell_volume=row['sell'],
+            net_volume=row['net'],
+            is_final=is_final_date(row['date'], as_of),
+        )
+        for row in history
+    ]
+    traded = {row['date'] for row in history}
+    # An empty page may be an error page rather than a broker with no trades
+    day = min(traded, default=as_of.date() + timedelta(days=1))
+    while day <= as_of.date():
+        if day.weekday() < 5 and day not in traded and is_final_date(day, as_of):
+            rows.append(BrokerStockDaily(broker=broker, stock_code=stock_code, date=day, is_final=True))
+        day += timedelta(days=1)
+    BrokerStockDaily.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['broker', 'stock_code', 'date'],
+        update_fields=['buy_volume', 'sell_volume', 'net_volume', 'is_final', 'fetched_at'],
+    )
+
+
+def get_main_force_merged_data(number, a, b, date_str=None, broker=None):
+    link = generate_fubon_link(number, a, b)
+    if broker is None:
+        return fetch_fubon_zco0_data(link, date_str)
+
+    # With a broker, one zco0 fetch fills BrokerStockDaily for every date on
+    # the page; later lookups for any of those dates skip the network.
+    if not date_str:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+    try:
+        target_date = parse_record_date(date_str)
+    except ValueError:
+        return fetch_fubon_zco0_data(link, date_str)
 
-    # Target date formats to check (e.g. "2025-12-30" or "2025/12/30")
-    target_date_slash = target_date_str.replace('-', '/')
+    stored = BrokerStockDaily.objects.filter(
+        broker=broker, stock_code=number, date=target_date, is_final=True).first()
+    if stored:
+        return {"buy": stored.buy_volume, "sell": stored.sell_volume, "net": stored.net_volume, "date": date_str}
 
-    for row in rows:
-        tds = row.find_all('td')
-        if len(tds) < 4:
-            continue
-
-        # Get text of the first cell (Date)
-        date_cell_text = tds[0].get_text().strip()
-
-        # Check if this row contains our target date in any of the common formats
-        if target_date_str in date_cell_text or target_date_slash in date_cell_text:
-            try:
-                # Fubon zco0 typically: Date, Buy, Sell, Net, ...
-                buy = int(tds[1].text.strip().replace(",", ""))
-                sell = int(tds[2].text.strip().replace(",", ""))
-                net = int(tds[3].text.strip().replace(",", ""))
-                return {"buy": buy, "sell": sell, "net": net, "date": target_date_str}
-            except (ValueError, IndexError) as e:
-                print(f"Error parsing zco0 row data: {e}")
-                continue
-
-    # Fallback: if no date match found in rows, check if there's a summary row
-    # or if we should just return 0s
-    return {"buy": 0, "sell": 0, "net": 0, "date": target_date_str}
-
-
-def get_main_force_merged_data(number, a, b, date_str=None):
-    link = generate_fubon_link(number, a, b)
-    data = fetch_fubon_zco0_data(link, date_str)
-    return data
+    fetched = fetch_fubon_zco0_history(link)
+    if fetched is None:
+        return None
+    history, fetched_at = fetched
+    store_zco0_history(broker, number, history, fetched_at)
+
+    for row in history:
+        if row['date'] == target_date:
+            return {"buy": row['buy'], "sell": row['sell'], "net": row['net'], "date": date_str}
+    return {"buy": 0, "sell": 0, "net": 0, "date": date_str}
 
 
 def fetch_stock_main_force_data(stock_number, date_str=None):
+    fetched = fetch_stock_main_force_dated(stock_number, date_str)
+    return fetched and fetched[0]
+
+
+def fetch_stock_main_force_dated(stock_number, date_str=None):
+    """(ranking, fetched_at) as in fetch_html_dated, or None if the fetch failed."""
     if not date_str:
         date_str = datetime.now().strftime("%Y-%m-%d")
 
     # Use the specific URL format with date parameters e and f
-    link = f"https://fubon-ebrokerdj.fbs.com.tw/z/zc/zco/zco.djhtm?a={stock_number}&e={date_str}&f={date_str}"
+    link = generate_fubon_main_force_link(stock_number, date_str)
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
     try:
-        response = requests.get(link, headers=headers, timeout=10)
-        response.raise_for_status()
-        if response.encoding == 'ISO-8859-1':
-            response.encoding = 'big5'
-    except Exception as e:
-        print(f"Error fetching stock main force {link}: {e}")
+        html, fetched_at = fetch_html_dated(link)
+    except CrawlerFetchError as e:
+        print(f"Error fetching stock main force: {e}")
         return None
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    # Extract date from page if possible, otherwise use passed date
-    date = date_str
-    date_div = soup.find('div', class_='t11')
-    if date_div:
-        date_match = re.search(r"(\d{4}/\d{1,2}/\d{1,2})", date_div.get_text())
-        if date_match:
-            date = date_match.group(1).replace('/', '-')
-
-    # The main table usually has id 'oMainTable'
-    table = soup.find('table', {'id': 'oMainTable'})
-    if not table:
-        # Fallback: find the first table with enough rows
-        tables = soup.find_all('table')
-        for t in tables:
-            if len(t.find_all('tr')) > 10:
-                table = t
-                break
-
-    if not table:
-        return {"buy_list": [], "sell_list": [], "date": date}
-
-    buy_list = []
-    sell_list = []
-    rows = table.find_all('tr')
+    return parse_stock_main_force(html, date_str), fetched_at
+
+
+def is_final_date(day, now=None):
+    """Whether a trading day's data can no longer change (as of now, in market time)."""
+    now = now or market_now()
+    return day < now.date() or (day == now.date() and now.hour >= settings.MARKET_DATA_FINAL_HOUR)
+
+
+def store_stock_main_force(stock_number, data, fetched_at=None):
+    """Replace the stored main-force ranking of one stock for the page's date.
 
+    Final if the day had closed when the page was fetched (fetched_at, as
+    in fetch_html_dated), so a cached intraday page isn't stored as final.
+    """
+    try:
+        day = parse_record_date(data["date"])
+    except ValueError:
+        return None
+    is_final = is_final_date(day, fetched_time(fetched_at))
+    rows = [
+        StockMainForce(
+            stock_code=stock_number,
+            date=day,
+            side=side,
+            rank=rank,
+            broker_name=item["name"],
+            buy_volume=item["buy"],
+            sell_volume=item["sell"],
+            net_volume=item["net"],
+            percent=item["percent"],
+            is_final=is_final,
+        )
+        for side, items in ((StockMainForce.SIDE_BUY, data["buy_list"]), (StockMainForce.SIDE_SELL, data["sell_list"]))
+        for rank, item in enumerate(items, 1)
+    ]
+    with transaction.atomic():
+        StockMainForce.objects.filter(stock_code=stock_number, date=day).delete()
+        StockMainForce.objects.bulk_create(rows)
+    return day
+
+
+def load_stock_main_force(stock_number, day):
+    """Stored final ranking in fetch_stock_main_force_data's shape, or None."""
+    rows = list(StockMainForce.objects.filter(stock_code=stock_number, date=day, is_final=True).order_by('side', 'rank'))
+    if not rows:
+        return None
+    data = {"buy_list": [], "sell_list": [], "date": day.isoformat()}
     for row in rows:
-        tds = row.find_all('td')
-        # Check for the flat 10-column layout (5 columns for buy, 5 for sell)
-        if len(tds) == 10:
-            # Skip rows that are clearly headers or footers
-            if "合計" in row.text or "平均" in row.text or "買超券商" in row.text:
-                continue
-
-            def parse_broker_td(name_td, buy_td, sell_td, net_td, percent_td):
-                name = name_td.text.strip()
-                if not name or "券商" in name:
-                    return None
-
-                # Try to get name from GenLink2bkr script if available
-                script = name_td.find('script')
-                if script and script.string:
-                    m = re.search(
-                        r"GenLink2bkr\('([^']+)','([^']+)'\)", script.string)
-                    if m:
-                        name = m.group(2)
-
-                try:
-                    buy_val = int(buy_td.text.strip().replace(',', ''))
-                    sell_val = int(sell_td.text.strip().replace(',', ''))
-                    net_val = int(net_td.text.strip().replace(',', ''))
-                    percent_val = percent_td.text.strip()
-
-                    if buy_val == 0 and sell_val == 0 and net_val == 0:
-                        return None
-
-                    return {
-                        "name": name,
-                        "buy": buy_val,
-                        "sell": sell_val,
-                        "net": net_val,
-                        "percent": percent_val
-                    }
-                except (ValueError, IndexError):
-                    return None
-
-            # Left side: Buyers
-            buy_item = parse_broker_td(tds[0], tds[1], tds[2], tds[3], tds[4])
-            if buy_item:
-                buy_list.append(buy_item)
-
-            # Right side: Sellers
-            sell_item = parse_broker_td(tds[5], tds[6], tds[7], tds[8], tds[9])
-            if sell_item:
-                sell_list.append(sell_item)
-
-    # Fallback: if flat layout didn't yield results, try looking for nested tables
-    if not buy_list and not sell_list:
-        all_tables = table.find_all('table')
-        found_sub_tables = []
-        for st in all_tables:
-            header_text = st.get_text()
-            if "買進" in header_text and "賣出" in header_text and "買賣超" in header_text:
-                found_sub_tables.append(st)
-
-        def parse_nested_table(t):
-            items = []
-            for r in t.find_all('tr'):
-                tds = r.find_all('td')
-                if len(tds) < 5:
-                    continue
-
-                # Skip header rows
-                if "券商" in tds[0].text or "買進" in tds[1].text:
-                    continue
-
-                name = tds[0].text.strip()
-                script = tds[0].find('script')
-                if script and script.string:
-                    m = re.search(
-                        r"GenLink2bkr\('([^']+)','([^']+)'\)", script.string)
-                    if m:
-                        name = m.group(2)
-
-                try:
-                    buy_v = int(tds[1].text.strip().replace(',', ''))
-                    sell_v = int(tds[2].text.strip().replace(',', ''))
-                    net_v = int(tds[3].text.strip().replace(',', ''))
-                    if buy_v == 0 and sell_v == 0 and net_v == 0:
-                        continue
-                    items.append({
-                        "name": name,
-                        "buy": buy_v,
-                        "sell": sell_v,
-                        "net": net_v,
-                        "percent": tds[4].text.strip()
-                    })
-                except:
-                    continue
-            return items
-
-        if len(found_sub_tables) >= 2:
-            buy_list = parse_nested_table(found_sub_tables[0])
-            sell_list = parse_nested_table(found_sub_tables[1])
-        elif len(found_sub_tables) == 1:
-            buy_list = parse_nested_table(found_sub_tables[0])
-
-    return {
-        "buy_list": buy_list,
-        "sell_list": sell_list,
-        "date": date
-    }
+        data[f"{row.side}_list"].append({
+            "name": row.broker_name,
+            "buy": row.buy_volume,
+            "sell": row.sell_volume,
+            "net": row.net_volume,
+            "percent": row.percent,
+        })
+    return data
+
+
+def get_stock_main_force_data(stock_number, date_str=None):
+    """Main-force ranking from the DB when the day is final, otherwise crawled and stored."""
+    if not date_str:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+    try:
+        stored = load_stock_main_force(stock_number, parse_record_date(date_str))
+    except ValueError:
+        stored = None
+    if stored:
+        return stored
+
+    fetched = fetch_stock_main_force_dated(stock_number, date_str)
+    if fetched is None:
+        return None
+    data, fetched_at = fetched
+    if data["buy_list"] or data["sell_list"]:
+        store_stock_main_force(stock_number, data, fetched_at)
+    return data
+
+
+def get_stored_history(broker, days, end_date=None):
+    """N-day buy/sell ranking of a broker summed from stored daily StockRecords.
+
+    The window is the last `days` trading dates present in StockRecord (up
+    to end_date, default the latest final one, so holidays need no calendar).
+    Returns (buy_data, date, sell_data, date_range) shaped like the zgb0 d=N
+    page, or None when the window is not fully covered: fewer dates stored or
+    the broker missing on one of them. Each day only contributes the rows
+    stored for it, i.e. that day's top-N of the broker.
+    """
+    trading_dates = StockRecord.objects.filter(record_type=1)
+    if end_date is None:
+        # Today's rows are not final before the market data settles
+        now = market_now()
+        end_date = now.date()
+        if not is_final_date(end_date, now):
+            end_date -= timedelta(days=1)
+    trading_dates = trading_dates.filter(date__lte=end_date)
+    window = list(trading_dates.order_by('-date').values_list('date', flat=True).distinct()[:days])
+    if len(window) < days:
+        return None
+    first, last = window[-1], window[0]
+
+    records = StockRecord.objects.filter(broker=broker, record_type=1, date__gte=first, date__lte=last)
+    if records.values('date').distinct().count() < days:
+        return None
+
+    totals = records.values('stock_code').annotate(
+        name=Max('stock_name'), buy=Sum('buy_volume'), sell=Sum('sell_volume'), net=Sum('net_volume'))
+    size = settings.HISTORY_RANKING_SIZE
+    date_str = last.strftime('%Y%m%d')
+
+    def items(rows):
+        return [{
+            'name': row['name'],
+            'code': row['stock_code'],
+            'buy': row['buy'],
+            'sell': row['sell'],
+            'dif': row['net'],
+            'date': date_str,
+            'type': 1
+        } for row in rows]
+
+    buy_data = items(totals.filter(net__gt=0).order_by('-net', 'stock_code')[:size])
+    sell_data = items(totals.filter(net__lt=0).order_by('net', 'stock_code')[:size])
+    return buy_data, date_str, sell_data, f"{first:%Y%m%d}~{date_str}"
 
 
 def find_previous_workdays_range(date_str, num_workdays):
@@ -361,3 +372,12 @@ def find_previous_workdays_range(date_str, num_workdays):
 
     start_date = current_date.strftime(date_format)
     return f"{start_date}~{date_str}"
+
+
+def parse_record_date(date_str):
+    # date_str can be YYYY-MM-DD, YYYY/MM/DD or YYYYMMDD; raises ValueError
+    clean_date_str = date_str.replace('/', '-').strip()
+    if '-' in clean_date_str:
+        return datetime.strptime(clean_date_str, '%Y-%m-%d').date()
+    # Handle YYYYMMDD format
+    return datetime.strptime(clean_date_str, '%Y%m%d').date()
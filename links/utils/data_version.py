@@ -0,0 +1,79 @@
+import hashlib
+from datetime import datetime, time
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from links.models import Broker, DataVersion
+
+VERSION_ID = 1
+
+
+def bump_data_version():
+    """Advance the global data version.
+
+    Call inside the transaction that writes the data, so the new version
+    becomes visible together with it.
+    """
+    now = timezone.now()
+    if not DataVersion.objects.filter(pk=VERSION_ID).update(version=F('version') + 1, updated_at=now):
+        DataVersion.objects.get_or_create(pk=VERSION_ID, defaults={'version': 1, 'updated_at': now})
+
+
+def current_data_version():
+    """(version, updated_at); (0, None) before the first write."""
+    row = DataVersion.objects.filter(pk=VERSION_ID).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def _broker_changed(sender, **kwargs):
+    bump_data_version()
+
+
+post_save.connect(_broker_changed, sender=Broker, dispatch_uid='links.data_version.broker_saved')
+post_delete.connect(_broker_changed, sender=Broker, dispatch_uid='links.data_version.broker_deleted')
+
+
+class DataVersionMixin:
+    """View mixin: conditional GET keyed on the data version.
+
+    Responses carry an ETag (data version plus the request's URL and Accept
+    header) and a Last-Modified (time of the last write). A request whose
+    If-None-Match / If-Modified-Since still matches gets a 304 before the
+    view runs any of its own queries.
+    """
+
+    def data_date(self, request):
+        """The day a request reads when it doesn't name one (e.g. "today"), or None.
+
+        It goes into the validators so a new day isn't answered from the
+        previous day's response.
+        """
+        return None
+
+    def data_validators(self, request):
+        version, updated_at = current_data_version()
+        data_date = self.data_date(request)
+        key = '\n'.join([request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), str(data_date or '')])
+        etag = quote_etag(f"{version}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}")
+
+        last_modified = updated_at.timestamp() if updated_at else None
+        if last_modified is not None and data_date:
+            last_modified = max(last_modified, datetime.combine(data_date, time.min).timestamp())
+        return etag, last_modified and int(last_modified)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, last_modified = self.data_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response.headers.setdefault('ETag', etag)
+        if last_modified:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        return response
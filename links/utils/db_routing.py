@@ -0,0 +1,99 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Route ORM reads in this context to the replica, if one is configured."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Reads go to the replica only inside replica_reads(); everything else uses default.
+
+    Only the read-only views opt in, so writes (fetch_broker_data, POST
+    endpoints) and read-after-write paths always see the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema by replication
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """View mixin: GET/HEAD/OPTIONS requests read from the replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return super().dispatch(request, *args, **kwargs)
+        if getattr(self, 'view_is_async', False):
+            # The handler runs when the coroutine is awaited, not here
+            handler = super().dispatch(request, *args, **kwargs)
+
+            async def dispatch_on_replica():
+                with replica_reads():
+                    return await handler
+            return dispatch_on_replica()
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+
+_stats = {'requests': 0, 'connections': {}}
+_stats_lock = threading.Lock()
+
+
+def _count_connection(sender, connection, **kwargs):
+    with _stats_lock:
+        _stats['connections'][connection.alias] = _stats['connections'].get(connection.alias, 0) + 1
+
+
+def _count_request(sender, **kwargs):
+    with _stats_lock:
+        _stats['requests'] += 1
+
+
+connection_created.connect(_count_connection, dispatch_uid='links.db_routing.count_connection')
+request_started.connect(_count_request, dispatch_uid='links.db_routing.count_request')
+
+
+def connection_stats():
+    """Connections opened per alias since start, against requests served.
+
+    With persistent connections the count stays near one per worker thread
+    instead of growing with every request.
+    """
+    with _stats_lock:
+        return {
+            "requests": _stats['requests'],
+            "connections_opened": dict(_stats['connections']),
+            "conn_max_age": {alias: db.get('CONN_MAX_AGE', 0) for alias, db in settings.DATABASES.items()},
+        }
+
+
+def reset_connection_stats():
+    with _stats_lock:
+        _stats['requests'] = 0
+        _stats['connections'].clear()
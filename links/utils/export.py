@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+import zlib
+from django.db import router
+from links.models import StockRecord
+
+EXPORT_FIELDS = [
+    'date', 'broker_id', 'broker_name', 'stock_code', 'stock_name',
+    'buy_volume', 'sell_volume', 'net_volume', 'record_type',
+]
+CHUNK_ROWS = 2000
+
+
+def export_rows(start_date=None, end_date=None, broker_ids=None, stock_code=None):
+    """StockRecord rows with the broker name joined in, as tuples in EXPORT_FIELDS order.
+
+    .iterator() streams from a server-side cursor on Postgres (chunked
+    fetches elsewhere), so the result set is never held in memory. The
+    database is picked now: the rows are read after the view has returned.
+    """
+    records = StockRecord.objects.using(router.db_for_read(StockRecord))
+    if start_date:
+        records = records.filter(date__gte=start_date)
+    if end_date:
+        records = records.filter(date__lte=end_date)
+    if broker_ids:
+        records = records.filter(broker_id__in=broker_ids)
+    if stock_code:
+        records = records.filter(stock_code=stock_code)
+    fields = [f.replace('broker_name', 'broker__name') for f in EXPORT_FIELDS]
+    return records.order_by('date', 'broker_id', 'stock_code', 'record_type').values_list(
+        *fields).iterator(chunk_size=CHUNK_ROWS)
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(rows):
+    """Header line first, then one string chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    for batch in _batches(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows((row[0].isoformat(),) + row[1:] for row in batch)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    for batch in _batches(rows):
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_FIELDS, (row[0].isoformat(),) + row[1:])), ensure_ascii=False) + '\n'
+            for row in batch)
+
+
+def iter_gzip(chunks):
+    """gzip-compress a stream of str chunks without buffering the whole output."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(output='csv', compress=False, **filters):
+    """Byte or str chunks of the export in the requested format."""
+    rows = export_rows(**filters)
+    chunks = iter_ndjson(rows) if output == 'ndjson' else iter_csv(rows)
+    return iter_gzip(chunks) if compress else chunks
@@ -0,0 +1,198 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from links.utils.rate_limit import limiter_for, BACKOFF_STATUS_CODES
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Fubon pages are Big5 but usually come without a charset header, in which
+# case requests falls back to ISO-8859-1.
+DEFAULT_ENCODING = 'big5'
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CrawlerFetchError(Exception):
+    """Raised when an upstream page could not be fetched after all retries."""
+
+
+_session = None
+_session_lock = threading.Lock()
+# One AsyncClient (and connection pool) per event loop
+_async_clients = weakref.WeakKeyDictionary()
+_timing_hooks = []
+
+
+def add_timing_hook(hook):
+    """Register hook(url, elapsed_seconds, status_code, error), called after every fetch."""
+    _timing_hooks.append(hook)
+
+
+def remove_timing_hook(hook):
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+
+def _build_session():
+    retry = Retry(
+        total=settings.CRAWLER_HTTP_RETRIES,
+        connect=settings.CRAWLER_HTTP_RETRIES,
+        read=settings.CRAWLER_HTTP_RETRIES,
+        status=settings.CRAWLER_HTTP_RETRIES,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET']),
+        backoff_factor=settings.CRAWLER_HTTP_BACKOFF,
+        backoff_jitter=settings.CRAWLER_HTTP_BACKOFF,
+        raise_on_status=False,
+    )
+    # One keep-alive pool per host, large enough for every crawler worker
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max(settings.CRAWLER_MAX_WORKERS, 1),
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_session():
+    """Drop the shared session so the next fetch rebuilds it from settings."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _run_timing_hooks(url, elapsed, status_code, error):
+    for hook in list(_timing_hooks):
+        try:
+            hook(url, elapsed, status_code, error)
+        except Exception as e:
+            print(f"Error in crawler timing hook: {e}")
+
+
+def _was_congested(response):
+    """True if the final response or any retried attempt was a 429/5xx or an error."""
+    if response.status_code in BACKOFF_STATUS_CODES:
+        return True
+    retries = getattr(response.raw, 'retries', None)
+    for attempt in getattr(retries, 'history', ()):
+        if attempt.error is not None or attempt.status in BACKOFF_STATUS_CODES:
+            return True
+    return False
+
+
+def fetch_page(url, timeout=None):
+    """Fetch url through the shared pooled session and return the decoded HTML."""
+    start = time.perf_counter()
+    status_code = None
+    error = None
+    # Every request to a host waits for its token bucket and adaptive
+    # concurrency slot; the outcome feeds back into that host's limit.
+    with limiter_for(url).slot() as done:
+        try:
+            response = get_session().get(
+                url, timeout=timeout or settings.CRAWLER_HTTP_TIMEOUT)
+            status_code = response.status_code
+            done(time.perf_counter() - start, _was_congested(response))
+            response.raise_for_status()
+            if not response.encoding or response.encoding.upper() == 'ISO-8859-1':
+                response.encoding = DEFAULT_ENCODING
+            return response.text
+        except requests.RequestException as e:
+            error = e
+            raise CrawlerFetchError(f"Error fetching {url}: {e}") from e
+        finally:
+            _run_timing_hooks(url, time.perf_counter() - start, status_code, error)
+
+
+def get_async_client():
+    """Shared httpx.AsyncClient of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            timeout=settings.CRAWLER_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.CRAWLER_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CRAWLER_ASYNC_MAX_CONNECTIONS),
+            follow_redirects=True,
+        )
+    return client
+
+
+async def close_async_client():
+    """Close the running loop's client, e.g. before the loop shuts down."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _backoff(attempt):
+    """Delay before retry number `attempt` (1-based), like urllib3's jittered backoff."""
+    factor = settings.CRAWLER_HTTP_BACKOFF
+    if attempt <= 1:
+        return random.uniform(0, factor)
+    return factor * 2 ** (attempt - 1) + random.uniform(0, factor)
+
+
+async def fetch_page_async(url, timeout=None):
+    """fetch_page() for coroutines, over the loop's pooled httpx client.
+
+    Shares the per-host rate limiter, retry policy and timing hooks with
+    the sync client; only the waiting happens on the event loop.
+    """
+    start = time.perf_counter()
+    status_code = None
+    error = None
+    async with limiter_for(url).slot_async() as done:
+        congested = False
+        try:
+            for attempt in range(settings.CRAWLER_HTTP_RETRIES + 1):
+                if attempt:
+                    await asyncio.sleep(_backoff(attempt))
+                try:
+                    response = await get_async_client().get(
+                        url, timeout=timeout or settings.CRAWLER_HTTP_TIMEOUT)
+                except httpx.TransportError:
+                    congested = True
+                    if attempt == settings.CRAWLER_HTTP_RETRIES:
+                        raise
+                    continue
+                status_code = response.status_code
+                if status_code not in RETRY_STATUS_CODES or attempt == settings.CRAWLER_HTTP_RETRIES:
+                    break
+                congested = True
+
+            done(time.perf_counter() - start, congested or status_code in BACKOFF_STATUS_CODES)
+            response.raise_for_status()
+            encoding = response.charset_encoding
+            if not encoding or encoding.upper() == 'ISO-8859-1':
+                encoding = DEFAULT_ENCODING
+            return response.content.decode(encoding, errors='replace')
+        except httpx.HTTPError as e:
+            error = e
+            raise CrawlerFetchError(f"Error fetching {url}: {e}") from e
+        finally:
+            _run_timing_hooks(url, time.perf_counter() - start, status_code, error)
@@ -0,0 +1,165 @@
+import csv
+import hashlib
+import io
+import json
+from django.conf import settings
+from django.db import connection, transaction
+from links.models import Broker, StockRecord
+from links.utils.aggregates import refresh_daily_aggregates
+from links.utils.data_version import bump_data_version
+from links.utils.partitions import ensure_partitions
+
+UPSERT_FIELDS = ['stock_name', 'buy_volume', 'sell_volume', 'net_volume']
+UNIQUE_FIELDS = ['broker', 'stock_code', 'date', 'record_type']
+HASH_FIELDS = ('code', 'name', 'buy', 'sell', 'dif')
+
+
+def table_hash(buy_data, sell_data):
+    """sha256 of the parsed buy/sell rows, independent of page markup."""
+    rows = [[[item[field] for field in HASH_FIELDS] for item in side] for side in (buy_data, sell_data)]
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def is_unchanged(broker, record_date, digest):
+    """True when this exact table was the last one ingested for broker."""
+    return broker.last_ingested_date == record_date and broker.last_ingested_hash == digest
+
+
+def _stamp(broker, record_date, digest):
+    # Backfills of older days must not move the stamp backwards
+    if broker.last_ingested_date and record_date < broker.last_ingested_date:
+        return
+    Broker.objects.filter(pk=broker.pk).update(
+        last_ingested_date=record_date, last_ingested_hash=digest)
+    broker.last_ingested_date = record_date
+    broker.last_ingested_hash = digest
+
+
+def _key(record):
+    return record.broker_id, record.stock_code, record.date, record.record_type
+
+
+def _dedupe(records):
+    # A row repeated in one batch keeps its last version, as repeated update_or_create did
+    by_key = {}
+    for record in records:
+        by_key[_key(record)] = record
+    return list(by_key.values())
+
+
+def _bulk_upsert(records):
+    """INSERT ... ON CONFLICT DO UPDATE through the ORM; returns the number of new rows."""
+    keys = {_key(r) for r in records}
+    existing = set(StockRecord.objects.filter(
+        broker_id__in={k[0] for k in keys}, stock_code__in={k[1] for k in keys},
+        date__in={k[2] for k in keys}, record_type__in={k[3] for k in keys},
+    ).values_list('broker_id', 'stock_code', 'date', 'record_type'))
+    StockRecord.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=UNIQUE_FIELDS,
+        update_fields=UPSERT_FIELDS,
+        batch_size=500,
+    )
+    return len(keys) - len(keys & existing)
+
+
+def _copy_upsert(records):
+    """Postgres: COPY into a temp staging table, then one INSERT ... ON CONFLICT.
+
+    Returns the number of new rows, counted by joining the staging rows to
+    the existing ones first (RETURNING xmax is not available on the
+    partitioned table).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for r in records:
+        writer.writerow([r.broker_id, r.stock_code, r.stock_name, r.date.isoformat(),
+                         r.buy_volume, r.sell_volume, r.net_volume, r.record_type])
+    buffer.seek(0)
+
+    table = StockRecord._meta.db_table
+    columns = "broker_id, stock_code, stock_name, date, buy_volume, sell_volume, net_volume, record_type"
+    with connection.cursor() as cursor:
+        # An earlier call in the same transaction may have left it behind
+        cursor.execute("DROP TABLE IF EXISTS stockrecord_staging")
+        cursor.execute(
+            "CREATE TEMP TABLE stockrecord_staging ("
+            "broker_id bigint, stock_code varchar(20), stock_name varchar(100), date date, "
+            "buy_volume integer, sell_volume integer, net_volume integer, record_type integer"
+            ") ON COMMIT DROP")
+        cursor.copy_expert(
+            f"COPY stockrecord_staging ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (stock_name))", buffer)
+        cursor.execute(
+            f"SELECT COUNT(*) FROM stockrecord_staging s JOIN {table} t "
+            "USING (broker_id, stock_code, date, record_type)")
+        existing = cursor.fetchone()[0]
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT {columns} FROM stockrecord_staging "
+            "ON CONFLICT (broker_id, stock_code, date, record_type) DO UPDATE SET "
+            "stock_name = EXCLUDED.stock_name, buy_volume = EXCLUDED.buy_volume, "
+            "sell_volume = EXCLUDED.sell_volume, net_volume = EXCLUDED.net_volume")
+        return len(records) - existing
+
+
+def upsert_records(records):
+    """Insert or update unsaved StockRecords on their unique key in one transaction.
+
+    Rows may span brokers and dates. The touched StockDailyAggregate rows
+    are refreshed and the data version advanced in the same transaction.
+    Returns (created, updated) after
+    dropping duplicates within records (the last one wins).
+    """
+    records = _dedupe(records)
+    if not records:
+        return 0, 0
+
+    ensure_partitions(min(r.date for r in records))
+    touched = {}
+    for r in records:
+        touched.setdefault((r.date, r.record_type), set()).add(r.stock_code)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and settings.INGEST_USE_COPY:
+            created = _copy_upsert(records)
+        else:
+            created = _bulk_upsert(records)
+        for (record_date, record_type), codes in touched.items():
+            refresh_daily_aggregates(record_date, codes, record_type)
+        bump_data_version()
+    return created, len(records) - created
+
+
+def ingest_broker_records(broker, buy_data, record_date, sell_data, digest=None):
+    """Write one broker's parsed zgb0 rows for record_date in a single transaction.
+
+    Returns (created, updated), counted per input row like the old
+    update_or_create loop. The day's StockDailyAggregate rows and the
+    broker's last ingested date and table hash are updated in the same
+    transaction.
+    """
+    all_records = buy_data + sell_data
+    if not all_records:
+        return 0, 0
+    if digest is None:
+        digest = table_hash(buy_data, sell_data)
+
+    records = [
+        StockRecord(
+            broker=broker,
+            stock_code=item['code'],
+            date=record_date,
+            record_type=1,
+            stock_name=item['name'],
+            buy_volume=item['buy'],
+            sell_volume=item['sell'],
+            net_volume=item['dif'],
+        )
+        for item in all_records
+    ]
+
+    with transaction.atomic():
+        created, _ = upsert_records(records)
+        _stamp(broker, record_date, digest)
+
+    return created, len(all_records) - created
@@ -0,0 +1,267 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from django.conf import settings
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    refreshing_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Set by bypass(); process-wide so it also covers crawler worker threads
+_bypass = {'enabled': False}
+
+# How long one process may hold the right to refresh a stale page before
+# another process is allowed to try again.
+REFRESH_CLAIM_SECONDS = 60
+
+
+def normalize_url(url):
+    """Cache key for a Fubon URL: lowercase scheme/host and sorted query params."""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+def page_type(url):
+    parts = urlsplit(url)
+    name = parts.path.rsplit('/', 1)[-1].split('.')[0].lower()
+    # Date-pinned zco/zgb0 pages for a finished trading day never change
+    end_date = dict(parse_qsl(parts.query)).get('f', '')
+    if end_date and end_date < datetime.now().strftime("%Y-%m-%d"):
+        if f"{name}_history" in settings.CRAWLER_CACHE_TTLS:
+            return f"{name}_history"
+    return name if name in settings.CRAWLER_CACHE_TTLS else 'default'
+
+
+def page_ttl(url):
+    return settings.CRAWLER_CACHE_TTLS.get(page_type(url), settings.CRAWLER_CACHE_TTLS['default'])
+
+
+def _connection():
+    path = str(settings.CRAWLER_CACHE_PATH)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    return conn
+
+
+def _bump(conn, name, amount=1):
+    conn.execute(
+        "INSERT INTO counters (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        (name, amount))
+
+
+def _store(conn, key, body):
+    now = time.time()
+    conn.execute(
+        "INSERT INTO pages (url, body, fetched_at, accessed_at, refreshing_until) "
+        "VALUES (?, ?, ?, ?, 0) "
+        "ON CONFLICT(url) DO UPDATE SET body = excluded.body, "
+        "fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at, "
+        "refreshing_until = 0", (key, body, now, now))
+    _evict(conn)
+
+
+def _evict(conn):
+    max_entries = settings.CRAWLER_CACHE_MAX_ENTRIES
+    count = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+    if count > max_entries:
+        conn.execute(
+            "DELETE FROM pages WHERE url IN "
+            "(SELECT url FROM pages ORDER BY accessed_at ASC LIMIT ?)",
+            (count - max_entries,))
+        _bump(conn, 'evictions', count - max_entries)
+
+
+def _claim_refresh(conn, key):
+    """Atomically claim the refresh of a stale page; only one process wins."""
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE pages SET refreshing_until = ? WHERE url = ? AND refreshing_until < ?",
+        (now + REFRESH_CLAIM_SECONDS, key, now))
+    return cursor.rowcount == 1
+
+
+def _release_refresh(key):
+    _connection().execute(
+        "UPDATE pages SET refreshing_until = 0 WHERE url = ?", (key,))
+
+
+def _store_page(key, body):
+    _store(_connection(), key, body)
+
+
+def _refresh(url, key, fetch):
+    try:
+        body = fetch(url)
+        _store_page(key, body)
+    except Exception as e:
+        print(f"Error refreshing cached page {url}: {e}")
+        _release_refresh(key)
+
+
+def _spawn_refresh(url, key, fetch):
+    thread = threading.Thread(target=_refresh, args=(url, key, fetch), daemon=True)
+    thread.start()
+    return thread
+
+
+async def _refresh_async(url, key, fetch):
+    try:
+        body = await fetch(url)
+        await asyncio.to_thread(_store_page, key, body)
+    except Exception as e:
+        print(f"Error refreshing cached page {url}: {e}")
+        await asyncio.to_thread(_release_refresh, key)
+
+
+# Running background refreshes; the loop only keeps weak references to tasks
+_refresh_tasks = set()
+
+
+def _lookup(url, key):
+    """(body, fetched_at, refresh) for a servable cached page, or
+    (None, None, False) on a miss.
+
+    refresh is True when the page is stale and this process claimed its
+    refresh.
+    """
+    conn = _connection()
+    row = conn.execute(
+        "SELECT body, fetched_at FROM pages WHERE url = ?", (key,)).fetchone()
+    now = time.time()
+
+    if row:
+        body, fetched_at = row
+        age = now - fetched_at
+        ttl = page_ttl(url)
+        if age <= ttl + settings.CRAWLER_CACHE_STALE_SECONDS:
+            conn.execute(
+                "UPDATE pages SET accessed_at = ? WHERE url = ?", (now, key))
+            if age <= ttl:
+                _bump(conn, 'hits')
+                return body, fetched_at, False
+            _bump(conn, 'stale_hits')
+            return body, fetched_at, _claim_refresh(conn, key)
+
+    _bump(conn, 'misses')
+    return None, None, False
+
+
+def get_page(url, fetch):
+    """Return the HTML for url, going through the shared page cache.
+
+    fetch(url) is only called on a miss, or in the background when a cached
+    page is stale but still inside CRAWLER_CACHE_STALE_SECONDS.
+    """
+    return get_page_dated(url, fetch)[0]
+
+
+@contextmanager
+def bypass():
+    """Fetch every page fresh inside the block, storing it for later readers.
+
+    For the ingestion commands: a cached page may predate Fubon's publication
+    of the day's data, and ingesting it would record the day as missing.
+    """
+    previous = _bypass['enabled']
+    _bypass['enabled'] = True
+    try:
+        yield
+    finally:
+        _bypass['enabled'] = previous
+
+
+def get_page_dated(url, fetch):
+    """get_page() as (body, fetched_at).
+
+    fetched_at is the epoch time a cached page was fetched at, or None when
+    fetch(url) was just called for it.
+    """
+    if not settings.CRAWLER_CACHE_ENABLED:
+        return fetch(url), None
+
+    key = normalize_url(url)
+    if _bypass['enabled']:
+        body = fetch(url)
+        _store(_connection(), key, body)
+        return body, None
+
+    body, fetched_at, refresh = _lookup(url, key)
+    if body is not None:
+        if refresh:
+            _spawn_refresh(url, key, fetch)
+        return body, fetched_at
+
+    body = fetch(url)
+    _store(_connection(), key, body)
+    return body, None
+
+
+async def get_page_async(url, fetch):
+    """get_page() for an async fetch(url); stale pages refresh in a task."""
+    return (await get_page_dated_async(url, fetch))[0]
+
+
+async def get_page_dated_async(url, fetch):
+    """get_page_dated() for an async fetch(url).
+
+    SQLite calls block (on disk, or on another process's write lock), so
+    they run in worker threads rather than on the event loop.
+    """
+    if not settings.CRAWLER_CACHE_ENABLED:
+        return await fetch(url), None
+
+    key = normalize_url(url)
+    body, fetched_at, refresh = await asyncio.to_thread(_lookup, url, key)
+    if body is not None:
+        if refresh:
+            task = asyncio.create_task(_refresh_async(url, key, fetch))
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+        return body, fetched_at
+
+    body = await fetch(url)
+    await asyncio.to_thread(_store_page, key, body)
+    return body, None
+
+
+def cache_stats():
+    if not settings.CRAWLER_CACHE_ENABLED:
+        return {'enabled': False}
+    conn = _connection()
+    stats = {'enabled': True, 'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0}
+    stats.update(dict(conn.execute("SELECT name, value FROM counters")))
+    stats['entries'] = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+    return stats
+
+
+def clear_cache():
+    conn = _connection()
+    conn.execute("DELETE FROM pages")
+    conn.execute("DELETE FROM counters")
@@ -0,0 +1,280 @@
+from bs4 import BeautifulSoup
+import re
+from datetime import datetime
+
+# Fubon pages are ~50KB of menus, scripts and footers around one small
+# oMainTable. The fast path slices that table (and the t11 date div) out of
+# the raw HTML and only builds a tree for the slice; fast=False parses the
+# whole page, which is what the crawler used to do.
+
+STOCK_LINK_RE = re.compile(r"GenLink2stk\('([^']+)','([^']+)'\)")
+BROKER_LINK_RE = re.compile(r"GenLink2bkr\('([^']+)','([^']+)'\)")
+SLASH_DATE_RE = re.compile(r"(\d{4}/\d{1,2}/\d{1,2})")
+ROW_DATE_RE = re.compile(r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})")
+
+MAIN_TABLE_START_RE = re.compile(
+    r"""<table\b[^>]*?\bid\s*=\s*(?:"oMainTable"|'oMainTable'|oMainTable(?=[\s/>]))""", re.I)
+T11_DIV_START_RE = re.compile(
+    r"""<div\b[^>]*?\bclass\s*=\s*(?:"(?:[^"]*\s)?t11(?:\s[^"]*)?"|'(?:[^']*\s)?t11(?:\s[^']*)?'|t11(?=[\s/>]))""", re.I)
+TAG_BOUNDARY_RES = {
+    'table': re.compile(r"<(/?)table\b[^>]*>", re.I),
+    'div': re.compile(r"<(/?)div\b[^>]*>", re.I),
+}
+
+
+def _slice_element(html, start_re, tag):
+    """Return the outer HTML of the first element whose start tag matches start_re."""
+    match = start_re.search(html)
+    if not match:
+        return None
+
+    depth = 0
+    for boundary in TAG_BOUNDARY_RES[tag].finditer(html, match.start()):
+        depth += -1 if boundary.group(1) else 1
+        if depth == 0:
+            return html[match.start():boundary.end()]
+    # Unclosed element: like html.parser, let it run to the end of the page
+    return html[match.start():]
+
+
+def _fragment_find(html, start_re, tag, attrs):
+    fragment = _slice_element(html, start_re, tag)
+    if fragment is None:
+        return None
+    return BeautifulSoup(fragment, 'html.parser').find(tag, attrs)
+
+
+def _main_table(html, fast):
+    if fast:
+        return _fragment_find(html, MAIN_TABLE_START_RE, 'table', {'id': 'oMainTable'})
+    return BeautifulSoup(html, 'html.parser').find('table', {'id': 'oMainTable'})
+
+
+def _int(td):
+    return int(td.get_text().strip().replace(",", ""))
+
+
+def parse_top_buyers(html, record_type=1, link='', fast=True):
+    """Parse a zgb0 broker ranking page into (buy_data, date, sell_data)."""
+    table = _main_table(html, fast)
+    if not table:
+        return [], "", []
+
+    rows = table.find_all('tr')
+    try:
+        date_text = rows[0].find('div', class_='t11').get_text()
+        if '資料日期：' in date_text:
+            date = date_text.split('資料日期：')[1].strip()
+        else:
+            date = datetime.now().strftime("%Y-%m-%d")
+            print(
+                f"Warning: '資料日期：' not found in text: {date_text}. Using current date: {date}")
+    except (IndexError, AttributeError, ValueError) as e:
+        date = datetime.now().strftime("%Y-%m-%d")
+        print(
+            f"Error parsing date from table at {link}: {e}. Using current date: {date}")
+
+    def parse_table_side(side_table):
+        data_list = []
+        for row in side_table.find_all('tr')[2:]:
+            script_tag = row.find('td').script
+            if not script_tag:
+                continue
+            # GenLink2stk('AS2330','台積電');
+            match = STOCK_LINK_RE.search(script_tag.string.strip())
+            if not match:
+                continue
+            codes_raw, name_raw = match.groups()
+            code = codes_raw[2:6] if codes_raw.startswith('AS') else codes_raw
+
+            tds = row.find_all('td')
+            if len(tds) < 4:
+                continue
+
+            data_list.append({
+                'name': f"{code}{name_raw}",
+                'code': code,
+                'buy': _int(tds[1]),
+                'sell': _int(tds[2]),
+                'dif': _int(tds[3]),
+                'date': date,
+                'type': record_type
+            })
+        return data_list
+
+    side_tables = rows[2].find_all('table')
+    return parse_table_side(side_tables[0]), date, parse_table_side(side_tables[1])
+
+
+def parse_zco0_rows(html, fast=True):
+    """Yield (date_cell_text, tds) for every zco0 row with at least 4 cells."""
+    table = _main_table(html, fast)
+    if not table:
+        return
+    for row in table.find_all('tr'):
+        tds = row.find_all('td')
+        if len(tds) < 4:
+            continue
+        yield tds[0].get_text().strip(), tds
+
+
+def parse_zco0(html, target_date_str, fast=True):
+    """Pick the target date's buy/sell/net out of a zco0 broker x stock history page."""
+    # Target date formats to check (e.g. "2025-12-30" or "2025/12/30")
+    target_date_slash = target_date_str.replace('-', '/')
+
+    for date_cell_text, tds in parse_zco0_rows(html, fast):
+        if target_date_str in date_cell_text or target_date_slash in date_cell_text:
+            try:
+                # Fubon zco0 typically: Date, Buy, Sell, Net, ...
+                return {"buy": _int(tds[1]), "sell": _int(tds[2]), "net": _int(tds[3]), "date": target_date_str}
+            except (ValueError, IndexError) as e:
+                print(f"Error parsing zco0 row data: {e}")
+                continue
+
+    return {"buy": 0, "sell": 0, "net": 0, "date": target_date_str}
+
+
+def parse_zco0_history(html, fast=True):
+    """Every dated row of a zco0 page as {'date', 'buy', 'sell', 'net'}, newest first."""
+    history = []
+    for date_cell_text, tds in parse_zco0_rows(html, fast):
+        match = ROW_DATE_RE.search(date_cell_text)
+        if not match:
+            continue
+        try:
+            history.append({
+                "date": datetime(*map(int, match.groups())).date(),
+                "buy": _int(tds[1]),
+                "sell": _int(tds[2]),
+                "net": _int(tds[3]),
+            })
+        except ValueError:
+            continue
+    return history
+
+
+def _broker_row(name_td, buy_td, sell_td, net_td, percent_td, name):
+    script = name_td.find('script')
+    if script and script.string:
+        m = BROKER_LINK_RE.search(script.string)
+        if m:
+            name = m.group(2)
+
+    buy_val = _int(buy_td)
+    sell_val = _int(sell_td)
+    net_val = _int(net_td)
+    if buy_val == 0 and sell_val == 0 and net_val == 0:
+        return None
+
+    return {
+        "name": name,
+        "buy": buy_val,
+        "sell": sell_val,
+        "net": net_val,
+        "percent": percent_td.get_text().strip()
+    }
+
+
+def _parse_flat_side(name_td, buy_td, sell_td, net_td, percent_td):
+    name = name_td.get_text().strip()
+    if not name or "券商" in name:
+        return None
+    try:
+        return _broker_row(name_td, buy_td, sell_td, net_td, percent_td, name)
+    except (ValueError, IndexError):
+        return None
+
+
+def _parse_nested_table(t):
+    items = []
+    for r in t.find_all('tr'):
+        tds = r.find_all('td')
+        if len(tds) < 5:
+            continue
+
+        name = tds[0].get_text()
+        # Skip header rows
+        if "券商" in name or "買進" in tds[1].get_text():
+            continue
+
+        try:
+            item = _broker_row(tds[0], tds[1], tds[2], tds[3], tds[4], name.strip())
+        except Exception:
+            continue
+        if item:
+            items.append(item)
+    return items
+
+
+def parse_stock_main_force(html, date_str, fast=True):
+    """Parse a zco stock main force page into buy/sell broker lists."""
+    date = date_str
+    if fast:
+        date_div = _fragment_find(html, T11_DIV_START_RE, 'div', {'class': 't11'})
+        table = _main_table(html, fast)
+        soup = None
+    else:
+        soup = BeautifulSoup(html, 'html.parser')
+        date_div = soup.find('div', class_='t11')
+        table = soup.find('table', {'id': 'oMainTable'})
+
+    if date_div:
+        date_match = SLASH_DATE_RE.search(date_div.get_text())
+        if date_match:
+            date = date_match.group(1).replace('/', '-')
+
+    if not table:
+        # Fallback: find the first table with enough rows
+        if soup is None:
+            soup = BeautifulSoup(html, 'html.parser')
+        for t in soup.find_all('table'):
+            if len(t.find_all('tr')) > 10:
+                table = t
+                break
+
+    if not table:
+        return {"buy_list": [], "sell_list": [], "date": date}
+
+    buy_list = []
+    sell_list = []
+
+    for row in table.find_all('tr'):
+        tds = row.find_all('td')
+        # Check for the flat 10-column layout (5 columns for buy, 5 for sell)
+        if len(tds) != 10:
+            continue
+        # Skip rows that are clearly headers or footers
+        row_text = row.get_text()
+        if "合計" in row_text or "平均" in row_text or "買超券商" in row_text:
+            continue
+
+        # Left side: Buyers
+        buy_item = _parse_flat_side(*tds[0:5])
+        if buy_item:
+            buy_list.append(buy_item)
+
+        # Right side: Sellers
+        sell_item = _parse_flat_side(*tds[5:10])
+        if sell_item:
+            sell_list.append(sell_item)
+
+    # Fallback: if flat layout didn't yield results, try looking for nested tables
+    if not buy_list and not sell_list:
+        found_sub_tables = []
+        for st in table.find_all('table'):
+            header_text = st.get_text()
+            if "買進" in header_text and "賣出" in header_text and "買賣超" in header_text:
+                found_sub_tables.append(st)
+
+        if len(found_sub_tables) >= 2:
+            buy_list = _parse_nested_table(found_sub_tables[0])
+            sell_list = _parse_nested_table(found_sub_tables[1])
+        elif len(found_sub_tables) == 1:
+            buy_list = _parse_nested_table(found_sub_tables[0])
+
+    return {
+        "buy_list": buy_list,
+        "sell_list": sell_list,
+        "date": date
+    }
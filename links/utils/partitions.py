@@ -0,0 +1,94 @@
+import threading
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+
+# StockRecord's table; on Postgres it is range partitioned by month on `date`
+# (migration 0005), with a default partition catching anything not covered.
+TABLE = 'links_stockrecord'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_ensured = set()
+_lock = threading.Lock()
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def months_between(first, last):
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(month):
+    return f"{TABLE}_{month:%Y%m}"
+
+
+def is_partitioned(conn=None):
+    conn = conn or connection
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def create_month_partition(cursor, month):
+    """Create and attach one month's partition; returns False if it already exists.
+
+    Rows for that month that landed in the default partition are moved into
+    the new partition first, otherwise ATTACH would fail.
+    """
+    name = partition_name(month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    upper = next_month(month)
+    cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved", [month, upper])
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [month, upper])
+    return True
+
+
+def ensure_partitions(day=None, months_ahead=None):
+    """Make sure partitions exist from day's month through months_ahead after today.
+
+    A no-op on SQLite and on unpartitioned tables. Each month is checked at
+    most once per process.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    if months_ahead is None:
+        months_ahead = settings.STOCKRECORD_PARTITION_MONTHS_AHEAD
+    today = date.today()
+    last = today
+    for _ in range(months_ahead):
+        last = next_month(last)
+    first = min(day or today, today)
+    with _lock:
+        months = [m for m in months_between(first, last) if m not in _ensured]
+    if not months or not is_partitioned():
+        return []
+
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Serialize concurrent creators (scheduler run vs. backfill)
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [TABLE])
+        for month in months:
+            if create_month_partition(cursor, month):
+                created.append(partition_name(month))
+    with _lock:
+        _ensured.update(months)
+    return created
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+from django.conf import settings
+
+BACKOFF_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` saved up."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waited_total = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self, waited):
+        """Take a token if one is available (0), else the seconds until one is."""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.waited_total += waited
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self._take(waited)
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self):
+        """acquire() for the event loop: sleeps without blocking other tasks."""
+        waited = 0.0
+        while True:
+            delay = self._take(waited)
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight requests.
+
+    Every healthy response grows the limit by 1/limit (about +1 per round
+    trip of the whole window). A 429/5xx, a connection error or a response
+    slower than latency_target halves it, at most once per smoothed latency
+    so a burst of failures from one window only counts once.
+    """
+
+    def __init__(self, initial, minimum, maximum, latency_target):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.last_decrease = 0.0
+        self.successes = 0
+        self.backoffs = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def try_acquire(self):
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, poll=0.01):
+        # The limit is shared with worker threads, so poll instead of waiting
+        # on the condition
+        while not self.try_acquire():
+            await asyncio.sleep(poll)
+
+    def release(self, elapsed, congested):
+        with self.condition:
+            self.in_flight -= 1
+            if self.latency_ewma is None:
+                self.latency_ewma = elapsed
+            else:
+                self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * elapsed
+
+            now = time.monotonic()
+            if congested or elapsed > self.latency_target:
+                if now - self.last_decrease >= self.latency_ewma:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.last_decrease = now
+                    self.backoffs += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.successes += 1
+            self.condition.notify_all()
+
+
+class HostLimiter:
+    def __init__(self, host):
+        self.host = host
+        self.bucket = TokenBucket(settings.CRAWLER_RATE_LIMIT, settings.CRAWLER_RATE_BURST)
+        self.concurrency = AdaptiveConcurrency(
+            settings.CRAWLER_CONCURRENCY_INITIAL,
+            settings.CRAWLER_CONCURRENCY_MIN,
+            settings.CRAWLER_CONCURRENCY_MAX,
+            settings.CRAWLER_LATENCY_TARGET,
+        )
+
+    @contextmanager
+    def slot(self):
+        """Hold one request slot; the body reports the outcome through done().
+
+        If the body raises before calling done(), the request counts as
+        congested (timeouts, connection errors).
+        """
+        self.concurrency.acquire()
+        outcome = {}
+        started = time.monotonic()
+
+        def done(elapsed, congested):
+            outcome.update(elapsed=elapsed, congested=congested)
+
+        try:
+            self.bucket.acquire()
+            started = time.monotonic()
+            yield done
+        finally:
+            if not outcome:
+                outcome.update(elapsed=time.monotonic() - started, congested=True)
+            self.concurrency.release(outcome['elapsed'], outcome['congested'])
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """slot() for coroutines, sharing the same bucket and limit."""
+        await self.concurrency.acquire_async()
+        outcome = {}
+        started = time.monotonic()
+
+        def done(elapsed, congested):
+            outcome.update(elapsed=elapsed, congested=congested)
+
+        try:
+            await self.bucket.acquire_async()
+            started = time.monotonic()
+            yield done
+        finally:
+            if not outcome:
+                outcome.update(elapsed=time.monotonic() - started, congested=True)
+            self.concurrency.release(outcome['elapsed'], outcome['congested'])
+
+    def state(self):
+        concurrency = self.concurrency
+        return {
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "tokens": round(self.bucket.tokens, 2),
+            "throttled_seconds": round(self.bucket.waited_total, 3),
+            "concurrency_limit": round(concurrency.limit, 2),
+            "in_flight": concurrency.in_flight,
+            "latency_ewma_ms": round(concurrency.latency_ewma * 1000, 1) if concurrency.latency_ewma is not None else None,
+            "successes": concurrency.successes,
+            "backoffs": concurrency.backoffs,
+        }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(url):
+    host = urlsplit(url).netloc.lower()
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = HostLimiter(host)
+        return limiter
+
+
+def limiter_states():
+    with _limiters_lock:
+        return {host: limiter.state() for host, limiter in _limiters.items()}
+
+
+def reset_limiters():
+    with _limiters_lock:
+        _limiters.clear()
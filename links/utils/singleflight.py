@@ -0,0 +1,149 @@
+import asyncio
+import copy
+import hashlib
+import inspect
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from functools import wraps
+from django.conf import settings
+from links.utils.page_cache import normalize_url
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process coalescing only
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+@contextmanager
+def _process_lock(key):
+    """Exclusive lock file per key, so only one process fetches a URL at a time."""
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(settings.CRAWLER_LOCK_DIR, exist_ok=True)
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    path = os.path.join(settings.CRAWLER_LOCK_DIR, f"{name}.lock")
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def _process_lock_async(key):
+    """_process_lock() for coroutines; the blocking flock waits in a thread."""
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(settings.CRAWLER_LOCK_DIR, exist_ok=True)
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    path = os.path.join(settings.CRAWLER_LOCK_DIR, f"{name}.lock")
+    with open(path, 'a') as lock_file:
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def do(key, func):
+    """Run func once for all concurrent callers with the same key.
+
+    The first caller (the leader) runs func while holding the per-key lock
+    file; callers in the same process wait for it and share its result.
+    Every caller gets its own deep copy, so mutating the result is safe.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if leader:
+        try:
+            with _process_lock(key):
+                call.result = func()
+        except Exception as e:
+            call.error = e
+        finally:
+            with _calls_lock:
+                del _calls[key]
+            call.done.set()
+    else:
+        call.done.wait()
+
+    if call.error is not None:
+        raise call.error
+    return copy.deepcopy(call.result)
+
+
+_async_calls = {}
+
+
+async def do_async(key, func):
+    """do() for coroutines: concurrent tasks with the same key await one func()."""
+    loop = asyncio.get_running_loop()
+    future = _async_calls.get((loop, key))
+    if future is None:
+        future = _async_calls[(loop, key)] = loop.create_future()
+        try:
+            async with _process_lock_async(key):
+                future.set_result(await func())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            del _async_calls[(loop, key)]
+        # Mark the exception as retrieved even when nobody else was waiting
+        future.exception()
+
+    # Shielded so a cancelled follower doesn't cancel the shared call
+    result = await asyncio.shield(future)
+    return copy.deepcopy(result)
+
+
+def _call_key(func, signature, args, kwargs):
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    params = list(bound.arguments.items())
+    link = normalize_url(params[0][1])
+    return f"{func.__module__}.{func.__name__}:{link}:{params[1:]!r}"
+
+
+def single_flight(func):
+    """Decorator for fetchers whose first argument is the upstream URL.
+
+    Works on coroutine functions too; their calls are coalesced per event loop.
+    """
+    signature = inspect.signature(func)
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            key = _call_key(func, signature, args, kwargs)
+            return await do_async(key, lambda: func(*args, **kwargs))
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = _call_key(func, signature, args, kwargs)
+        return do(key, lambda: func(*args, **kwargs))
+    return wrapper
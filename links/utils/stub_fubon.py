@@ -0,0 +1,105 @@
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+TESTDATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'testdata')
+
+
+def page_for(url_path):
+    """Synthetic testdata page served for a Fubon path, or None for unknown pages."""
+    parts = urlsplit(url_path)
+    name = parts.path.rsplit('/', 1)[-1].split('.')[0].lower()
+    params = dict(parse_qsl(parts.query))
+    if name == 'zgb0':
+        return 'zgb0_daily.html' if params.get('d', '1') == '1' else 'zgb0_5days.html'
+    if name == 'zco0':
+        return 'zco0_history.html'
+    if name == 'zco':
+        return 'zco_flat.html'
+    return None
+
+
+class StubFubonServer:
+    """Local stand-in for fubon-ebrokerdj.fbs.com.tw serving the synthetic testdata pages.
+
+    Pages are Big5-encoded without a charset header, like the real site.
+    latency (seconds) is added to every response and error_rate is the
+    fraction of requests answered with a 503.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.pages = {}
+        for name in os.listdir(TESTDATA_DIR):
+            if name.endswith('.html'):
+                with open(os.path.join(TESTDATA_DIR, name), encoding='utf-8') as f:
+                    self.pages[name] = f.read().encode('big5')
+        self.request_count = 0
+        self.error_count = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.base_url = None
+
+    def _should_fail(self):
+        with self._lock:
+            self.request_count += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.error_count += 1
+            return failed
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                page = page_for(self.path)
+                if page is None:
+                    self._respond(404, b'not found')
+                elif stub._should_fail():
+                    self._respond(503, b'service unavailable')
+                else:
+                    self._respond(200, stub.pages[page])
+
+            def _respond(self, status_code, body):
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        host, port = self._server.server_address
+        self.base_url = f"http://{host}:{port}"
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
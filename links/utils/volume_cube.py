@@ -0,0 +1,229 @@
+import json
+import os
+from contextlib import contextmanager
+from datetime import date
+import numpy as np
+from django.conf import settings
+from links.models import StockRecord
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not serialized across processes
+    fcntl = None
+
+METRICS = {'net': 'net_volume', 'buy': 'buy_volume', 'sell': 'sell_volume'}
+DTYPE = np.int32
+
+
+class VolumeCube:
+    """Net/buy/sell volume by (trading date, broker, stock) in .npy memmaps.
+
+    Axis 0 is the trading date, so each new day is one contiguous slab. The
+    first allocation is sized from the data being written (reserve()); after
+    that an axis doubles when outgrown. Writes never touch the published
+    files: the first write copies the cube into a new generation, and
+    index.json is repointed to it only after the data is in place, so
+    readers never see a half-written cube.
+    """
+
+    def __init__(self, root, index, mode='r'):
+        self.root = root
+        self.generation = index['generation']
+        self.capacity = tuple(index['capacity'])
+        self.dates = [date.fromisoformat(d) for d in index['dates']]
+        self.broker_ids = list(index['brokers'])
+        self.stock_codes = list(index['stocks'])
+        self.broker_pos = {b: i for i, b in enumerate(self.broker_ids)}
+        self.stock_pos = {c: i for i, c in enumerate(self.stock_codes)}
+        self.date_pos = {d: i for i, d in enumerate(self.dates)}
+        self.arrays = {}
+        # Whether self.arrays are an unpublished generation this writer owns
+        self.unpublished = False
+        if self.generation:
+            self.arrays = {
+                metric: np.load(self._path(metric, self.generation), mmap_mode=mode)
+                for metric in METRICS
+            }
+
+    @classmethod
+    def load(cls, root=None, mode='r'):
+        root = root or str(settings.VOLUME_CUBE_DIR)
+        try:
+            with open(os.path.join(root, 'index.json'), encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {'generation': 0, 'capacity': [0, 0, 0], 'dates': [], 'brokers': [], 'stocks': []}
+        return cls(root, index, mode)
+
+    def _path(self, metric, generation):
+        return os.path.join(self.root, f"{metric}.{generation}.npy")
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.broker_ids), len(self.stock_codes)
+
+    def values(self, metric):
+        """Used part of a metric's cube, shape (dates, brokers, stocks); a view, not a copy."""
+        if not self.arrays:
+            return np.zeros(self.shape, dtype=DTYPE)
+        d, b, s = self.shape
+        return self.arrays[metric][:d, :b, :s]
+
+    def date_slice(self, start_date=None, end_date=None):
+        ordinals = np.array([d.toordinal() for d in self.dates], dtype=np.int64)
+        start = np.searchsorted(ordinals, start_date.toordinal(), 'left') if start_date else 0
+        end = np.searchsorted(ordinals, end_date.toordinal(), 'right') if end_date else len(ordinals)
+        return slice(int(start), int(end))
+
+    # Writing
+
+    def reserve(self, needed):
+        """Make room for (dates, brokers, stocks) up front, so a batch of
+        write_day() calls doesn't regrow the files day by day."""
+        self._ensure_capacity(tuple(max(n, m) for n, m in zip(needed, self.shape)))
+
+    def _ensure_capacity(self, needed):
+        if self.unpublished and all(n <= c for n, c in zip(needed, self.capacity)):
+            return
+        capacity = tuple(
+            max(n, 1, c * 2 if n > c else c)
+            for n, c in zip(needed, self.capacity))
+        generation = self.generation + 1
+        d, b, s = self.shape
+        arrays = {}
+        for metric in METRICS:
+            array = np.lib.format.open_memmap(
+                self._path(metric, generation), mode='w+', dtype=DTYPE, shape=capacity)
+            if self.arrays:
+                array[:d, :b, :s] = self.arrays[metric][:d, :b, :s]
+            arrays[metric] = array
+        self.arrays = arrays
+        self.capacity = capacity
+        self.generation = generation
+        self.unpublished = True
+
+    def write_day(self, day, broker_ids, stock_codes, columns):
+        """Replace one trading day's slab; columns maps metric -> sequence aligned with the ids."""
+        for broker_id in broker_ids:
+            if broker_id not in self.broker_pos:
+                self.broker_pos[broker_id] = len(self.broker_ids)
+                self.broker_ids.append(broker_id)
+        for code in stock_codes:
+            if code not in self.stock_pos:
+                self.stock_pos[code] = len(self.stock_codes)
+                self.stock_codes.append(code)
+        if day not in self.date_pos:
+            if self.dates and day < self.dates[-1]:
+                raise ValueError(f"{day} is before the last cube date {self.dates[-1]}; rebuild the cube")
+            self.date_pos[day] = len(self.dates)
+            self.dates.append(day)
+        self._ensure_capacity(self.shape)
+
+        d = self.date_pos[day]
+        b = np.fromiter((self.broker_pos[x] for x in broker_ids), dtype=np.intp, count=len(broker_ids))
+        s = np.fromiter((self.stock_pos[x] for x in stock_codes), dtype=np.intp, count=len(stock_codes))
+        for metric, array in self.arrays.items():
+            array[d] = 0
+            array[d, b, s] = columns[metric]
+
+    def commit(self):
+        """Flush the arrays, then publish the new index."""
+        for array in self.arrays.values():
+            array.flush()
+        index = {
+            'generation': self.generation,
+            'capacity': list(self.capacity),
+            'dates': [d.isoformat() for d in self.dates],
+            'brokers': self.broker_ids,
+            'stocks': self.stock_codes,
+        }
+        path = os.path.join(self.root, 'index.json')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+        self.unpublished = False
+        # Keep the generation just replaced: a reader may have read the old
+        # index.json and not opened its files yet. Processes that already
+        # mapped older files keep reading them after the unlink.
+        for name in os.listdir(self.root):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[0] in METRICS and parts[1].isdigit() and int(parts[1]) < self.generation - 1:
+                os.remove(os.path.join(self.root, name))
+
+
+@contextmanager
+def _writer_lock(root):
+    os.makedirs(root, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(root, 'write.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def update_cube(rebuild=False, root=None):
+    """Append StockRecord days newer than the cube, re-syncing its last day.
+
+    The last day is rewritten because the 23:00 fetch may correct it. If
+    older days appeared since (a backfill), the whole cube is rebuilt.
+    Returns the number of days written.
+    """
+    root = root or str(settings.VOLUME_CUBE_DIR)
+    with _writer_lock(root):
+        cube = VolumeCube.load(root, mode='r+')
+        records = StockRecord.objects.filter(record_type=1)
+        if not rebuild and cube.dates:
+            known = set(cube.dates)
+            older = records.filter(date__lt=cube.dates[-1]).values_list('date', flat=True).distinct()
+            rebuild = any(day not in known for day in older)
+        if rebuild:
+            generation = cube.generation
+            cube = VolumeCube(root, {
+                'generation': 0, 'capacity': [0, 0, 0], 'dates': [], 'brokers': [], 'stocks': []})
+            cube.generation = generation
+        elif cube.dates:
+            records = records.filter(date__gte=cube.dates[-1])
+
+        days = sorted(records.values_list('date', flat=True).distinct())
+        if days:
+            # Size the files from the data instead of a fixed guess; brokers
+            # and stocks already in the cube may overlap, so this can overshoot
+            cube.reserve((
+                len(cube.dates) + len(days),
+                len(cube.broker_ids) + records.values('broker_id').distinct().count(),
+                len(cube.stock_codes) + records.values('stock_code').distinct().count(),
+            ))
+        for day in days:
+            rows = list(records.filter(date=day).values_list(
+                'broker_id', 'stock_code', 'buy_volume', 'sell_volume', 'net_volume'))
+            if not rows:
+                continue
+            broker_ids, stock_codes, buy, sell, net = zip(*rows)
+            cube.write_day(day, broker_ids, stock_codes, {'buy': buy, 'sell': sell, 'net': net})
+        cube.commit()
+        return len(days)
+
+
+def rolling_sums(series, window):
+    """Trailing window sums along axis 0; the first window-1 rows sum what exists."""
+    totals = np.cumsum(series, axis=0, dtype=np.int64)
+    if window < len(totals):
+        totals[window:] = totals[window:] - totals[:-window].copy()
+    return totals
+
+
+def correlation_matrix(series):
+    """Pearson correlation between the columns of series (dates x brokers).
+
+    Constant columns (no activity) correlate as NaN.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    centered = series - series.mean(axis=0)
+    norms = np.sqrt((centered ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (centered.T @ centered) / np.outer(norms, norms)
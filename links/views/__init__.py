@@ -1,12 +1,19 @@
 from links.views.broker import (
     BrokerViewSet, LiveCrawlerView,
     StockMainForceCrawlerView, HistoryCrawlerView,
-    DatabaseLiveCrawlerView
+    DatabaseLiveCrawlerView, CrawlerStatusView
+)
+from links.views.stock_record import StockRecordStatsView, StockRecordExportView, StockRecordBulkView
+from links.views.analytics import RollingFlowView, BrokerCorrelationView, StockFlowView
+from links.views.async_crawler import (
+    AsyncLiveCrawlerView, AsyncStockMainForceCrawlerView, AsyncHistoryCrawlerView
 )
-from links.views.stock_record import StockRecordStatsView
 
 __all__ = [
     'BrokerViewSet', 'LiveCrawlerView',
     'StockMainForceCrawlerView', 'HistoryCrawlerView',
-    'StockRecordStatsView', 'DatabaseLiveCrawlerView'
+    'StockRecordStatsView', 'DatabaseLiveCrawlerView',
+    'CrawlerStatusView', 'RollingFlowView', 'BrokerCorrelationView',
+    'StockFlowView', 'StockRecordExportView', 'StockRecordBulkView',
+    'AsyncLiveCrawlerView', 'AsyncStockMainForceCrawlerView', 'AsyncHistoryCrawlerView'
 ]
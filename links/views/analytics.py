@@ -0,0 +1,129 @@
+import numpy as np
+from rest_framework import views, response, status
+from links.models import Broker
+from links.utils.db_routing import ReplicaReadMixin
+from links.utils.volume_cube import METRICS, VolumeCube, correlation_matrix, rolling_sums
+from datetime import datetime
+
+
+class CubeView(ReplicaReadMixin, views.APIView):
+    """Common parameters of the volume cube analytics endpoints.
+
+    start_date / end_date (YYYY-MM-DD) bound the trading days, metric is
+    net, buy or sell, and stock restricts the data to one stock code
+    (otherwise each broker's flow is summed over all stocks).
+    """
+
+    def parse(self, request):
+        params = request.query_params
+        try:
+            start_date, end_date = (
+                datetime.strptime(params[name], '%Y-%m-%d').date() if params.get(name) else None
+                for name in ('start_date', 'end_date'))
+        except ValueError:
+            raise ValueError("Invalid date format. Use YYYY-MM-DD")
+        metric = params.get('metric', 'net')
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+
+        cube = VolumeCube.load()
+        stock = params.get('stock', '').strip()
+        if stock and stock not in cube.stock_pos:
+            raise LookupError(f"No data for stock {stock}")
+        return cube, cube.date_slice(start_date, end_date), metric, stock
+
+    def broker_series(self, cube, metric, stock, dates, lead=0):
+        """(dates, brokers) flow over the dates slice plus up to `lead` days
+        before it, as a memmap view when stock is given.
+
+        Returns (series, offset): row offset of series is the slice's first day.
+        """
+        start = max(dates.start - lead, 0)
+        # An end date before the start date selects no days
+        values = cube.values(metric)[start:max(dates.start, dates.stop)]
+        if stock:
+            return values[:, :, cube.stock_pos[stock]], dates.start - start
+        return values.sum(axis=2, dtype=np.int64), dates.start - start
+
+    def broker_names(self, cube):
+        names = dict(Broker.objects.filter(id__in=cube.broker_ids).values_list('id', 'name'))
+        return [names.get(broker_id, str(broker_id)) for broker_id in cube.broker_ids]
+
+    def get(self, request):
+        try:
+            cube, dates, metric, stock = self.parse(request)
+        except ValueError as e:
+            return response.Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except LookupError as e:
+            return response.Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        payload = self.analyze(request, cube, dates, metric, stock)
+        if isinstance(payload, response.Response):
+            return payload
+        return response.Response({
+            "metric": metric,
+            "stock": stock or None,
+            "dates": [d.isoformat() for d in cube.dates[dates]],
+            **payload,
+        })
+
+
+class RollingFlowView(CubeView):
+    """Trailing `window`-day sums of each broker's flow."""
+
+    def analyze(self, request, cube, dates, metric, stock):
+        try:
+            window = int(request.query_params.get('window', 5))
+            if window < 1:
+                raise ValueError
+        except ValueError:
+            return response.Response({"error": "window must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Rolled from window - 1 days before the range so its first days
+        # see the days before it
+        series, offset = self.broker_series(cube, metric, stock, dates, lead=window - 1)
+        sums = rolling_sums(series, window)[offset:]
+        names = self.broker_names(cube)
+        return {
+            "window": window,
+            "series": [
+                {"broker_name": names[i], "values": sums[:, i].tolist()}
+                for i in range(len(names))
+            ],
+        }
+
+
+class BrokerCorrelationView(CubeView):
+    """Correlation matrix of the brokers' daily flow."""
+
+    def analyze(self, request, cube, dates, metric, stock):
+        series, _ = self.broker_series(cube, metric, stock, dates)
+        matrix = correlation_matrix(series)
+        names = self.broker_names(cube)
+        return {
+            "brokers": names,
+            "matrix": [
+                [None if np.isnan(value) else round(float(value), 4) for value in row]
+                for row in matrix
+            ],
+        }
+
+
+class StockFlowView(CubeView):
+    """One stock's daily and cumulative flow for each broker that traded it."""
+
+    def analyze(self, request, cube, dates, metric, stock):
+        if not stock:
+            return response.Response({"error": "stock is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        daily = np.asarray(self.broker_series(cube, metric, stock, dates)[0], dtype=np.int64)
+        cumulative = np.cumsum(daily, axis=0)
+        active = np.flatnonzero(np.abs(daily).sum(axis=0))
+        names = self.broker_names(cube)
+        total = daily.sum(axis=1)
+        return {
+            "series": [
+                {"broker_name": names[i], "daily": daily[:, i].tolist(), "cumulative": cumulative[:, i].tolist()}
+                for i in active
+            ],
+            "total": {"daily": total.tolist(), "cumulative": np.cumsum(total).tolist()},
+        }
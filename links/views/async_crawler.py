@@ -0,0 +1,162 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from links.models import Broker
+from links.utils import async_crawler
+from links.utils.crawler import find_previous_workdays_range, generate_fubon_detail_link, get_stored_history
+from links.utils.db_routing import ReplicaReadMixin
+from links.utils.http_client import CrawlerFetchError
+from links.views.broker import (
+    STREAM_FORMATS, broker_event, history_params, history_payload, live_broker_result, live_crawler_payload,
+    stream_event, streaming_crawl_response, total_stats
+)
+from datetime import datetime
+
+# Native async versions of the crawler views, served under /crawler/async/.
+# Under an ASGI server (see the Dockerfile) a request waiting on Fubon only
+# holds a coroutine, so one worker process serves many crawls at once. The
+# responses are the same as those of the sync views.
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+async def crawl_live_broker(broker, number, errors=None):
+    """Coroutine version of views.broker.crawl_live_broker."""
+    if errors is None:
+        errors = []
+
+    try:
+        buy_data, date, sell_data = await async_crawler.get_merged_data(
+            broker.fbs_a, broker.fbs_b, broker.name)
+    except Exception as e:
+        print(f"Error crawling daily data for {broker.name}: {e}")
+        errors.append(f"Error crawling daily data: {e}")
+        buy_data, date, sell_data = [], "Error", []
+
+    specific_data = None
+    if number and date != "Error":
+        try:
+            specific_data = await async_crawler.get_main_force_merged_data(
+                number, broker.fbs_a, broker.fbs_b, date, broker=broker)
+            if specific_data is None:
+                errors.append(f"Could not fetch stats for {number}")
+        except Exception as e:
+            print(
+                f"Error fetching specific stats for {number} at {broker.name}: {e}")
+            errors.append(f"Error fetching stats for {number}: {e}")
+
+    return live_broker_result(broker, number, buy_data, date, sell_data, specific_data)
+
+
+async def iter_live_crawl(brokers, number, output):
+    """Async views.broker.iter_live_crawl: the same events, from coroutines."""
+    yield stream_event(output, 'start', {
+        "stock_number": number,
+        "brokers": [broker.name for broker in brokers],
+    })
+
+    errors = [[] for _ in brokers]
+
+    async def crawl(index):
+        try:
+            return index, await crawl_live_broker(brokers[index], number, errors[index]), None
+        except Exception as e:
+            return index, None, e
+
+    tasks = [asyncio.ensure_future(crawl(index)) for index in range(len(brokers))]
+    specific_data = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, outcome, error = await next_done
+            event, data = broker_event(index, brokers[index], outcome, errors[index], error)
+            specific_data.append(data)
+            yield stream_event(output, 'broker', event)
+    finally:
+        # The client went away: stop crawling for it
+        for task in tasks:
+            task.cancel()
+
+    yield stream_event(output, 'total_stats', {
+        "stock_number": number,
+        "total_stats": total_stats(number, specific_data),
+    })
+
+
+class AsyncLiveCrawlerView(ReplicaReadMixin, View):
+    async def get(self, request):
+        number = request.GET.get('number', '').strip()
+        output = request.GET.get('stream')
+        if output and output not in STREAM_FORMATS:
+            return json_response({"error": f"stream must be one of {', '.join(STREAM_FORMATS)}"}, status=400)
+        brokers = [broker async for broker in Broker.objects.order_by('id')]
+        if not brokers:
+            return json_response({"error": "No brokers found in database"}, status=404)
+        if output:
+            return streaming_crawl_response(output, iter_live_crawl(brokers, number, output))
+
+        # Every broker is crawled concurrently; the upstream concurrency is
+        # bounded by the per-host rate limiter, not by a thread pool
+        crawled = await asyncio.gather(*(crawl_live_broker(broker, number) for broker in brokers))
+        return json_response(live_crawler_payload(number, crawled))
+
+
+class AsyncStockMainForceCrawlerView(ReplicaReadMixin, View):
+    async def get(self, request):
+        number = request.GET.get('number', '').strip()
+        if not number:
+            return json_response({"error": "Stock number is required"}, status=400)
+
+        date_str = request.GET.get('date', datetime.now().strftime("%Y-%m-%d"))
+
+        try:
+            data = await async_crawler.get_stock_main_force_data(number, date_str)
+            if not data:
+                return json_response({"error": "Failed to fetch stock main force data"}, status=500)
+
+            return json_response({
+                "stock_number": number,
+                "date": data["date"],
+                "buy_list": data["buy_list"],
+                "sell_list": data["sell_list"]
+            })
+        except Exception as e:
+            print(f"Error in AsyncStockMainForceCrawlerView: {e}")
+            return json_response({"error": str(e)}, status=500)
+
+
+class AsyncHistoryCrawlerView(ReplicaReadMixin, View):
+    async def get(self, request):
+        a = request.GET.get('a')
+        b = request.GET.get('b')
+        name = request.GET.get('name', 'Unknown')
+        mark = request.GET.get('mark', '')
+
+        try:
+            days, source = history_params(request.GET)
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+
+        stored = None
+        if source != 'live':
+            broker = await Broker.objects.filter(fbs_a=a, fbs_b=b).afirst()
+            if broker:
+                stored = await sync_to_async(get_stored_history)(broker, days)
+        if stored is None and source == 'db':
+            return json_response({"error": f"Stored records do not cover the last {days} trading days"}, status=404)
+
+        if stored:
+            buy_data, date, sell_data, date_range = stored
+        else:
+            link = generate_fubon_detail_link(a, b, days)
+            try:
+                buy_data, date, sell_data = await async_crawler.fetch_top_buyers(link)
+            except CrawlerFetchError as e:
+                print(f"Error in AsyncHistoryCrawlerView: {e}")
+                return json_response({"error": str(e)}, status=502)
+            date_range = find_previous_workdays_range(date, days)
+
+        return json_response(history_payload(
+            name, mark, days, buy_data, date, sell_data, date_range, stored is not None))
@@ -1,94 +1,208 @@
+import json
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, views, response, status
 from links.models import Broker, StockRecord
 from links.serializers import BrokerSerializer
 from links.utils.crawler import (
     generate_fubon_link, generate_fubon_detail_link, generate_histock_link,
     fetch_top_buyers, get_merged_data, find_previous_workdays_range,
-    get_main_force_merged_data, fetch_stock_main_force_data
+    get_main_force_merged_data, get_stock_main_force_data, broker_thresholds,
+    get_stored_history
 )
+from links.utils.concurrency import iter_concurrently, run_concurrently, streaming_content
+from links.utils.data_version import DataVersionMixin
+from links.utils.db_routing import ReplicaReadMixin, connection_stats
+from links.utils.http_client import CrawlerFetchError
+from links.utils.page_cache import cache_stats
+from links.utils.rate_limit import limiter_states
 from datetime import datetime
 
 
-class BrokerViewSet(viewsets.ReadOnlyModelViewSet):
+class BrokerViewSet(ReplicaReadMixin, DataVersionMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Broker.objects.all()
     serializer_class = BrokerSerializer
 
 
-class LiveCrawlerView(views.APIView):
-    def get(self, request):
-        number = request.query_params.get('number', '').strip()
-        brokers = Broker.objects.all()
-        if not brokers.exists():
-            return response.Response({"error": "No brokers found in database"}, status=status.HTTP_404_NOT_FOUND)
+def crawl_live_broker(broker, number, errors=None):
+    """Crawl one broker's daily ranking and, if requested, its stats for one stock.
 
-        results = []
-        total_buy = 0
-        total_sell = 0
-        total_net = 0
+    Returns the broker's ``brokers_data`` entry and the raw zco0 data (or None).
+    Failures are logged and, when an errors list is given, appended to it.
+    """
+    if errors is None:
+        errors = []
 
-        for broker in brokers:
-            fubon_link = generate_fubon_link(
-                number, broker.fbs_a, broker.fbs_b) if number else ""
-            fubon_detail_ranking = generate_fubon_detail_link(
-                broker.fbs_a, broker.fbs_b)
-            histock_link = generate_histock_link(
-                number, broker.stock_bno) if number else ""
+    # 1. Fetch daily top data first to get the current trading date
+    try:
+        buy_data, date, sell_data = get_merged_data(
+            broker.fbs_a, broker.fbs_b, broker.name)
+    except Exception as e:
+        print(f"Error crawling daily data for {broker.name}: {e}")
+        errors.append(f"Error crawling daily data: {e}")
+        buy_data, date, sell_data = [], "Error", []
 
-            # 1. Fetch daily top data first to get the current trading date
-            try:
-                buy_data, date, sell_data = get_merged_data(
-                    broker.fbs_a, broker.fbs_b, broker.name)
-            except Exception as e:
-                print(f"Error crawling daily data for {broker.name}: {e}")
-                buy_data, date, sell_data = [], "Error", []
+    # 2. Fetch specific stats for the searched stock number using the same date
+    specific_data = None
+    if number and date != "Error":
+        try:
+            # Fetch from zco0 and filter by the identified date
+            specific_data = get_main_force_merged_data(
+                number, broker.fbs_a, broker.fbs_b, date, broker=broker)
+            if specific_data is None:
+                errors.append(f"Could not fetch stats for {number}")
+        except Exception as e:
+            print(
+                f"Error fetching specific stats for {number} at {broker.name}: {e}")
+            errors.append(f"Error fetching stats for {number}: {e}")
+
+    return live_broker_result(broker, number, buy_data, date, sell_data, specific_data)
+
+
+def live_broker_result(broker, number, buy_data, date, sell_data, specific_data):
+    """(brokers_data entry, zco0 data or None) of one crawled broker."""
+    fubon_link = generate_fubon_link(
+        number, broker.fbs_a, broker.fbs_b) if number else ""
+    fubon_detail_ranking = generate_fubon_detail_link(
+        broker.fbs_a, broker.fbs_b)
+    histock_link = generate_histock_link(
+        number, broker.stock_bno) if number else ""
+
+    specific_stats = None
+    if specific_data:
+        net_val = specific_data.get('net', 0)
+        specific_stats = {
+            "buy": specific_data.get('buy', 0),
+            "sell": specific_data.get('sell', 0),
+            "net": f"+{net_val}" if net_val > 0 else str(net_val)
+        }
 
-            # 2. Fetch specific stats for the searched stock number using the same date
-            specific_stats = None
-            if number and date != "Error":
-                try:
-                    # Fetch from zco0 and filter by the identified date
-                    data = get_main_force_merged_data(
-                        number, broker.fbs_a, broker.fbs_b, date)
-                    if data:
-                        net_val = data.get('net', 0)
-                        specific_stats = {
-                            "buy": data.get('buy', 0),
-                            "sell": data.get('sell', 0),
-                            "net": f"+{net_val}" if net_val > 0 else str(net_val)
-                        }
-                        total_buy += data.get('buy', 0)
-                        total_sell += data.get('sell', 0)
-                        total_net += net_val
-                except Exception as e:
-                    print(
-                        f"Error fetching specific stats for {number} at {broker.name}: {e}")
+    result = {
+        "broker_name": broker.name,
+        "fubon_link": fubon_link,
+        "fubon_ranking_link": fubon_detail_ranking,
+        "histock_link": histock_link,
+        "buy_data": buy_data,
+        "sell_data": sell_data,
+        "specific_stats": specific_stats,
+        "date": date,
+        "stock_bno": broker.stock_bno,
+        "fbs_a": broker.fbs_a,
+        "fbs_b": broker.fbs_b
+    }
+    return result, specific_data
+
+
+def total_stats(number, specific_data):
+    """total_stats of the searched stock summed over the brokers' zco0 data."""
+    if not number:
+        return None
+    total_buy = 0
+    total_sell = 0
+    total_net = 0
+    for data in specific_data:
+        if data:
+            total_buy += data.get('buy', 0)
+            total_sell += data.get('sell', 0)
+            total_net += data.get('net', 0)
+    return {
+        "buy": total_buy,
+        "sell": total_sell,
+        "net": f"+{total_net}" if total_net > 0 else str(total_net)
+    }
+
+
+def live_crawler_payload(number, crawled):
+    """LiveCrawlerView's response body from crawl_live_broker results in broker order."""
+    return {
+        "stock_number": number,
+        "brokers_data": [result for result, data in crawled],
+        "total_stats": total_stats(number, [data for result, data in crawled]),
+    }
+
+
+STREAM_FORMATS = ('ndjson', 'sse')
+
+
+def stream_event(output, event, data):
+    """One event of a streamed crawl: an NDJSON line or a Server-Sent Event."""
+    if output == 'sse':
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return json.dumps({"event": event, **data}, ensure_ascii=False) + "\n"
+
+
+def streaming_crawl_response(output, events):
+    content_type = 'text/event-stream; charset=utf-8' if output == 'sse' else 'application/x-ndjson; charset=utf-8'
+    stream = StreamingHttpResponse(events, content_type=content_type)
+    stream['Cache-Control'] = 'no-cache'
+    # Don't let nginx hold the events back
+    stream['X-Accel-Buffering'] = 'no'
+    return stream
+
+
+def broker_event(index, broker, outcome, errors, error=None):
+    """The "broker" event of one finished crawl; error is an exception that escaped it."""
+    result, data = outcome if error is None else (None, None)
+    if error is not None:
+        print(f"Error crawling {broker.name}: {error}")
+        errors = errors + [str(error)]
+    return {"index": index, "broker_name": broker.name, "result": result, "errors": errors}, data
+
+
+def iter_live_crawl(brokers, number, output):
+    """Stream LiveCrawlerView: "start", one "broker" event per broker as soon as
+    it finishes (in completion order, with its index), then "total_stats".
+    """
+    yield stream_event(output, 'start', {
+        "stock_number": number,
+        "brokers": [broker.name for broker in brokers],
+    })
+
+    errors = [[] for _ in brokers]
+    specific_data = []
+    crawled = iter_concurrently(
+        lambda i: crawl_live_broker(brokers[i], number, errors[i]), range(len(brokers)))
+    for index, outcome, error in crawled:
+        event, data = broker_event(index, brokers[index], outcome, errors[index], error)
+        specific_data.append(data)
+        yield stream_event(output, 'broker', event)
+
+    yield stream_event(output, 'total_stats', {
+        "stock_number": number,
+        "total_stats": total_stats(number, specific_data),
+    })
+
+
+class LiveCrawlerView(ReplicaReadMixin, views.APIView):
+    """Crawl every broker live.
+
+    stream=ndjson or stream=sse sends each broker's result as soon as its
+    crawl finishes instead of one response at the end (see iter_live_crawl).
+    """
 
-            results.append({
-                "broker_name": broker.name,
-                "fubon_link": fubon_link,
-                "fubon_ranking_link": fubon_detail_ranking,
-                "histock_link": histock_link,
-                "buy_data": buy_data,
-                "sell_data": sell_data,
-                "specific_stats": specific_stats,
-                "date": date,
-                "stock_bno": broker.stock_bno,
-                "fbs_a": broker.fbs_a,
-                "fbs_b": broker.fbs_b
-            })
+    def get(self, request):
+        number = request.query_params.get('number', '').strip()
+        output = request.query_params.get('stream')
+        if output and output not in STREAM_FORMATS:
+            return response.Response({"error": f"stream must be one of {', '.join(STREAM_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        brokers = list(Broker.objects.order_by('id'))
+        if not brokers:
+            return response.Response({"error": "No brokers found in database"}, status=status.HTTP_404_NOT_FOUND)
+        if output:
+            return streaming_crawl_response(
+                output, streaming_content(request, iter_live_crawl(brokers, number, output)))
 
-        return response.Response({
-            "stock_number": number,
-            "brokers_data": results,
-            "total_stats": {
-                "buy": total_buy,
-                "sell": total_sell,
-                "net": f"+{total_net}" if total_net > 0 else str(total_net)
-            } if number else None
-        })
+        # Every broker's zgb0 -> zco0 chain runs in its own worker; results
+        # come back in broker order so the response matches the serial crawl.
+        crawled = run_concurrently(
+            lambda broker: crawl_live_broker(broker, number), brokers)
+        return response.Response(live_crawler_payload(number, crawled))
 
 
-class DatabaseLiveCrawlerView(views.APIView):
+class DatabaseLiveCrawlerView(ReplicaReadMixin, DataVersionMixin, views.APIView):
+    def data_date(self, request):
+        # Without a date the view shows today, which changes at midnight
+        return None if request.GET.get('date') else datetime.now().date()
+
     def get(self, request):
         number = request.query_params.get('number', '').strip()
         date_str = request.query_params.get(
@@ -99,20 +213,42 @@ class DatabaseLiveCrawlerView(views.APIView):
         except ValueError:
             return response.Response({"error": "Invalid date format. Use YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
 
-        brokers = Broker.objects.all()
-        if not brokers.exists():
+        brokers = list(Broker.objects.order_by('id'))
+        if not brokers:
             return response.Response({"error": "No brokers found in database"}, status=status.HTTP_404_NOT_FOUND)
 
+        # One query for the whole day, highest net first; everything else is
+        # a single pass over the rows in memory
+        records = StockRecord.objects.filter(date=target_date).order_by('-net_volume').values_list(
+            'broker_id', 'stock_code', 'stock_name', 'buy_volume', 'sell_volume', 'net_volume')
+
+        thresholds = {broker.id: broker_thresholds(broker.name) for broker in brokers}
+        buy_data = {broker.id: [] for broker in brokers}
+        sell_data = {broker.id: [] for broker in brokers}
+        specific = {}
+        for broker_id, code, name, buy, sell, net in records:
+            buy_threshold, sell_threshold = thresholds[broker_id]
+            if net >= buy_threshold or net <= sell_threshold or code == number:
+                item = {
+                    'name': name,
+                    'code': code,
+                    'buy': buy,
+                    'sell': sell,
+                    'dif': net,
+                    'date': str(target_date)
+                }
+                if net >= buy_threshold:
+                    buy_data[broker_id].append(item)
+                if net <= sell_threshold:
+                    sell_data[broker_id].append(item)
+                if code == number and broker_id not in specific:
+                    specific[broker_id] = item
+
         results = []
         total_buy = 0
         total_sell = 0
         total_net = 0
 
-        BROKER_CONDITIONS = {
-            "港商麥格理": {"buy_threshold": 300, "sell_threshold": -300},
-            "default": {"buy_threshold": 60, "sell_threshold": -60},
-        }
-
         for broker in brokers:
             fubon_link = generate_fubon_link(
                 number, broker.fbs_a, broker.fbs_b) if number else ""
@@ -121,58 +257,28 @@ class DatabaseLiveCrawlerView(views.APIView):
             histock_link = generate_histock_link(
                 number, broker.stock_bno) if number else ""
 
-            # Fetch records from DB
-            records = StockRecord.objects.filter(
-                broker=broker, date=target_date)
-
-            thresholds = BROKER_CONDITIONS.get(
-                broker.name, BROKER_CONDITIONS["default"])
-
-            buy_records = records.filter(
-                net_volume__gte=thresholds["buy_threshold"]).order_by('-net_volume')
-            sell_records = records.filter(
-                net_volume__lte=thresholds["sell_threshold"]).order_by('net_volume')
-
-            buy_data = [{
-                'name': r.stock_name,
-                'code': r.stock_code,
-                'buy': r.buy_volume,
-                'sell': r.sell_volume,
-                'dif': r.net_volume,
-                'date': str(r.date)
-            } for r in buy_records]
-
-            sell_data = [{
-                'name': r.stock_name,
-                'code': r.stock_code,
-                'buy': r.buy_volume,
-                'sell': r.sell_volume,
-                'dif': r.net_volume,
-                'date': str(r.date)
-            } for r in sell_records]
-
             # Specific stats for searched stock
             specific_stats = None
-            if number:
-                specific_record = records.filter(stock_code=number).first()
-                if specific_record:
-                    net_val = specific_record.net_volume
-                    specific_stats = {
-                        "buy": specific_record.buy_volume,
-                        "sell": specific_record.sell_volume,
-                        "net": f"+{net_val}" if net_val > 0 else str(net_val)
-                    }
-                    total_buy += specific_record.buy_volume
-                    total_sell += specific_record.sell_volume
-                    total_net += net_val
+            specific_record = specific.get(broker.id)
+            if specific_record:
+                net_val = specific_record['dif']
+                specific_stats = {
+                    "buy": specific_record['buy'],
+                    "sell": specific_record['sell'],
+                    "net": f"+{net_val}" if net_val > 0 else str(net_val)
+                }
+                total_buy += specific_record['buy']
+                total_sell += specific_record['sell']
+                total_net += net_val
 
             results.append({
                 "broker_name": broker.name,
                 "fubon_link": fubon_link,
                 "fubon_ranking_link": fubon_detail_ranking,
                 "histock_link": histock_link,
-                "buy_data": buy_data,
-                "sell_data": sell_data,
+                "buy_data": buy_data[broker.id],
+                # Rows arrive highest net first; sell lists are most sold first
+                "sell_data": sell_data[broker.id][::-1],
                 "specific_stats": specific_stats,
                 "date": date_str,
                 "stock_bno": broker.stock_bno,
@@ -192,7 +298,7 @@ class DatabaseLiveCrawlerView(views.APIView):
         })
 
 
-class StockMainForceCrawlerView(views.APIView):
+class StockMainForceCrawlerView(ReplicaReadMixin, views.APIView):
     def get(self, request):
         number = request.query_params.get('number', '').strip()
         if not number:
@@ -203,7 +309,9 @@ class StockMainForceCrawlerView(views.APIView):
             'date', datetime.now().strftime("%Y-%m-%d"))
 
         try:
-            data = fetch_stock_main_force_data(number, date_str)
+            # Finished trading days are answered from StockMainForce; today and
+            # days not stored yet are crawled (and stored)
+            data = get_stock_main_force_data(number, date_str)
             if not data:
                 return response.Response({"error": "Failed to fetch stock main force data"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -218,33 +326,92 @@ class StockMainForceCrawlerView(views.APIView):
             return response.Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class HistoryCrawlerView(views.APIView):
+HISTORY_SOURCES = ('live', 'auto', 'db')
+
+
+def history_params(params):
+    """(days, source) of a history request; ValueError for a bad value.
+
+    source: auto (default) serves the window summed from stored daily records
+    when they cover it, else crawls; live always crawls; db only serves
+    stored records. Responses say which one they came from in is_from_db.
+    """
+    try:
+        days = int(params.get('days', 5))
+    except ValueError:
+        days = 5
+    if days < 1:
+        raise ValueError("days must be at least 1")
+
+    source = params.get('source', 'auto')
+    if source not in HISTORY_SOURCES:
+        raise ValueError(f"source must be one of {', '.join(HISTORY_SOURCES)}")
+    return days, source
+
+
+class HistoryCrawlerView(ReplicaReadMixin, views.APIView):
     def get(self, request):
         a = request.query_params.get('a')
         b = request.query_params.get('b')
-        days = request.query_params.get('days', 5)
         name = request.query_params.get('name', 'Unknown')
         mark = request.query_params.get('mark', '')
 
         try:
-            days = int(days)
-        except ValueError:
-            days = 5
-
-        link = generate_fubon_detail_link(a, b, days)
-        buy_data, date, sell_data = fetch_top_buyers(link)
-        date_range = find_previous_workdays_range(date, days)
-
-        for item in buy_data:
-            item['histock_link'] = generate_histock_link(item['code'], mark)
-        for item in sell_data:
-            item['histock_link'] = generate_histock_link(item['code'], mark)
-
+            days, source = history_params(request.query_params)
+        except ValueError as e:
+            return response.Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        stored = None
+        if source != 'live':
+            broker = Broker.objects.filter(fbs_a=a, fbs_b=b).first()
+            if broker:
+                stored = get_stored_history(broker, days)
+        if stored is None and source == 'db':
+            return response.Response({"error": f"Stored records do not cover the last {days} trading days"}, status=status.HTTP_404_NOT_FOUND)
+
+        if stored:
+            buy_data, date, sell_data, date_range = stored
+        else:
+            link = generate_fubon_detail_link(a, b, days)
+            try:
+                buy_data, date, sell_data = fetch_top_buyers(link)
+            except CrawlerFetchError as e:
+                print(f"Error in HistoryCrawlerView: {e}")
+                return response.Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+            date_range = find_previous_workdays_range(date, days)
+
+        return response.Response(history_payload(
+            name, mark, days, buy_data, date, sell_data, date_range, stored is not None))
+
+
+def history_payload(name, mark, days, buy_data, date, sell_data, date_range, is_from_db):
+    """HistoryCrawlerView's response body, with histock links added to every item.
+
+    Stored windows only sum the rows kept for each day (that day's top-N of
+    the broker), so stocks outside a day's ranking count as zero for it;
+    the note says so.
+    """
+    for item in buy_data:
+        item['histock_link'] = generate_histock_link(item['code'], mark)
+    for item in sell_data:
+        item['histock_link'] = generate_histock_link(item['code'], mark)
+
+    return {
+        "broker_name": name,
+        "date": date,
+        "date_range": date_range,
+        "buy_data": buy_data,
+        "sell_data": sell_data,
+        "days": days,
+        "is_from_db": is_from_db,
+        "note": "Summed from each day's stored top-ranked rows only" if is_from_db else None
+    }
+
+
+class CrawlerStatusView(views.APIView):
+    def get(self, request):
         return response.Response({
-            "broker_name": name,
-            "date": date,
-            "date_range": date_range,
-            "buy_data": buy_data,
-            "sell_data": sell_data,
-            "days": days
+            "page_cache": cache_stats(),
+            "rate_limiters": limiter_states(),
+            "database": connection_stats(),
         })
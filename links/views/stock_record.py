@@ -1,21 +1,209 @@
+import base64
+import json
+from collections.abc import Iterator
 from rest_framework import views, response, status
-from django.db.models import Sum
-from links.models import StockRecord
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.urls import replace_query_param
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Q, Sum
+from links.models import StockDailyAggregate, StockRecord
 from links.serializers import StockRecordSerializer
+from links.utils.aggregates import refresh_daily_aggregates
+from links.utils.concurrency import streaming_content
+from links.utils.bulk_ingest import ingest_rows, iter_ndjson
+from links.utils.data_version import DataVersionMixin, bump_data_version
+from links.utils.db_routing import ReplicaReadMixin
+from links.utils.export import export_stream
+from datetime import datetime
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def int_param(params, name, minimum=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+
+def date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD")
+
+
+def broker_ids_param(params):
+    try:
+        return [int(b) for b in params.get('brokers', '').split(',') if b.strip()]
+    except ValueError:
+        raise ValueError("brokers must be comma separated broker ids")
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['total_net'], row['stock_code'], row['stock_name']], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(total_net, stock_code, stock_name) of the last row of the previous page; raises ValueError."""
+    try:
+        net, code, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return int(net), str(code), str(name)
+
+
+class StockRecordStatsView(ReplicaReadMixin, DataVersionMixin, views.APIView):
+    """Per-stock buy/sell/net totals, highest net first.
+
+    Query params: start_date, end_date (YYYY-MM-DD), brokers (comma separated
+    ids), record_type, min_net (minimum absolute total net). The response is
+    a list of every matching row, or just the N highest with top=N. Passing
+    page_size or cursor switches to keyset pages, {"next", "results"}, where
+    `next` carries the opaque cursor. Each page still groups the whole
+    filtered range, since the cursor compares the summed total_net.
+    """
+
+    def get_stats(self, params):
+        start_date = date_param(params, 'start_date')
+        end_date = date_param(params, 'end_date')
+        record_type = int_param(params, 'record_type')
+        min_net = int_param(params, 'min_net', minimum=0)
+        brokers = broker_ids_param(params)
+
+        if brokers:
+            # Per-broker totals only exist in the raw rows
+            rows = StockRecord.objects.filter(broker__in=brokers)
+            sums = dict(total_buy=Sum('buy_volume'), total_sell=Sum('sell_volume'), total_net=Sum('net_volume'))
+        else:
+            # Summed from the per-day aggregates instead of every broker's raw rows
+            rows = StockDailyAggregate.objects.all()
+            sums = dict(total_buy=Sum('total_buy'), total_sell=Sum('total_sell'), total_net=Sum('total_net'))
+        if start_date:
+            rows = rows.filter(date__gte=start_date)
+        if end_date:
+            rows = rows.filter(date__lte=end_date)
+        if record_type is not None:
+            rows = rows.filter(record_type=record_type)
+
+        stats = rows.values('stock_code', 'stock_name').annotate(**sums)
+        if min_net:
+            stats = stats.filter(Q(total_net__gte=min_net) | Q(total_net__lte=-min_net))
+        return stats.order_by('-total_net', 'stock_code', 'stock_name')
 
-class StockRecordStatsView(views.APIView):
     def get(self, request):
-        stats = StockRecord.objects.values('stock_code', 'stock_name').annotate(
-            total_buy=Sum('buy_volume'),
-            total_sell=Sum('sell_volume'),
-            total_net=Sum('net_volume')
-        ).order_by('-total_net')
-        return response.Response(stats)
+        params = request.query_params
+        try:
+            stats = self.get_stats(params)
+            top = int_param(params, 'top', minimum=1)
+            page_size = min(int_param(params, 'page_size', minimum=1) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+            cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+        except ValueError as e:
+            return response.Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if top:
+            return response.Response(list(stats[:min(top, MAX_PAGE_SIZE)]))
+        if 'page_size' not in params and 'cursor' not in params:
+            return response.Response(list(stats))
+
+        if cursor:
+            net, code, name = cursor
+            stats = stats.filter(
+                Q(total_net__lt=net)
+                | Q(total_net=net, stock_code__gt=code)
+                | Q(total_net=net, stock_code=code, stock_name__gt=name))
+        # One extra row tells whether another page exists
+        results = list(stats[:page_size + 1])
+        next_url = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(results[-1]))
+        return response.Response({"next": next_url, "results": results})
 
     def post(self, request):
         serializer = StockRecordSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                record = serializer.save()
+                refresh_daily_aggregates(record.date, [record.stock_code], record.record_type)
+                bump_data_version()
             return response.Response(serializer.data, status=status.HTTP_201_CREATED)
         return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class StockRecordExportView(ReplicaReadMixin, views.APIView):
+    """Stream StockRecord rows (broker name joined in) as CSV or NDJSON.
+
+    Query params: output (csv or ndjson), gzip=1, start_date, end_date,
+    brokers (comma separated ids) and stock. Rows are streamed from the
+    database cursor, so memory stays flat however large the export.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        output = params.get('output', 'csv')
+        if output not in ('csv', 'ndjson'):
+            return response.Response({"error": "output must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            filters = {
+                'start_date': date_param(params, 'start_date'),
+                'end_date': date_param(params, 'end_date'),
+                'broker_ids': broker_ids_param(params),
+                'stock_code': params.get('stock', '').strip() or None,
+            }
+        except ValueError as e:
+            return response.Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        compress = params.get('gzip') == '1'
+
+        filename = f"stock_records.{output}"
+        content_type = 'text/csv; charset=utf-8' if output == 'csv' else 'application/x-ndjson; charset=utf-8'
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        stream = StreamingHttpResponse(
+            streaming_content(request, export_stream(output, compress, **filters)), content_type=content_type)
+        stream['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return stream
+
+
+class NDJSONParser(BaseParser):
+    """One JSON object per line; parsed lazily so large uploads stream through."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_ndjson(stream) if stream is not None else iter(())
+
+
+class StockRecordBulkView(views.APIView):
+    """Upsert many StockRecords in one request.
+
+    The body is a JSON array or an NDJSON stream of objects with broker (id)
+    or broker_name, stock_code, date, and optionally stock_name,
+    buy_volume, sell_volume, net_volume (default buy - sell) and
+    record_type. Existing rows on (broker, stock_code, date, record_type)
+    are updated. Invalid rows are skipped and listed by index in `errors`.
+    """
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request):
+        rows = request.data
+        # A JSON array, or the lazy row iterator of NDJSONParser; a bare
+        # object, number, string or null is not a batch
+        if not isinstance(rows, (list, Iterator)):
+            return response.Response({"error": "Expected a JSON array or NDJSON records"}, status=status.HTTP_400_BAD_REQUEST)
+        summary = ingest_rows(rows)
+        if summary["received"] and not summary["created"] and not summary["updated"]:
+            return response.Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        return response.Response(summary)